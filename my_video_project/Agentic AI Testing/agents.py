@@ -1,7 +1,12 @@
 import os
 from dotenv import load_dotenv
 from agent_framework.azure import AzureOpenAIResponsesClient
-from tools import call_ffmpeg1, call_ffmpeg2, call_deepspeech, call_ffmpeg0, call_librosa, call_grep
+# The async variants keep the sync tools' names/schemas but don't block the event loop
+from tools import (call_ffmpeg1_async as call_ffmpeg1, call_ffmpeg2_async as call_ffmpeg2,
+                   call_deepspeech_async as call_deepspeech, call_ffmpeg0_async as call_ffmpeg0,
+                   call_librosa_async as call_librosa, call_grep_async as call_grep)
+from llm_cache import with_cache
+from usage_metrics import StreamingAgent, timed_tool, with_metrics
 
 load_dotenv()
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -19,29 +24,41 @@ client = AzureOpenAIResponsesClient(
     #api_version=AZURE_OPENAI_VERSION,
 )
 
+def create_agent(name, instructions, tools):
+    """
+    Creates a sub-agent and puts the persistent response cache in front of its 'run'.
+    Sub-agents get templated prompts and almost always make the same tool call,
+    so repeated/resumed runs can skip the LLM round trip.
+    Every call (cached or not) is recorded by the usage recorder (tokens, TTFT, model vs tool time).
+    """
+    tools = [timed_tool(t) for t in tools]
+    agent = client.create_agent(name=name, instructions=instructions, tools=tools)
+    agent = with_cache(StreamingAgent(agent), name, instructions, tools)
+    return with_metrics(agent, name)
+
 # 1. Agent: ffmpeg1
-agent_ffmpeg1 = client.create_agent(
+agent_ffmpeg1 = create_agent(
     name="ffmpeg1",
     instructions="You are the ffmpeg1 specialist. Your goal is to split videos. You only accept .tar.gz files.",
     tools=[call_ffmpeg1]
 )
 
 # 2. Agent: ffmpeg2
-agent_ffmpeg2 = client.create_agent(
+agent_ffmpeg2 = create_agent(
     name="ffmpeg2",
     instructions="You are the ffmpeg2 specialist. Your goal is to convert .mp4 files into the specific .tar.gz format required for DeepSpeech.",
     tools=[call_ffmpeg2]
 )
 
 # 3. Agent: deepspeech
-agent_deepspeech = client.create_agent(
+agent_deepspeech = create_agent(
     name="deepspeech",
     instructions="You are the deepspeech specialist. Your goal is to generate text transcripts from .tar.gz files.",
     tools=[call_deepspeech]
 )
 
 # 4. Agent: ffmpeg0
-agent_ffmpeg0 = client.create_agent(
+agent_ffmpeg0 = create_agent(
     name="ffmpeg0",
     instructions="""
         You are the ffmpeg0 specialist. Your goal is to extract audio from video files.
@@ -52,7 +69,7 @@ agent_ffmpeg0 = client.create_agent(
 )
 
 # 5. Agent: Librosa
-agent_librosa = client.create_agent(
+agent_librosa = create_agent(
     name="librosa",
     instructions="""
         You are the Librosa Audio Analyst.
@@ -65,7 +82,7 @@ agent_librosa = client.create_agent(
 )
 
 # 6. Agent: Grep
-agent_grep = client.create_agent(
+agent_grep = create_agent(
     name="grep",
     instructions="""
         You are the Content Search Specialist.
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import hashlib
+from dataclasses import asdict
+from tools import ToolResult
+
+# Configuration
+JOURNAL_DIR = "./Agentic AI Testing/journals"
+# "1": a batch on the same folder + keyword continues from its journal; "0": always start over
+RESUME = os.getenv("BATCH_RESUME", "1") == "1"
+
+# "prepared" is only recorded when the clips go through ffmpeg2 (DEEPSPEECH_STREAMING=0),
+# "screened" (fast transcript) only in the two-tier search (BATCH_TWO_TIER=1)
+STAGES = ("prepared", "screened", "transcribed", "searched", "saved")
+
+
+def _clip_signature(clip_path):
+    """A clip that was re-generated (size/mtime changed) must go through every stage again."""
+    stat = os.stat(clip_path)
+    return f"{stat.st_size}:{stat.st_mtime}"
+
+
+class BatchJournal:
+    """
+    Append-only JSONL journal of a batch run: one line per finished (clip, stage), flushed and
+    fsync'ed as soon as the stage is done, so a crash loses at most the stage that was running.
+
+        {"clip": ..., "signature": ..., "stage": "transcribed", "result": {ToolResult fields}, "time": ...}
+
+    On resume, a stage is only skipped if its clip is unchanged and its artifact still exists
+    (outputs may have been evicted or cleaned up since).
+    """
+
+    def __init__(self, folder_path, keyword, journal_dir=JOURNAL_DIR, resume=RESUME):
+        os.makedirs(journal_dir, exist_ok=True)
+        key = hashlib.sha1(f"{os.path.abspath(folder_path)}|{keyword.lower()}".encode()).hexdigest()[:16]
+        self.path = os.path.join(journal_dir, f"batch_{key}.jsonl")
+        self._entries = {}  # (clip, stage) -> entry
+
+        if not resume and os.path.exists(self.path):
+            os.remove(self.path)
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Last line cut short by the crash
+                self._entries[(entry["clip"], entry["stage"])] = entry
+
+    @property
+    def resumed_clips(self):
+        return len({clip for clip, _ in self._entries})
+
+    def record(self, clip_path, stage, result):
+        """Persists a finished stage (result: a ToolResult, or the save_to_highlights message)."""
+        entry = {
+            "clip": clip_path,
+            "signature": _clip_signature(clip_path),
+            "stage": stage,
+            "result": asdict(result) if isinstance(result, ToolResult) else result,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._entries[(clip_path, stage)] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def completed(self, clip_path, stage):
+        """The recorded result of a stage if it can be reused (ToolResult or message), else None."""
+        entry = self._entries.get((clip_path, stage))
+        if entry is None or not os.path.exists(clip_path) or entry["signature"] != _clip_signature(clip_path):
+            return None
+
+        result = entry["result"]
+        if not isinstance(result, dict):
+            return result
+        result = ToolResult(**result)
+        if result.local_path and not os.path.exists(result.local_path):
+            return None
+        result.touch()  # Reused: the backend's GC must see the access
+        return result
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,184 @@
+import sys
+import json
+import math
+import argparse
+import numpy as np
+import pandas as pd
+
+from ingest_emissions import ingest, load_store, EMISSIONS_FOLDER
+
+# --- Configuration ---
+GROUP_KEYS = ['Model', 'Prompt', 'Task']
+METRICS = {'Duration': 'Duration (s)', 'Energy': 'Energy (kWh)'}
+PERCENTILES = [10, 50, 90]
+RUN_TOTAL_TASK = "Run Total"
+
+def parse_selector(text):
+    """
+    Turns "model=gpt-4.1,prompt=manager_instruction_v2.txt,since=2026-01-30" into a dict.
+    Several values for one key can be given with '|' (e.g. "model=gpt-4.1|gpt-5-mini").
+    """
+    selector = {}
+    for part in filter(None, (text or "").split(",")):
+        if "=" not in part:
+            raise argparse.ArgumentTypeError(f"Invalid selector '{part}', expected key=value")
+        key, value = part.split("=", 1)
+        key = key.strip().lower()
+        if key not in ("model", "prompt", "run_id", "since", "until"):
+            raise argparse.ArgumentTypeError(f"Unknown selector key '{key}'")
+        selector[key] = value.strip()
+    return selector
+
+def select_runs(runs, selector):
+    mask = pd.Series(True, index=runs.index)
+    for key, column in (("model", "Model"), ("prompt", "Prompt"), ("run_id", "run_id")):
+        if key in selector:
+            mask &= runs[column].isin(selector[key].split("|"))
+    timestamps = pd.to_datetime(runs['timestamp'], errors='coerce')
+    if "since" in selector:
+        mask &= timestamps >= pd.to_datetime(selector["since"])
+    if "until" in selector:
+        mask &= timestamps <= pd.to_datetime(selector["until"])
+    return set(runs.loc[mask, 'run_id'])
+
+def with_run_totals(runs, tasks):
+    """Adds one 'Run Total' task row per run (whole-run duration and energy from emissions.csv)."""
+    totals = runs[['run_id', 'Model', 'Prompt', 'Location', 'duration', 'energy_consumed', 'emissions']].rename(
+        columns={'duration': 'Duration', 'energy_consumed': 'Energy', 'emissions': 'Emissions'})
+    totals['Task'] = RUN_TOTAL_TASK
+    return pd.concat([tasks, totals], ignore_index=True)
+
+def group_stats(tasks):
+    """Median, percentiles and count per (Model, Prompt, Task) for every metric."""
+    rows = []
+    for keys, group in tasks.groupby(GROUP_KEYS):
+        row = dict(zip(GROUP_KEYS, keys))
+        row['runs'] = int(group['run_id'].nunique())
+        for metric in METRICS:
+            values = group[metric].astype(float).to_numpy()
+            for p in PERCENTILES:
+                row[f"{metric}_p{p}"] = float(np.percentile(values, p))
+        rows.append(row)
+    return rows
+
+def mann_whitney_greater(candidate, baseline):
+    """
+    One-sided Mann-Whitney U test: p-value for "candidate values tend to be larger than baseline".
+    Normal approximation with tie and continuity correction (no scipy needed).
+    """
+    x = np.asarray(candidate, dtype=float)
+    y = np.asarray(baseline, dtype=float)
+    n1, n2 = len(x), len(y)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+
+    combined = np.concatenate([x, y])
+    ranks = pd.Series(combined).rank().to_numpy()
+    u1 = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+
+    n = n1 + n2
+    _, counts = np.unique(combined, return_counts=True)
+    tie_term = (counts ** 3 - counts).sum() / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return 1.0
+
+    z = (u1 - n1 * n2 / 2 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def compare(tasks, baseline_ids, candidate_ids, alpha, min_change, min_runs):
+    """Per task and metric: baseline vs candidate medians, relative change, p-value and verdict."""
+    results = []
+    base = tasks[tasks['run_id'].isin(baseline_ids)]
+    cand = tasks[tasks['run_id'].isin(candidate_ids)]
+
+    for task in sorted(set(base['Task']) & set(cand['Task'])):
+        b_task = base[base['Task'] == task]
+        c_task = cand[cand['Task'] == task]
+        for metric in METRICS:
+            b = b_task[metric].astype(float).to_numpy()
+            c = c_task[metric].astype(float).to_numpy()
+            b_med, c_med = float(np.median(b)), float(np.median(c))
+            change = (c_med - b_med) / b_med if b_med else 0.0
+
+            if len(b) < min_runs or len(c) < min_runs:
+                status, p_value = "insufficient_data", None
+            else:
+                p_value = mann_whitney_greater(c, b)
+                status = "regression" if p_value < alpha and change > min_change else "ok"
+
+            results.append({
+                'task': task,
+                'metric': metric,
+                'baseline_runs': len(b),
+                'candidate_runs': len(c),
+                'baseline_median': b_med,
+                'candidate_median': c_med,
+                'relative_change': change,
+                'p_value': p_value,
+                'status': status,
+            })
+    return results
+
+def print_comparison(results):
+    print("| Task | Metric | Baseline median | Candidate median | Change | p-value | Status |")
+    print("|---|---|---|---|---|---|---|")
+    for r in results:
+        p_value = f"{r['p_value']:.4f}" if r['p_value'] is not None else "N/A"
+        flag = "⚠️ REGRESSION" if r['status'] == "regression" else r['status']
+        print(f"| {r['task']} | {METRICS[r['metric']]} | {r['baseline_median']:.4g} | {r['candidate_median']:.4g} "
+              f"| {r['relative_change']:+.1%} | {p_value} | {flag} |")
+
+def main(args):
+    ingest(args.folder)
+    runs, tasks = load_store(args.folder)
+    tasks = with_run_totals(runs, tasks)
+
+    baseline_ids = select_runs(runs, args.baseline)
+    candidate_ids = select_runs(runs, args.candidate) - baseline_ids
+    if not baseline_ids or not candidate_ids:
+        print(f"Error: baseline has {len(baseline_ids)} run(s), candidate has {len(candidate_ids)} run(s).", file=sys.stderr)
+        return 2
+
+    results = compare(tasks, baseline_ids, candidate_ids, args.alpha, args.min_change, args.min_runs)
+    regressions = [r for r in results if r['status'] == "regression"]
+
+    print(f"Baseline: {len(baseline_ids)} run(s) {args.baseline} | Candidate: {len(candidate_ids)} run(s) {args.candidate}\n")
+    print_comparison(results)
+
+    report = {
+        'baseline': {'selector': args.baseline, 'run_ids': sorted(baseline_ids)},
+        'candidate': {'selector': args.candidate, 'run_ids': sorted(candidate_ids)},
+        'alpha': args.alpha,
+        'min_change': args.min_change,
+        'groups': group_stats(tasks[tasks['run_id'].isin(baseline_ids | candidate_ids)]),
+        'comparisons': results,
+        'regression': bool(regressions),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {args.output}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) detected.")
+        return 1
+    print("\nNo regressions detected.")
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Flag significant duration/energy regressions between two sets of runs.",
+        epilog='Example: python detect_regressions.py -b "model=gpt-4.1" -c "model=gpt-5-mini"')
+    parser.add_argument("-b", "--baseline", type=parse_selector, required=True,
+                        help="Runs to compare against, e.g. 'model=gpt-4.1,prompt=manager_instruction_v1.txt'")
+    parser.add_argument("-c", "--candidate", type=parse_selector, required=True,
+                        help="Runs under test (same syntax; keys: model, prompt, run_id, since, until)")
+    parser.add_argument("-f", "--folder", default=EMISSIONS_FOLDER)
+    parser.add_argument("-o", "--output", default="regression_report.json", help="Path of the JSON report")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level of the one-sided test")
+    parser.add_argument("--min-change", type=float, default=0.05,
+                        help="Minimum relative increase of the median to count as a regression (0.05 = 5%%)")
+    parser.add_argument("--min-runs", type=int, default=3, help="Minimum runs per side to run the test")
+    args = parser.parse_args()
+
+    sys.exit(main(args))
@@ -0,0 +1,281 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import httpx
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration (the tools can run for minutes, so the read timeout is generous)
+CONNECT_TIMEOUT = float(os.getenv("TOOLS_HTTP_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.getenv("TOOLS_HTTP_READ_TIMEOUT", 900))
+WRITE_TIMEOUT = float(os.getenv("TOOLS_HTTP_WRITE_TIMEOUT", 300))
+MAX_RETRIES = int(os.getenv("TOOLS_HTTP_RETRIES", 3))
+BACKOFF_SECONDS = float(os.getenv("TOOLS_HTTP_BACKOFF", 1.0))
+POOL_SIZE = int(os.getenv("TOOLS_HTTP_POOL_SIZE", 10))
+# Send inputs through the chunked, content-addressed /uploads/ API and pass an upload_id to the tool.
+# Files the server already has are never sent again, and an interrupted upload resumes where it stopped.
+CHUNKED_UPLOADS = os.getenv("TOOLS_CHUNKED_UPLOADS", "1") == "1"
+# At most the backend's DATA_UPLOAD_MAX_MEMORY_SIZE (5 MiB by default), larger chunks are refused with 413
+UPLOAD_CHUNK_SIZE = int(os.getenv("TOOLS_UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+
+# Tool jobs are not idempotent (minutes of work), so a request is only sent again when it cannot have
+# started one: the connection was never made. After any other failure (read timeout, dropped connection,
+# 502/504 from a gateway) the job may still be running, so it is cancelled by its job_id and the call fails.
+# These retry loops are the only retry layer: the httpx transports do not retry on their own.
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+GATEWAY_STATUS_CODES = {502, 504}
+# 429: the tool's queue is full (nothing ran). Re-sent after Retry-After, with jittered exponential backoff
+BUSY_RETRIES = int(os.getenv("TOOLS_HTTP_BUSY_RETRIES", 8))
+BUSY_MAX_DELAY = float(os.getenv("TOOLS_HTTP_BUSY_MAX_DELAY", 120))
+
+_client = None
+_async_client = None
+_digest_cache = {}  # (path, size, mtime) -> sha256
+
+
+def _timeout():
+    return httpx.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT, write=WRITE_TIMEOUT, pool=CONNECT_TIMEOUT)
+
+
+def _limits():
+    return httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+
+
+def get_client() -> httpx.Client:
+    """Shared keep-alive client (connections to Django are reused between tool calls)."""
+    global _client
+    if _client is None:
+        _client = httpx.Client(timeout=_timeout(), limits=_limits())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared async keep-alive client, for tool calls awaited from the agents' event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(timeout=_timeout(), limits=_limits())
+    return _async_client
+
+
+def file_sha256(file_path):
+    """sha256 of a file (cached per path/size/mtime, since the same clip is often sent to several tools)."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+    if key not in _digest_cache:
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        _digest_cache[key] = sha.hexdigest()
+    return _digest_cache[key]
+
+
+def _base_url(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _uploads_url(url):
+    return f"{_base_url(url)}/uploads/"
+
+
+def _read_chunk(file_path, offset):
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(UPLOAD_CHUNK_SIZE)
+
+
+def upload_file(url, file_path) -> str:
+    """
+    Uploads a file through the chunked /uploads/ API and returns its upload_id (the sha256).
+    Nothing is transferred if the server already has the content; otherwise we resume from
+    the offset the server reports.
+    """
+    client = get_client()
+    uploads_url = _uploads_url(url)
+    digest = file_sha256(file_path)
+    size = os.path.getsize(file_path)
+
+    status = client.post(uploads_url, json={"sha256": digest, "size": size, "filename": os.path.basename(file_path)})
+    status.raise_for_status()
+    status = status.json()
+
+    failures = 0
+    while status["status"] != "complete" and status["offset"] < size:
+        offset = status["offset"]
+        try:
+            resp = client.put(f"{uploads_url}{digest}/", params={"offset": offset}, content=_read_chunk(file_path, offset))
+            if resp.status_code not in (200, 409):
+                resp.raise_for_status()
+            status = resp.json() if resp.status_code == 200 else {"status": "pending", "offset": resp.json()["offset"]}
+            failures = 0
+        except httpx.HTTPError:
+            failures += 1
+            if failures > MAX_RETRIES:
+                raise
+            time.sleep(BACKOFF_SECONDS * 2 ** (failures - 1))
+            status = client.get(f"{uploads_url}{digest}/").json()
+
+    if status["status"] != "complete":
+        client.post(f"{uploads_url}{digest}/complete/").raise_for_status()
+    return digest
+
+
+async def aupload_file(url, file_path) -> str:
+    """Async version of upload_file (hashing and disk reads run in a thread)."""
+    client = get_async_client()
+    uploads_url = _uploads_url(url)
+    digest = await asyncio.to_thread(file_sha256, file_path)
+    size = os.path.getsize(file_path)
+
+    status = await client.post(uploads_url, json={"sha256": digest, "size": size, "filename": os.path.basename(file_path)})
+    status.raise_for_status()
+    status = status.json()
+
+    failures = 0
+    while status["status"] != "complete" and status["offset"] < size:
+        offset = status["offset"]
+        try:
+            chunk = await asyncio.to_thread(_read_chunk, file_path, offset)
+            resp = await client.put(f"{uploads_url}{digest}/", params={"offset": offset}, content=chunk)
+            if resp.status_code not in (200, 409):
+                resp.raise_for_status()
+            status = resp.json() if resp.status_code == 200 else {"status": "pending", "offset": resp.json()["offset"]}
+            failures = 0
+        except httpx.HTTPError:
+            failures += 1
+            if failures > MAX_RETRIES:
+                raise
+            await asyncio.sleep(BACKOFF_SECONDS * 2 ** (failures - 1))
+            status = (await client.get(f"{uploads_url}{digest}/")).json()
+
+    if status["status"] != "complete":
+        (await client.post(f"{uploads_url}{digest}/complete/")).raise_for_status()
+    return digest
+
+
+def _busy_delay(resp, busy_attempt):
+    """
+    Seconds to wait before re-sending a request turned away with 429: at least the server's Retry-After,
+    growing exponentially with the attempts, and jittered so that the clients turned away together
+    do not all come back at the same time.
+    """
+    try:
+        retry_after = float(resp.headers.get("Retry-After", BACKOFF_SECONDS))
+    except ValueError:
+        retry_after = BACKOFF_SECONDS
+    backoff = min(BUSY_MAX_DELAY, BACKOFF_SECONDS * 2 ** busy_attempt)
+    return min(BUSY_MAX_DELAY, max(retry_after * random.uniform(1.0, 1.5), random.uniform(backoff / 2, backoff)))
+
+
+def post_file(url, file_path, data=None) -> httpx.Response:
+    """
+    Sends a file to a tool endpoint plus optional form fields.
+    With CHUNKED_UPLOADS the file goes through upload_file and only its upload_id is posted;
+    otherwise it is sent as multipart/form-data ('file' field), streamed in chunks by httpx.
+    Connection failures are retried with exponential backoff; 429s (tool busy) are retried
+    up to BUSY_RETRIES times, see _busy_delay. Any other failure cancels the job (data's job_id), see RETRY_ERRORS.
+    """
+    upload_id = upload_file(url, file_path) if CHUNKED_UPLOADS else None
+
+    attempt = busy = 0
+    while True:
+        try:
+            if upload_id:
+                resp = get_client().post(url, data={**(data or {}), "upload_id": upload_id})
+            else:
+                with open(file_path, "rb") as f:
+                    resp = get_client().post(url, files={"file": (os.path.basename(file_path), f)}, data=data)
+            if resp.status_code == 429 and busy < BUSY_RETRIES:
+                time.sleep(_busy_delay(resp, busy))
+                busy += 1
+                continue
+            if resp.status_code in GATEWAY_STATUS_CODES:
+                _cancel_after_failure(url, data)
+            return resp
+        except RETRY_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+        except httpx.TransportError:
+            # e.g. ReadTimeout: the server probably still runs the job, it must not be left running or sent again
+            _cancel_after_failure(url, data)
+            raise
+        time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+        attempt += 1
+
+
+async def apost_file(url, file_path, data=None) -> httpx.Response:
+    """Async version of post_file (does not block the event loop while the tool runs)."""
+    upload_id = await aupload_file(url, file_path) if CHUNKED_UPLOADS else None
+
+    attempt = busy = 0
+    while True:
+        try:
+            if upload_id:
+                resp = await get_async_client().post(url, data={**(data or {}), "upload_id": upload_id})
+            else:
+                with open(file_path, "rb") as f:
+                    resp = await get_async_client().post(url, files={"file": (os.path.basename(file_path), f)}, data=data)
+            if resp.status_code == 429 and busy < BUSY_RETRIES:
+                await asyncio.sleep(_busy_delay(resp, busy))
+                busy += 1
+                continue
+            if resp.status_code in GATEWAY_STATUS_CODES:
+                await _acancel_after_failure(url, data)
+            return resp
+        except RETRY_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+        except httpx.TransportError:
+            await _acancel_after_failure(url, data)
+            raise
+        await asyncio.sleep(BACKOFF_SECONDS * 2 ** attempt)
+        attempt += 1
+
+
+def cancel_job(base_url, job_id):
+    """Asks the server to kill a tool job (best effort: False if it could not be reached or the job is gone)."""
+    try:
+        return get_client().post(f"{base_url}/jobs/{job_id}/cancel/", timeout=CONNECT_TIMEOUT).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+async def acancel_job(base_url, job_id):
+    """Async version of cancel_job."""
+    try:
+        resp = await get_async_client().post(f"{base_url}/jobs/{job_id}/cancel/", timeout=CONNECT_TIMEOUT)
+        return resp.status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def _cancel_after_failure(url, data):
+    job_id = (data or {}).get("job_id")
+    if job_id:
+        cancel_job(_base_url(url), job_id)
+
+
+async def _acancel_after_failure(url, data):
+    job_id = (data or {}).get("job_id")
+    if job_id:
+        await acancel_job(_base_url(url), job_id)
+
+
+def close():
+    """Closes the shared sync client (the async one is closed with aclose())."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def aclose():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
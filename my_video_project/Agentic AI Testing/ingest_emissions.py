@@ -0,0 +1,174 @@
+import os
+import csv
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+EMISSIONS_FOLDER = "./Agentic AI Testing/emissions_data"
+MAIN_FILE = "emissions.csv"
+STORE_FILE = "emissions_store.sqlite3"
+# Written by main.py: which manager prompt file each run used
+RUN_META_FILE = "runs_meta.csv"
+
+ENERGY_COLS = ['cpu_energy', 'gpu_energy', 'ram_energy']
+POWER_COLS = ['cpu_power', 'gpu_power', 'ram_power']
+RUN_METRICS = ENERGY_COLS + POWER_COLS + ['emissions', 'energy_consumed', 'duration']
+
+NORMALIZATION_MAP = {
+    "Batch Processor": "Batch Processor Loop",
+    "FFmpeg0": "Tool: FFmpeg0 (Extract)",
+    "FFmpeg1": "Tool: FFmpeg1 (Split)",
+    "FFmpeg2": "Tool: FFmpeg2 (Prep)",
+    "DeepSpeech": "Tool: DeepSpeech",
+    "Librosa": "Tool: Librosa",
+    "Grep": "Tool: Grep",
+    "LLM Agent": "LLM Agent Pipeline",
+    "Manager": "LLM Agent Pipeline"
+}
+
+def normalize_task_names(task_names: pd.Series) -> pd.Series:
+    """
+    Vectorized version of the old per-row normalization: every task name containing one of the
+    NORMALIZATION_MAP keys (case-insensitive, first key wins) gets the standard name.
+    e.g. "Tool: Librosa (Timestamps)_3d948c43-1ed7-42a5-8004-f71efb9abc16 -> Tool: Librosa".
+    """
+    raw = task_names.astype(str)
+    lower = raw.str.lower()
+    conditions = [lower.str.contains(key.lower(), regex=False) for key in NORMALIZATION_MAP]
+    normalized = np.select(conditions, list(NORMALIZATION_MAP.values()), default=raw)
+    return pd.Series(normalized, index=task_names.index)
+
+def record_run_metadata(run_id, prompt_file, folder=EMISSIONS_FOLDER):
+    """Appends the prompt file used by a run, so runs can be grouped by prompt version later."""
+    meta_file = os.path.join(folder, RUN_META_FILE)
+    os.makedirs(folder, exist_ok=True)
+    write_header = not os.path.exists(meta_file)
+    with open(meta_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["run_id", "prompt_file"])
+        writer.writerow([run_id, os.path.basename(prompt_file)])
+
+def _load_run_metadata(folder):
+    meta_file = os.path.join(folder, RUN_META_FILE)
+    if not os.path.exists(meta_file):
+        return pd.DataFrame(columns=['run_id', 'Prompt'])
+    meta = pd.read_csv(meta_file).rename(columns={'prompt_file': 'Prompt'})
+    return meta.drop_duplicates(subset='run_id', keep='last')[['run_id', 'Prompt']]
+
+def _migrate(conn):
+    """Adds columns introduced after the store was first created."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(runs)")]
+    if columns and 'Prompt' not in columns:
+        conn.execute("ALTER TABLE runs ADD COLUMN Prompt TEXT DEFAULT 'Unknown'")
+
+def _known_run_ids(conn):
+    try:
+        return set(pd.read_sql("SELECT run_id FROM runs", conn)['run_id'])
+    except Exception:
+        # First ingestion: the table does not exist yet
+        return set()
+
+def _load_new_runs(main_file, known_run_ids, run_meta):
+    df = pd.read_csv(main_file)
+    if 'project_name' not in df.columns:
+        raise ValueError("'project_name' column missing.")
+
+    # Project name is equal to the model name used in .env
+    df['Model'] = df['project_name']
+    if 'country_name' in df.columns:
+        df['Location'] = df['country_name'].fillna('Unknown')
+    else:
+        df['Location'] = 'Unknown'
+
+    for m in RUN_METRICS:
+        if m not in df.columns: df[m] = 0
+
+    df = df.dropna(subset=['Model'])
+    df = df[~df['run_id'].isin(known_run_ids)].drop_duplicates(subset='run_id', keep='last')
+    df = df.merge(run_meta, on='run_id', how='left')
+    df['Prompt'] = df['Prompt'].fillna('Unknown')
+    return df[['run_id', 'timestamp', 'Model', 'Prompt', 'Location'] + RUN_METRICS]
+
+def _load_tasks(folder, runs):
+    """Reads the granular files of the given runs in one pass and sums duration/energy per normalized task."""
+    wanted = {'task_name', 'duration', 'energy_consumed', 'emissions'}
+    frames = []
+    for run_id in runs['run_id']:
+        granular_file = os.path.join(folder, f"emissions_base_{run_id}.csv")
+        if not os.path.exists(granular_file):
+            continue
+        try:
+            sub_df = pd.read_csv(granular_file, usecols=lambda c: c in wanted)
+        except Exception:
+            continue
+        if 'task_name' not in sub_df.columns or 'duration' not in sub_df.columns:
+            continue
+        frames.append(sub_df.assign(run_id=run_id))
+
+    if not frames:
+        return pd.DataFrame(columns=['run_id', 'Model', 'Location', 'Task', 'Duration', 'Energy', 'Emissions'])
+
+    tasks = pd.concat(frames, ignore_index=True)
+    for col in ('energy_consumed', 'emissions'):
+        if col not in tasks.columns: tasks[col] = 0.0
+
+    tasks['Task'] = normalize_task_names(tasks['task_name'])
+    tasks = (
+        tasks.groupby(['run_id', 'Task'], as_index=False)[['duration', 'energy_consumed', 'emissions']].sum()
+        .rename(columns={'duration': 'Duration', 'energy_consumed': 'Energy', 'emissions': 'Emissions'})
+    )
+    tasks = tasks.merge(runs[['run_id', 'Model', 'Location']], on='run_id', how='left')
+    return tasks[['run_id', 'Model', 'Location', 'Task', 'Duration', 'Energy', 'Emissions']]
+
+def ingest(folder=EMISSIONS_FOLDER, store_path=None):
+    """
+    Appends the runs from emissions.csv that are not in the store yet (with their per-task sums).
+    Returns the number of newly ingested runs.
+    """
+    main_file = os.path.join(folder, MAIN_FILE)
+    store_path = store_path or os.path.join(folder, STORE_FILE)
+    if not os.path.exists(main_file):
+        raise FileNotFoundError(f"'{main_file}' not found.")
+
+    with sqlite3.connect(store_path) as conn:
+        _migrate(conn)
+        new_runs = _load_new_runs(main_file, _known_run_ids(conn), _load_run_metadata(folder))
+        if new_runs.empty:
+            return 0
+
+        new_tasks = _load_tasks(folder, new_runs)
+        new_runs.to_sql('runs', conn, if_exists='append', index=False)
+        new_tasks.to_sql('tasks', conn, if_exists='append', index=False)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_run_id ON runs(run_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_run_id ON tasks(run_id)")
+    return len(new_runs)
+
+def load_store(folder=EMISSIONS_FOLDER, store_path=None):
+    """Returns (runs, tasks) DataFrames from the consolidated store."""
+    store_path = store_path or os.path.join(folder, STORE_FILE)
+    with sqlite3.connect(store_path) as conn:
+        runs = pd.read_sql("SELECT * FROM runs", conn)
+        try:
+            tasks = pd.read_sql("SELECT * FROM tasks", conn)
+        except Exception:
+            tasks = pd.DataFrame(columns=['run_id', 'Model', 'Location', 'Task', 'Duration', 'Energy', 'Emissions'])
+
+    # The prompt version lives on the run; expose it on the task rows too for grouping
+    tasks = tasks.merge(runs[['run_id', 'Prompt']], on='run_id', how='left')
+    return runs, tasks
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Consolidate codecarbon CSVs into a single SQLite store.")
+    parser.add_argument("-f", "--folder", default=EMISSIONS_FOLDER)
+    parser.add_argument("--rebuild", action="store_true", help="Drop the store and ingest everything again")
+    args = parser.parse_args()
+
+    store = os.path.join(args.folder, STORE_FILE)
+    if args.rebuild and os.path.exists(store):
+        os.remove(store)
+
+    added = ingest(args.folder)
+    print(f"Ingested {added} new run(s) into {store}")
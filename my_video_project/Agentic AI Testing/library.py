@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import asyncio
+import argparse
+from http_client import file_sha256, aclose
+from search_first import analyse_audio, load_words, load_boundaries, find_hits, snap_to_boundaries, cut_and_save
+
+# --- Configuration ---
+WATCH_DIR = os.getenv("LIBRARY_WATCH_DIR", "./Agentic AI Testing/test_data")
+LIBRARY_DIR = os.getenv("LIBRARY_DIR", "./Agentic AI Testing/library")
+CATALOG_FILE = "catalog.sqlite3"
+MAX_PARALLEL = int(os.getenv("LIBRARY_MAX_PARALLEL", 2))
+POLL_INTERVAL = float(os.getenv("LIBRARY_POLL_INTERVAL", 30))
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi")
+
+
+class Library:
+    """
+    Catalog of ingested videos, keyed by content hash.
+
+    Each video goes once through audio extraction, segmentation (librosa) and timed transcription
+    (deepspeech). The packages are kept under LIBRARY_DIR/<sha256>/ (media_data is temporary) and the
+    word timings and silence boundaries go into the catalog, so keyword queries over the whole library
+    never touch the tools again. Only the clips around the hits are cut, on demand.
+    """
+
+    def __init__(self, library_dir=LIBRARY_DIR):
+        self.library_dir = library_dir
+        os.makedirs(library_dir, exist_ok=True)
+        self.db_path = os.path.join(library_dir, CATALOG_FILE)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    sha256 TEXT PRIMARY KEY, path TEXT, size INTEGER, mtime REAL,
+                    status TEXT, error TEXT, ingested_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT);
+                CREATE TABLE IF NOT EXISTS artifacts (sha256 TEXT, stage TEXT, path TEXT, PRIMARY KEY (sha256, stage));
+                CREATE TABLE IF NOT EXISTS words (sha256 TEXT, position INTEGER, word TEXT, start REAL, end REAL);
+                CREATE TABLE IF NOT EXISTS boundaries (sha256 TEXT, seconds REAL);
+                CREATE INDEX IF NOT EXISTS idx_words_video ON words(sha256, position);
+                CREATE INDEX IF NOT EXISTS idx_words_word ON words(word);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # --- Change detection ---
+    def find_changes(self, watch_dir=WATCH_DIR):
+        """
+        Returns [(path, sha256)] of the videos that still need to be ingested.
+        Files whose path, size and mtime match the catalog are not hashed again; a renamed or copied
+        video that was already ingested is recognised by its hash. A failed video is retried once its
+        content changes.
+        """
+        changed = {}
+        with self._connect() as conn:
+            for root, _, files in os.walk(watch_dir):
+                for name in sorted(files):
+                    if not name.lower().endswith(VIDEO_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    row = conn.execute("SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime = ?",
+                                       (path, stat.st_size, stat.st_mtime)).fetchone()
+                    if row is None:
+                        digest = file_sha256(path)
+                        conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                     (path, stat.st_size, stat.st_mtime, digest))
+                    else:
+                        digest = row[0]
+
+                    # Already ingested (under any name), or failed with this exact content
+                    status = conn.execute("SELECT status FROM videos WHERE sha256 = ?", (digest,)).fetchone()
+                    if status is None and digest not in changed:
+                        changed[digest] = path
+        return [(path, digest) for digest, path in changed.items()]
+
+    # --- Ingestion ---
+    def _keep(self, digest, stage, result):
+        """Copies a tool output out of media_data into the library and records it."""
+        if result is None or not result.ok or not os.path.exists(result.local_path):
+            return None
+        dest_dir = os.path.join(self.library_dir, digest)
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, f"{stage}.tar.gz")
+        shutil.copyfile(result.local_path, dest)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", (digest, stage, dest))
+        return dest
+
+    async def ingest_video(self, path, digest):
+        stat = os.stat(path)
+        print(f"[Library] Ingesting {path} ({digest[:12]})")
+        stages = await analyse_audio(path)
+        transcript, silences = stages["transcribe"], stages["boundaries"]
+
+        failed = next((r for r in (stages["audio"], transcript) if r is not None and not r.ok), None)
+        if failed is not None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, 'failed', ?, NULL)",
+                             (digest, path, stat.st_size, stat.st_mtime, str(failed)))
+            print(f"[Library] Failed {path}: {failed}")
+            return False
+
+        transcript_path = await asyncio.to_thread(self._keep, digest, "transcript", transcript)
+        boundaries_path = await asyncio.to_thread(self._keep, digest, "boundaries", silences)
+        if transcript_path is None:
+            print(f"[Library] Failed {path}: transcript {transcript.local_path} is missing")
+            return False
+        words = load_words(transcript_path)
+        boundaries = load_boundaries(boundaries_path) if boundaries_path else []
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM words WHERE sha256 = ?", (digest,))
+            conn.execute("DELETE FROM boundaries WHERE sha256 = ?", (digest,))
+            conn.executemany("INSERT INTO words VALUES (?, ?, ?, ?, ?)",
+                             [(digest, i, w["word"], w["start"], w["end"]) for i, w in enumerate(words)])
+            conn.executemany("INSERT INTO boundaries VALUES (?, ?)", [(digest, b) for b in boundaries])
+            conn.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, 'ingested', NULL, ?)",
+                         (digest, path, stat.st_size, stat.st_mtime, time.strftime("%Y-%m-%dT%H:%M:%S")))
+        print(f"[Library] Ingested {path}: {len(words)} words, {len(boundaries)} boundaries")
+        return True
+
+    async def ingest(self, watch_dir=WATCH_DIR, max_parallel=MAX_PARALLEL):
+        """Ingests every new or changed video, at most max_parallel at a time. Returns the number ingested."""
+        changes = await asyncio.to_thread(self.find_changes, watch_dir)
+        if not changes:
+            return 0
+
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def bounded(path, digest):
+            async with semaphore:
+                return await self.ingest_video(path, digest)
+
+        results = await asyncio.gather(*(bounded(p, d) for p, d in changes))
+        return sum(results)
+
+    async def watch(self, watch_dir=WATCH_DIR, interval=POLL_INTERVAL):
+        """Polls the watch folder forever (no filesystem-event dependency, works on mounted volumes too)."""
+        print(f"[Library] Watching {watch_dir} every {interval:.0f}s")
+        while True:
+            added = await self.ingest(watch_dir)
+            if added:
+                print(f"[Library] {added} video(s) ingested")
+            await asyncio.sleep(interval)
+
+    # --- Queries ---
+    def search(self, keyword):
+        """Keyword hits across the whole library: [{sha256, path, hits, windows}], no tool call needed."""
+        results = []
+        with self._connect() as conn:
+            videos = conn.execute("SELECT sha256, path FROM videos WHERE status = 'ingested' ORDER BY path").fetchall()
+            for digest, path in videos:
+                words = [{"word": w, "start": s, "end": e} for w, s, e in conn.execute(
+                    "SELECT word, start, end FROM words WHERE sha256 = ? ORDER BY position", (digest,))]
+                hits = find_hits(words, keyword)
+                if not hits:
+                    continue
+                boundaries = [b for (b,) in conn.execute(
+                    "SELECT seconds FROM boundaries WHERE sha256 = ? ORDER BY seconds", (digest,))]
+                results.append({"sha256": digest, "path": path, "hits": hits,
+                                "windows": snap_to_boundaries(hits, boundaries)})
+        return results
+
+    def _existing_path(self, digest, default):
+        """Any file of the watch folder that still has this content (the video may have been renamed)."""
+        with self._connect() as conn:
+            paths = [p for (p,) in conn.execute("SELECT path FROM files WHERE sha256 = ?", (digest,))]
+        return next((p for p in [default] + paths if os.path.exists(p)), default)
+
+    async def search_and_cut(self, keyword):
+        """Runs search() and cuts/saves the clips around the hits (the only step that uses the tools)."""
+        results = self.search(keyword)
+        for result in results:
+            result["path"] = self._existing_path(result["sha256"], result["path"])
+            if not os.path.exists(result["path"]):
+                result["saved"] = [f"Error: File {result['path']} not found."]
+                continue
+            _, result["saved"] = await cut_and_save(result["path"], result["windows"], keyword)
+        return results
+
+
+async def _main(args):
+    library = Library(args.library)
+    try:
+        if args.command == "ingest":
+            added = await library.ingest(args.folder, args.parallel)
+            print(f"Ingested {added} new video(s) into {library.db_path}")
+        elif args.command == "watch":
+            await library.watch(args.folder, args.interval)
+        elif args.command == "query":
+            results = await library.search_and_cut(args.keyword) if args.cut else library.search(args.keyword)
+            print(json.dumps(results, indent=2))
+    finally:
+        await aclose()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incremental video library: ingest once, query many times.")
+    parser.add_argument("command", choices=["ingest", "watch", "query"])
+    parser.add_argument("keyword", nargs="?", help="Word or phrase to look for (query only)")
+    parser.add_argument("-f", "--folder", default=WATCH_DIR, help="Folder with the videos")
+    parser.add_argument("-l", "--library", default=LIBRARY_DIR, help="Where the catalog and artifacts are kept")
+    parser.add_argument("-p", "--parallel", type=int, default=MAX_PARALLEL, help="Videos processed at the same time")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Polling interval of 'watch' (seconds)")
+    parser.add_argument("--cut", action="store_true", help="Also cut and save the clips around the hits")
+    args = parser.parse_args()
+    if args.command == "query" and not args.keyword:
+        parser.error("query needs a keyword")
+
+    asyncio.run(_main(args))
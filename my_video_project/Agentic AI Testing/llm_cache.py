@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import sqlite3
+import threading
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration (can be overridden from the .env file)
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./Agentic AI Testing/cache/llm_responses.sqlite3")
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+# When True, a cache hit re-executes the tool call the LLM chose last time
+# (so the worker still produces fresh output files) instead of returning the old text.
+CACHE_REPLAY_TOOL_CALLS = os.getenv("LLM_CACHE_REPLAY_TOOL_CALLS", "1") == "1"
+
+# Tool outputs that report a failure (see ToolResult.__str__ and the "Error: ..." strings in tools.py)
+FAILED_TOOL_OUTPUT = re.compile(r"^(Error\b|\[[^\]]+ (Error|Failed|Cancelled)\])")
+FAILED_STATUSES = ("error", "failed", "cancelled")
+
+
+@dataclass
+class CachedResponse:
+    """Minimal stand-in for the agent response object (only '.text' is used by main.py)."""
+    text: str
+    from_cache: bool = True
+
+
+def tool_schema(tools) -> str:
+    """
+    Builds a stable description of the tools an agent can call (name + signature + docstring).
+    If a tool changes, the schema changes and old cache entries stop matching.
+    """
+    parts = []
+    for fn in tools:
+        parts.append(f"{fn.__name__}{inspect.signature(fn)}\n{inspect.getdoc(fn) or ''}")
+    return "\n".join(parts)
+
+
+def extract_tool_calls(response) -> list:
+    """
+    Returns the function calls resolved during an agent run as [{"name": ..., "arguments": {...}}].
+    """
+    calls = []
+    for message in getattr(response, "messages", None) or []:
+        for content in getattr(message, "contents", None) or []:
+            if getattr(content, "type", None) != "function_call":
+                continue
+            arguments = getattr(content, "arguments", None) or {}
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError:
+                    continue
+            calls.append({"name": content.name, "arguments": arguments})
+    return calls
+
+
+def tool_call_failed(response) -> bool:
+    """
+    True if any tool call resolved during an agent run raised or returned a failure: an error string,
+    or a JSON object with "success": false or an error status.
+    """
+    for message in getattr(response, "messages", None) or []:
+        for content in getattr(message, "contents", None) or []:
+            if getattr(content, "type", None) != "function_result":
+                continue
+            if getattr(content, "exception", None):
+                return True
+            result = getattr(content, "result", None)
+            if isinstance(result, str):
+                if FAILED_TOOL_OUTPUT.match(result.strip()):
+                    return True
+                try:
+                    result = json.loads(result)
+                except json.JSONDecodeError:
+                    continue
+            if isinstance(result, dict) and (result.get("success") is False or result.get("status") in FAILED_STATUSES):
+                return True
+    return False
+
+
+class ResponseCache:
+    """
+    Persistent (SQLite) cache of sub-agent responses with TTL and LRU eviction.
+    Entries are keyed by agent name, instructions hash, prompt and tool schema.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                agent_name TEXT,
+                prompt TEXT,
+                text TEXT,
+                tool_calls TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(agent_name, instructions, prompt, schema) -> str:
+        instructions_hash = hashlib.sha256(instructions.encode("utf-8")).hexdigest()
+        raw = json.dumps([agent_name, instructions_hash, prompt, schema])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (text, tool_calls) or None. Expired entries are dropped on read."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, tool_calls, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            text, tool_calls, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            # LRU bookkeeping
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return text, json.loads(tool_calls)
+
+    def put(self, key, agent_name, prompt, text, tool_calls):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, agent_name, prompt, text, json.dumps(tool_calls), now, now),
+            )
+            # Evict the least recently used entries above the limit
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class CachedAgent:
+    """
+    Wraps an agent so that 'run' is answered from the ResponseCache when possible.
+    Only runs that resolved a tool call, none of which failed, are stored, so failed or chatty answers
+    are never reused (a transient failure would otherwise be replayed until the TTL runs out).
+    """
+
+    def __init__(self, agent, name, instructions, tools, cache, replay_tool_calls=CACHE_REPLAY_TOOL_CALLS):
+        self.agent = agent
+        self.name = name
+        self.cache = cache
+        self.replay_tool_calls = replay_tool_calls
+        self._tools = {fn.__name__: fn for fn in tools}
+        self._instructions = instructions
+        self._schema = tool_schema(tools)
+
+    def __getattr__(self, item):
+        # Everything we don't override is forwarded to the real agent
+        return getattr(self.agent, item)
+
+    async def run(self, prompt, **kwargs):
+        if kwargs or not isinstance(prompt, str):
+            return await self.agent.run(prompt, **kwargs)
+
+        key = ResponseCache.make_key(self.name, self._instructions, prompt, self._schema)
+        cached = self.cache.get(key)
+
+        if cached is not None:
+            text, tool_calls = cached
+            if not self.replay_tool_calls:
+                return CachedResponse(text=text)
+
+            replayed = await self._replay(tool_calls)
+            if replayed is not None:
+                return CachedResponse(text=replayed)
+
+        response = await self.agent.run(prompt)
+        tool_calls = extract_tool_calls(response)
+        if tool_calls and not tool_call_failed(response):
+            self.cache.put(key, self.name, prompt, response.text, tool_calls)
+        return response
+
+    async def _replay(self, tool_calls):
+        """Re-executes the recorded tool calls in order and returns the last tool output."""
+        output = None
+        for call in tool_calls:
+            fn = self._tools.get(call["name"])
+            if fn is None:
+                return None
+            if inspect.iscoroutinefunction(fn):
+                output = await fn(**call["arguments"])
+            else:
+                output = await asyncio.to_thread(fn, **call["arguments"])
+        return output if output is None else str(output)
+
+
+# Shared cache instance used by agents.py
+response_cache = ResponseCache() if CACHE_ENABLED else None
+
+
+def with_cache(agent, name, instructions, tools):
+    """Returns the agent wrapped with the shared response cache (or unchanged if caching is disabled)."""
+    if response_cache is None:
+        return agent
+    return CachedAgent(agent, name, instructions, tools, response_cache)
@@ -1,14 +1,43 @@
 import os
+import json
 import asyncio
 import tarfile
-import re
 import time
 import shutil
+import contextvars
+from typing import Annotated, Literal, TypedDict
 from agents import agent_ffmpeg1, agent_ffmpeg2, agent_deepspeech, agent_ffmpeg0, agent_librosa, agent_grep, client
-from tools import save_to_highlights
+from tools import save_to_highlights, arun_tool, capture_results
+from usage_metrics import usage_recorder, StreamingAgent, timed_tool, with_metrics
+from ingest_emissions import record_run_metadata
+from search_first import search_then_cut, screen_score, SCREEN_THRESHOLD
+from batch_journal import BatchJournal
+from library import Library
+import http_client
 from codecarbon import EmissionsTracker
+from sampled_tracker import SampledEmissionsTracker, start_task, stop_task
 
-tracker = EmissionsTracker(project_name=os.getenv('AZURE_OPENAI_DEPLOYMENT'), output_dir="./Agentic AI Testing/emissions_data")
+# "tasks": codecarbon task per tool call (most detail, overhead grows with the number of clips)
+# "sampled": background power sampling + in-memory task spans, one aggregated record per run
+TRACKING_MODE = os.getenv("EMISSIONS_TRACKING_MODE", "tasks")
+
+if TRACKING_MODE == "sampled":
+    tracker = SampledEmissionsTracker(project_name=os.getenv('AZURE_OPENAI_DEPLOYMENT'), output_dir="./Agentic AI Testing/emissions_data")
+else:
+    tracker = EmissionsTracker(project_name=os.getenv('AZURE_OPENAI_DEPLOYMENT'), output_dir="./Agentic AI Testing/emissions_data")
+
+# "1" (opt-in): the batch processor sends the clips straight to deepspeech, which decodes and streams their
+# audio itself (no ffmpeg2 prep package); "0": prep every clip with ffmpeg2 first
+DEEPSPEECH_STREAMING = os.getenv("DEEPSPEECH_STREAMING", "0") == "1"
+
+# "1": two-tier search in the batch processor. Every clip first gets a fast, rough transcript (no scorer,
+# narrow beam); only the clips where something close to the keyword shows up (TWO_TIER_THRESHOLD) get the
+# full transcription and the grep confirmation. "0": every clip is fully transcribed.
+BATCH_TWO_TIER = os.getenv("BATCH_TWO_TIER", "0") == "1"
+
+# Sub-tasks of one delegate_to_fanout call that run at the same time (each tool call is still subject to
+# the backend's admission control, so a larger value only queues more work there)
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", 4))
 
 base_data_dir = "./Agentic\\ AI\\ Testing/test_data"
 prompts_dir = "Agentic AI Testing/prompts_archive"
@@ -35,39 +64,38 @@ def reset_directories(dir_paths):
             except Exception as e:
                 print(f"⚠️ Failed to delete {file_path}. Reason: {e}")
 
-def extract_path_from_text(text: str) -> str:
-    """
-    Extracts a Docker path (/data/...) from unstructured agent text.
-    Aggressively removes trailing markdown artifacts (*, `, etc).
-    """
-    # Regex to capture the main path part
-    match = re.search(r'(/data/[\w\-\./]+\.tar\.gz|/data/[\w\-\./]+)', text)
-    if match:
-        path = match.group(0).strip()
-        # Strip backticks, asterisks, commas, periods, quotes from the end
-        return path.rstrip(".,;:`*'\"")
-    return None
+# Set in the branches of delegate_to_fanout. codecarbon measures one active task at a time, so concurrent
+# branches would take each other's energy: the whole fan-out is one task and the branches record none.
+_in_fanout_branch = contextvars.ContextVar("in_fanout_branch", default=False)
+
+def start_tool_task(name):
+    if not _in_fanout_branch.get():
+        start_task(tracker, name)
+
+def stop_tool_task(name):
+    if not _in_fanout_branch.get():
+        stop_task(tracker, name)
 
 # --- Delegation Tools for the Manager ---
 # The Manager doesn't run the logic itself; it asks the sub-agents to do it.
 async def delegate_to_ffmpeg1(task: str) -> str:
     """Send a task to the ffmpeg1 agent (Splitting)."""
-    tracker.start_task("Tool: FFmpeg1 (Split)")
+    start_tool_task("Tool: FFmpeg1 (Split)")
     try:
         response = await agent_ffmpeg1.run(task)
         return response.text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: FFmpeg1 (Split)")
 
 async def delegate_to_ffmpeg2(task: str) -> str:
     """Send a task to the ffmpeg2 agent (Audio Prep/Conversion)."""
     print(f"\n[System] Running ffmpeg2 on: {task}", end="", flush=True)
-    tracker.start_task("Tool: FFmpeg2 (Prep)")
+    start_tool_task("Tool: FFmpeg2 (Prep)")
     try:
         response = await agent_ffmpeg2.run(task)
         return response.text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: FFmpeg2 (Prep)")
 
 async def delegate_to_deepspeech(task: str) -> str:
     """
@@ -75,76 +103,170 @@ async def delegate_to_deepspeech(task: str) -> str:
     Contains inline logic to read the file so we don't need external helpers.
     """
     print(f"\n[System] Transcribing...", end="", flush=True)
-    tracker.start_task("Tool: DeepSpeech (Transcribe)")
+    start_tool_task("Tool: DeepSpeech (Transcribe)")
 
     try:
-        # 1. Run the agent (Standard)
-        response = await agent_deepspeech.run(task)
+        # 1. Run the agent (Standard), keeping the structured results of the tool calls it makes
+        with capture_results() as results:
+            response = await agent_deepspeech.run(task)
         output_text = response.text
         
-        # 2. Inline Logic: Try to read the transcript file locally
-        if "Success" in output_text:
+        # 2. Inline Logic: Read the transcript of the last successful transcription
+        transcripts = [r for r in results if r.tool == "deepspeech" and r.ok]
+        if transcripts:
             try:
-                # Attempt to find the docker path in the response
-                # Response format expected: "... saved at: /data/outputs/..."
-                if "at: " in output_text:
-                    docker_path = output_text.split("at: ")[1].strip().split()[0]
-                    
-                    # Manual Path Translation (Inline)
-                    local_path = docker_path.replace("/data/", "./media_data/")
-                    
-                    # Verify and Read
-                    if os.path.exists(local_path) and local_path.endswith(".tar.gz"):
-                        with tarfile.open(local_path, "r:gz") as tar:
-                            # Find the first .txt file
-                            txt_file = next((m for m in tar.getmembers() if m.name.endswith(".txt")), None)
-                            if txt_file:
-                                f = tar.extractfile(txt_file)
-                                content = f.read().decode('utf-8')
-                                
-                                # Append the ACTUAL TEXT to the output
-                                output_text += f"\n\n[TRANSCRIPT EXTRACTED]:\n{content}\n"
+                local_path = transcripts[-1].local_path
+                if local_path and os.path.exists(local_path) and local_path.endswith(".tar.gz"):
+                    with tarfile.open(local_path, "r:gz") as tar:
+                        # Find the first .txt file
+                        txt_file = next((m for m in tar.getmembers() if m.name.endswith(".txt")), None)
+                        if txt_file:
+                            f = tar.extractfile(txt_file)
+                            content = f.read().decode('utf-8')
+                            
+                            # Append the ACTUAL TEXT to the output
+                            output_text += f"\n\n[TRANSCRIPT EXTRACTED]:\n{content}\n"
             except Exception as e:
                 output_text += f"\n(Note: Could not auto-read transcript text: {str(e)})"
 
         return output_text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: DeepSpeech (Transcribe)")
 
 async def delegate_to_ffmpeg0(task: str) -> str:
     """Send a task to the ffmpeg0 agent (General Audio Extraction)."""
     print(f"\n[System] Running Extract Audio...", end="", flush=True)
-    tracker.start_task("Tool: FFmpeg0 (Extract)")
+    start_tool_task("Tool: FFmpeg0 (Extract)")
     try:
         response = await agent_ffmpeg0.run(task)
         return response.text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: FFmpeg0 (Extract)")
 
 async def delegate_to_librosa(task: str) -> str:
     """Send a task to the Librosa agent (Timestamp Generation)."""
     print(f"\n[System] Running Timestamp Analysis...", end="", flush=True)
-    tracker.start_task("Tool: Librosa (Timestamps)")
+    start_tool_task("Tool: Librosa (Timestamps)")
     try:
         response = await agent_librosa.run(task)
         return response.text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: Librosa (Timestamps)")
 
 async def delegate_to_grep(task: str) -> str:
     """Send a task to the grep agent (Content Search)."""
     print(f"\n[System] Running Grep Search...", end="", flush=True)
-    tracker.start_task("Tool: Grep (Search)")
+    start_tool_task("Tool: Grep (Search)")
     try:
         response = await agent_grep.run(task)
         return response.text
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: Grep (Search)")
+
+# --- Fan-out: several independent delegations in one Manager call ---
+class SubTask(TypedDict):
+    agent: Literal["ffmpeg0", "ffmpeg1", "ffmpeg2", "deepspeech", "librosa", "grep"]
+    task: str
+
+FANOUT_DELEGATES = {
+    "ffmpeg0": delegate_to_ffmpeg0,
+    "ffmpeg1": delegate_to_ffmpeg1,
+    "ffmpeg2": delegate_to_ffmpeg2,
+    "deepspeech": delegate_to_deepspeech,
+    "librosa": delegate_to_librosa,
+    "grep": delegate_to_grep,
+}
+
+async def delegate_to_fanout(
+    tasks: Annotated[list[SubTask], "The sub-tasks: which agent to send each one to, and the task for it."]
+) -> str:
+    """
+    Run several INDEPENDENT sub-tasks at the same time, e.g. preparing or transcribing several clips.
+    Only for sub-tasks that do not need each other's output. Returns one JSON report with the result
+    (or the error) of every sub-task, in the order given.
+    """
+    print(f"\n[Fan-out] Running {len(tasks)} sub-task(s), {FANOUT_CONCURRENCY} at a time", end="", flush=True)
+    start_task(tracker, "Tool: Fan-out")
+    try:
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+
+        async def run_one(index, sub_task):
+            _in_fanout_branch.set(True)  # Each gathered branch runs in its own copy of the context
+            agent, task = sub_task.get("agent"), sub_task.get("task")
+            entry = {"index": index, "agent": agent, "task": task}
+            delegate = FANOUT_DELEGATES.get(agent)
+            if delegate is None or not task:
+                entry.update(status="error", error=f"Unknown agent '{agent}' or empty task")
+                return entry
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    entry.update(status="ok", output=await delegate(task))
+                except Exception as e:
+                    # One failed branch does not take the others down
+                    entry.update(status="error", error=str(e))
+                entry["seconds"] = round(time.perf_counter() - start, 2)
+            return entry
+
+        results = await asyncio.gather(*(run_one(i, t) for i, t in enumerate(tasks)))
+        failed = sum(r["status"] != "ok" for r in results)
+        print(f"\n[Fan-out] Done: {len(results) - failed} ok, {failed} failed.")
+        return json.dumps({"completed": len(results) - failed, "failed": failed, "results": results})
+    finally:
+        stop_task(tracker, "Tool: Fan-out")
+
+async def delegate_to_search_first(video_path: str, keyword: str) -> str:
+    """
+    Find and save the clips of a FULL VIDEO (.mp4) that contain a keyword, in one call.
+    Transcribes the audio once with word timings and only cuts clips around the matches.
+    Prefer this over splitting the whole video and transcribing every clip.
+    """
+    print(f"\n[System] Search-first pipeline on: {video_path}", end="", flush=True)
+    start_tool_task("Tool: Search-First Pipeline")
+    try:
+        # Path Translation (Docker paths and shell-escaped spaces)
+        video_path = video_path.replace("\\ ", " ")
+        if video_path.startswith("/data/"):
+            video_path = video_path.replace("/data/", "./media_data/")
+        if not os.path.exists(video_path):
+            return f"Error: File {video_path} not found."
+
+        report = await search_then_cut(video_path, keyword)
+        if "error" in report:
+            return f"Search-first pipeline failed: {report['error']}"
+
+        lines = [f"Search-first pipeline complete: {len(report['hits'])} hit(s) for '{keyword}', "
+                 f"{len(report['windows'])} clip(s) cut."]
+        for (start, end), msg in zip(report["windows"], report["saved"]):
+            lines.append(f"- {start:.1f}s-{end:.1f}s: {msg}")
+        return "\n".join(lines)
+    finally:
+        stop_tool_task("Tool: Search-First Pipeline")
+
+async def delegate_to_library_search(keyword: str) -> str:
+    """
+    Find and save the clips containing a keyword across ALL videos already ingested into the library
+    (see library.py). No video is transcribed again: only the clips around the matches are cut.
+    """
+    print(f"\n[System] Library search for: {keyword}", end="", flush=True)
+    start_tool_task("Tool: Library Search")
+    try:
+        results = await Library().search_and_cut(keyword)
+        if not results:
+            return f"No video in the library contains '{keyword}'."
+
+        lines = [f"'{keyword}' found in {len(results)} video(s):"]
+        for result in results:
+            lines.append(f"- {result['path']}: {len(result['hits'])} hit(s)")
+            lines.extend(f"    {msg}" for msg in result.get("saved", []))
+        return "\n".join(lines)
+    finally:
+        stop_tool_task("Tool: Library Search")
 
 # --- 2. THE BATCH PROCESSOR (The Agent-Driven Loop) ---
 async def delegate_to_batch_processor(folder_path: str, keyword: str) -> str:
     print(f"\n\n[Batch Processor] Starting loop on: {folder_path}")
-    tracker.start_task("Tool: Batch Processor Loop")
+    start_tool_task("Tool: Batch Processor Loop")
     
     try:
         # 1. Path Translation
@@ -165,6 +287,21 @@ async def delegate_to_batch_processor(folder_path: str, keyword: str) -> str:
             return "Error: No clips found."
 
         print(f"[Batch Processor] Found {len(clips)} clips. Starting sequential processing...")
+
+        # Every finished stage is journaled, so a crashed run resumes where it stopped
+        journal = BatchJournal(folder_path, keyword)
+        if journal.resumed_clips:
+            print(f"[Batch Processor] Resuming from {journal.path} ({journal.resumed_clips} clip(s) journaled)")
+
+        async def run_stage(clip_path, stage, tool_name, input_path, **data):
+            result = journal.completed(clip_path, stage)
+            if result is not None:
+                print(" (resumed)", end="")
+                return result
+            result = await arun_tool(tool_name, input_path, **data)
+            if result.ok:
+                journal.record(clip_path, stage, result)
+            return result
         
         results_table = "| Clip Name | Saved? | Transcript Excerpt |\n|---|---|---|\n"
         
@@ -172,61 +309,66 @@ async def delegate_to_batch_processor(folder_path: str, keyword: str) -> str:
             filename = os.path.basename(clip_path)
             print(f"\n--- [{i+1}/{len(clips)}] {filename} ---")
             
+            # The stages hand over structured results (status, output path, match flag),
+            # so the tools are called directly instead of through an agent round trip each.
             # ---------------------------------------------------------
-            # STEP A: PREP (FFMPEG2)
+            # STEP A: PREP (FFMPEG2), skipped when deepspeech streams the clip itself
             # ---------------------------------------------------------
-            print(f"    > Prep...", end="", flush=True)
-            # We call the TOOL directly (call_ffmpeg2) or the AGENT?
-            # Let's use the AGENT to maintain the pattern, but parse carefully.
-            resp_prep = await agent_ffmpeg2.run(f"Prepare audio for: {clip_path}")
-            prep_text = resp_prep.text
-            
-            prep_docker = extract_path_from_text(prep_text)
-            if not prep_docker:
-                print(f" FAILED. Agent output: {prep_text[:50]}...")
-                results_table += f"| {filename} | ERROR (Prep) | N/A |\n"
-                continue
-                
-            print(f" Done.")
-            prep_local = prep_docker.replace("/data/", "./media_data/")
+            transcribe_input = clip_path
+            if not DEEPSPEECH_STREAMING:
+                print(f"    > Prep...", end="", flush=True)
+                prep = await run_stage(clip_path, "prepared", "ffmpeg2", clip_path)
+                if not prep.ok:
+                    print(f" FAILED. {prep}")
+                    results_table += f"| {filename} | ERROR (Prep) | N/A |\n"
+                    continue
+                print(f" Done.")
+                transcribe_input = prep.local_path
+
+            # ---------------------------------------------------------
+            # STEP A2: SCREEN (FAST DEEPSPEECH), two-tier search only
+            # ---------------------------------------------------------
+            if BATCH_TWO_TIER:
+                print(f"    > Screening...", end="", flush=True)
+                screen = await run_stage(clip_path, "screened", "deepspeech", transcribe_input, fast="1")
+                if screen.ok:
+                    score = await asyncio.to_thread(screen_score, screen.local_path, keyword)
+                    if score < SCREEN_THRESHOLD:
+                        print(f" Not a candidate (score {score:.2f}).")
+                        results_table += f"| {filename} | NO | (screened out, score {score:.2f}) |\n"
+                        continue
+                    print(f" Candidate (score {score:.2f}).")
+                else:
+                    # Without a screening result we cannot rule the clip out
+                    print(f" FAILED, transcribing fully. {screen}")
 
             # ---------------------------------------------------------
             # STEP B: TRANSCRIBE (DEEPSPEECH)
             # ---------------------------------------------------------
             print(f"    > Transcribe...")
-            
-            # Ensure file extension
-            if os.path.isdir(prep_local):
-                if os.path.exists(os.path.join(prep_local, "result.tar.gz")):
-                    prep_local = os.path.join(prep_local, "result.tar.gz")
-
-            resp_trans = await agent_deepspeech.run(f"Transcribe: {prep_local}")
-            trans_text = resp_trans.text
-
-            trans_docker = extract_path_from_text(trans_text)
-            if not trans_docker:
-                print(f" FAILED. Agent output: {trans_text[:50]}...")
+            trans = await run_stage(clip_path, "transcribed", "deepspeech", transcribe_input)
+            if not trans.ok:
+                print(f" FAILED. {trans}")
                 results_table += f"| {filename} | ERROR (Transcribe) | N/A |\n"
                 continue
 
-            trans_local = trans_docker.replace("/data/", "./media_data/")
-            
             # ---------------------------------------------------------
-            # STEP C: SEARCH (AGENT GREP)
+            # STEP C: SEARCH (GREP)
             # ---------------------------------------------------------
             print(f"    > Searching for '{keyword}'", end="", flush=True)
-            
-            grep_prompt = f"Search for the word '{keyword}' in {trans_local}"
-            resp_grep = await agent_grep.run(grep_prompt)
-            grep_output = resp_grep.text.lower().strip()
-            
-            # Determine success based on Agent response
-            # (Grep agent returns "Match found" or "No")
+            grep = await run_stage(clip_path, "searched", "grep", trans.local_path, word=keyword)
             saved_status = "NO"
             
-            if "found" in grep_output or "match" in grep_output: # Could also be "match found"
+            if not grep.ok:
+                print(f" FAILED. {grep}")
+                saved_status = "ERROR (Search)"
+            elif grep.match:
                 print(" MATCH! Saving...", end="")
-                save_msg = save_to_highlights(clip_path)
+                save_msg = journal.completed(clip_path, "saved")
+                if save_msg is None:
+                    save_msg = save_to_highlights(clip_path, source_video=folder_path, keyword=keyword)
+                    if "Success" in save_msg:
+                        journal.record(clip_path, "saved", save_msg)
                 if "Success" in save_msg:
                     print(" Saved.")
                     saved_status = "YES"
@@ -237,13 +379,15 @@ async def delegate_to_batch_processor(folder_path: str, keyword: str) -> str:
                 print(" No Match.")
 
             # Truncate output for table
+            grep_output = str(grep)
             clean_grep_output = (grep_output[:50] + '...') if len(grep_output) > 50 else grep_output
             results_table += f"| {filename} | {saved_status} | {clean_grep_output} |\n"
 
+        journal.close()
         print("\n[Batch Processor] Loop Complete.")
         return f"Batch Processing Complete.\n\n{results_table}"
     finally:
-        tracker.stop_task()
+        stop_tool_task("Tool: Batch Processor Loop")
     
 async def main():
 
@@ -258,14 +402,19 @@ async def main():
         exit(1)
 
     tracker.start()
+    usage_recorder.start_run(getattr(tracker, "run_id", None))
     
+    # The delegate tools are timed so the Manager's model time can be told apart from the sub-agent/tool time
+    manager_tools = [delegate_to_ffmpeg0, delegate_to_ffmpeg1, delegate_to_ffmpeg2,
+                     delegate_to_deepspeech, delegate_to_librosa, delegate_to_grep,
+                     delegate_to_batch_processor, delegate_to_search_first,
+                     delegate_to_library_search, delegate_to_fanout]
     agent_manager = client.create_agent(
         name = "Manager",
         instructions=manager_instructions,
-        tools=[delegate_to_ffmpeg0, delegate_to_ffmpeg1, delegate_to_ffmpeg2,
-               delegate_to_deepspeech, delegate_to_librosa, delegate_to_grep,
-               delegate_to_batch_processor]
+        tools=[timed_tool(t) for t in manager_tools]
     )
+    agent_manager = with_metrics(StreamingAgent(agent_manager), "Manager")
     
     # Testing full pipeline (Implicit Reasoning Test)
     user_prompt = f"Please find all the clips containing the word 'caffeine' in {base_data_dir}/video.mp4"
@@ -274,13 +423,20 @@ async def main():
     
     tracker.start_task("LLM Thinking")
     response = await agent_manager.run(user_prompt)
-    tracker.stop_task()
+    stop_task(tracker, "LLM Thinking")
     
     print(f"\nManager: {response.text}")
     tracker.stop()
+    record_run_metadata(usage_recorder.run_id, manager_instructions_txtFile)
+
+    # LLM usage report (saved next to the emissions CSVs)
+    usage_recorder.save()
+    print(f"\n[LLM Usage] Saved to {usage_recorder.output_file}")
+    print(usage_recorder.summary())
 
     # Cleanup
-    reset_directories(["media_data/uploads", "media_data/outputs"])
+    await http_client.aclose()
+    reset_directories(["media_data/uploads", "media_data/outputs", "media_data/scratch"])
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
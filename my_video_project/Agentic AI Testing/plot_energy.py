@@ -4,6 +4,8 @@ import os
 import matplotlib.cm as cm
 import numpy as np
 
+from ingest_emissions import ingest, load_store, ENERGY_COLS, POWER_COLS
+
 # --- Configuration ---
 EMISSIONS_FOLDER = "./Agentic AI Testing/emissions_data"
 MAIN_FILE = "emissions.csv"
@@ -12,36 +14,25 @@ FILE_PATH = os.path.join(EMISSIONS_FOLDER, MAIN_FILE)
 
 PLOT_COUNTRY = False # Country was used in my analysis, but its not always required
 
-# 1. Load & Process Main Emissions Data
+# 1. Ingest new runs into the consolidated store (only run_ids not seen before are parsed)
 if not os.path.exists(FILE_PATH):
     print(f"Error: '{FILE_PATH}' not found.")
     exit()
 
-df = pd.read_csv(FILE_PATH)
-
-# Process Model Name (project name is equal to the model name used in .env)
-if 'project_name' not in df.columns:
-    print("Error: 'project_name' column missing.")
+try:
+    added = ingest(EMISSIONS_FOLDER)
+except ValueError as e:
+    print(f"Error: {e}")
     exit()
-df['Model'] = df['project_name']
-
-# Location Preprocessing
-if 'country_name' in df.columns:
-    df['Location'] = df['country_name'].fillna('Unknown')
-else:
-    df['Location'] = 'Unknown'
+print(f"Ingested {added} new run(s) from '{EMISSIONS_FOLDER}'.")
 
-# Clean data
-df_main = df.dropna(subset=['Model']).copy()
+df_main, df_tasks = load_store(EMISSIONS_FOLDER)
 
 # 2. Aggregations (Energy, Power, Emissions)
-energy_cols = ['cpu_energy', 'gpu_energy', 'ram_energy']
-power_cols = ['cpu_power', 'gpu_power', 'ram_power']
+energy_cols = ENERGY_COLS
+power_cols = POWER_COLS
 metrics = energy_cols + power_cols + ['emissions']
 
-for m in metrics:
-    if m not in df_main.columns: df_main[m] = 0
-
 # Group by Model (Window 1)
 avg_data_model = df_main.groupby('Model')[metrics].mean()
 
@@ -49,66 +40,11 @@ avg_data_model = df_main.groupby('Model')[metrics].mean()
 avg_data_location = df_main.groupby('Location')[metrics].mean()
 
 
-# 3. Process Granular Data (Tasks)
-print(f"Processing granular files from '{EMISSIONS_FOLDER}'...")
-task_data = []
-
-NORMALIZATION_MAP = {
-    "Batch Processor": "Batch Processor Loop",
-    "FFmpeg0": "Tool: FFmpeg0 (Extract)",
-    "FFmpeg1": "Tool: FFmpeg1 (Split)",
-    "FFmpeg2": "Tool: FFmpeg2 (Prep)",
-    "DeepSpeech": "Tool: DeepSpeech",
-    "Librosa": "Tool: Librosa",
-    "Grep": "Tool: Grep",
-    "LLM Agent": "LLM Agent Pipeline",
-    "Manager": "LLM Agent Pipeline"
-}
-
-def normalize_task_name(raw_name):
-    """
-    Standardizes task names by matching substrings against a predefined map.
-    e.g. "Tool: Librosa (Timestamps)_3d948c43-1ed7-42a5-8004-f71efb9abc16 -> Tool: Librosa".
-    This is essential for grouping dynamic task names together in plots.
-    """
-    raw_lower = str(raw_name).lower()
-    for key, standard_name in NORMALIZATION_MAP.items():
-        if key.lower() in raw_lower:
-            return standard_name
-    return raw_name
-
-for index, row in df_main.iterrows():
-    run_id = row['run_id']
-    model_name = row['Model']
-    location_name = row['Location']
-    
-    granular_file = os.path.join(EMISSIONS_FOLDER, f"emissions_base_{run_id}.csv")
-    
-    if os.path.exists(granular_file):
-        try:
-            sub_df = pd.read_csv(granular_file)
-            if 'task_name' in sub_df.columns and 'duration' in sub_df.columns:
-                run_task_sums = {}
-                for _, task_row in sub_df.iterrows():
-                    clean = normalize_task_name(task_row['task_name'])
-                    run_task_sums[clean] = run_task_sums.get(clean, 0) + task_row['duration']
-
-                for t_name, t_dur in run_task_sums.items():
-                    task_data.append({
-                        'Model': model_name,
-                        'Location': location_name,
-                        'Task': t_name,
-                        'Duration': t_dur
-                    })
-        except Exception: pass
-    else:
-        pass
-
-if not task_data:
+# 3. Granular Data (Tasks) - already normalized and summed per run by the ingestion step
+if df_tasks.empty:
     df_time_model = pd.DataFrame()
     df_time_location = pd.DataFrame()
 else:
-    df_tasks = pd.DataFrame(task_data)
     df_time_model = df_tasks.pivot_table(index='Model', columns='Task', values='Duration', aggfunc='mean').fillna(0)
     df_time_location = df_tasks.pivot_table(index='Location', columns='Task', values='Duration', aggfunc='mean').fillna(0)
 
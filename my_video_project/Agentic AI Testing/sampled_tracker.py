@@ -0,0 +1,158 @@
+import os
+import csv
+import time
+import threading
+import psutil
+from codecarbon import EmissionsTracker
+
+# Configuration
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("SAMPLED_TRACKER_INTERVAL", 1.0))
+# Only used to shape the power curve between codecarbon measurements; the totals are
+# rescaled to what codecarbon measured for the whole run.
+CPU_TDP_WATTS = float(os.getenv("SAMPLED_TRACKER_CPU_TDP", 20.0))
+RAM_WATTS = float(os.getenv("SAMPLED_TRACKER_RAM_POWER", 3.0))
+
+
+class SampledEmissionsTracker:
+    """
+    Low-overhead replacement for the per-task codecarbon mode.
+
+    codecarbon measures the run as a whole (no task transitions, no per-task CSV writes),
+    while a background thread samples CPU utilisation at a fixed interval.
+    start_task/stop_task only push/remove a name on an in-memory stack; energy between samples is
+    attributed to the innermost running task. At stop() the per-task estimates are rescaled to
+    the energy codecarbon measured and written as ONE emissions_base_<run_id>.csv.
+
+    Durations are exclusive: time spent in a nested task is not counted again in its parent.
+    """
+
+    def __init__(self, project_name, output_dir, interval=SAMPLE_INTERVAL_SECONDS):
+        self.project_name = project_name
+        self.output_dir = output_dir
+        self.interval = interval
+        self._tracker = EmissionsTracker(project_name=project_name, output_dir=output_dir)
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stack = []
+        self._totals = {}  # task name (None = outside any task) -> [duration_s, estimated_energy_Ws]
+        self._last_flush = None
+        self._last_power = 0.0
+
+    @property
+    def run_id(self):
+        return getattr(self._tracker, "run_id", None)
+
+    # --- Public API (same calls main.py makes on the codecarbon tracker) ---
+    def start(self):
+        self._tracker.start()
+        psutil.cpu_percent(interval=None)  # First call only primes the counter
+        self._last_flush = time.perf_counter()
+        self._last_power = self._sample_power()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="power-sampler", daemon=True)
+        self._thread.start()
+
+    def start_task(self, task_name):
+        with self._lock:
+            self._flush(time.perf_counter())
+            self._stack.append(task_name)
+
+    def stop_task(self, task_name=None):
+        """
+        Closes the named task wherever it is on the stack (the innermost task if no name is given),
+        so interleaved callers (e.g. concurrent tool calls) never close each other's task.
+        """
+        with self._lock:
+            self._flush(time.perf_counter())
+            if task_name is None:
+                if self._stack:
+                    self._stack.pop()
+            elif task_name in self._stack:
+                del self._stack[len(self._stack) - 1 - self._stack[::-1].index(task_name)]
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._flush(time.perf_counter())
+
+        emissions = self._tracker.stop()
+        self._write_run_record(getattr(self._tracker, "final_emissions_data", None), emissions)
+        return emissions
+
+    # --- Internals ---
+    def _sample_power(self):
+        utilisation = psutil.cpu_percent(interval=None) / 100.0
+        return utilisation * CPU_TDP_WATTS + RAM_WATTS
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.interval):
+            power = self._sample_power()
+            with self._lock:
+                self._flush(time.perf_counter())
+                self._last_power = power
+
+    def _flush(self, now):
+        """Attributes the time (and estimated energy) since the last flush to the innermost task."""
+        elapsed = now - self._last_flush
+        self._last_flush = now
+        if elapsed <= 0:
+            return
+        current = self._stack[-1] if self._stack else None
+        totals = self._totals.setdefault(current, [0.0, 0.0])
+        totals[0] += elapsed
+        totals[1] += elapsed * self._last_power
+
+    def _write_run_record(self, run_data, emissions):
+        """Writes one aggregated granular file, in the same format plot_energy/ingest_emissions read."""
+        if not any(name is not None for name in self._totals):
+            return
+
+        total_energy = getattr(run_data, "energy_consumed", None)  # kWh, measured by codecarbon
+        total_emissions = getattr(run_data, "emissions", emissions) or 0.0
+        estimated_total = sum(energy for _, energy in self._totals.values())
+
+        run_id = self.run_id or getattr(run_data, "run_id", None)
+        output_file = os.path.join(self.output_dir, f"emissions_base_{run_id}.csv")
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["task_name", "timestamp", "project_name", "run_id", "duration",
+                             "emissions", "energy_consumed", "tracking_mode"])
+            for task_name, (duration, estimated_energy) in self._totals.items():
+                if task_name is None:
+                    continue  # Untracked time still counts in estimated_total, so tasks don't absorb it
+                share = estimated_energy / estimated_total if estimated_total else 0.0
+                if total_energy is not None:
+                    energy_kwh = total_energy * share
+                else:
+                    energy_kwh = estimated_energy / 3.6e6  # Ws -> kWh
+                writer.writerow([task_name, timestamp, self.project_name, run_id, duration,
+                                 total_emissions * share, energy_kwh, "sampled"])
+
+
+# --- Task calls that work with either tracker ---
+def start_task(tracker, task_name):
+    """
+    Starts task_name on a SampledEmissionsTracker or a codecarbon EmissionsTracker.
+    codecarbon measures one task at a time and ignores start_task while one is active,
+    so its active task (the Manager's "LLM Thinking") is closed first.
+    """
+    if not isinstance(tracker, SampledEmissionsTracker):
+        tracker.stop_task()
+    tracker.start_task(task_name)
+
+
+def stop_task(tracker, task_name):
+    """
+    Stops task_name. codecarbon suffixes repeated names with a uuid, so there the active task is
+    stopped without a name.
+    """
+    if isinstance(tracker, SampledEmissionsTracker):
+        tracker.stop_task(task_name)
+    else:
+        tracker.stop_task()
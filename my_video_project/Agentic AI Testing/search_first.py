@@ -0,0 +1,234 @@
+import os
+import io
+import json
+import uuid
+import shutil
+import hashlib
+import asyncio
+import difflib
+import tarfile
+from tools import arun_tool, save_to_highlights, SCRATCH_DIR
+
+# Configuration
+# Seconds of context kept around a hit before snapping to the surrounding silence boundaries
+HIT_PADDING_SECONDS = float(os.getenv("SEARCH_FIRST_PADDING", 1.0))
+# Two-tier search: a clip goes to the full transcription only if its fast (rough) transcript contains
+# something at least this similar to the keyword. Lower = better recall, more clips fully transcribed.
+SCREEN_THRESHOLD = float(os.getenv("TWO_TIER_THRESHOLD", 0.7))
+# ffmpeg1 builds a keyframe index of the video it cuts; it is cached next to the video as <video>.keyframes.json
+KEYFRAME_INDEX_SUFFIX = ".keyframes.json"
+
+
+def _read_member(archive_path, member_name):
+    """Returns the content of one file of a .tar.gz package (or None)."""
+    with tarfile.open(archive_path, "r:gz") as tar:
+        member = next((m for m in tar.getmembers() if os.path.basename(m.name) == member_name), None)
+        if member is None:
+            return None
+        return tar.extractfile(member).read().decode("utf-8")
+
+
+def _to_seconds(timestamp):
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def load_boundaries(librosa_package):
+    """Silence boundaries (seconds) from the librosa timestamps.txt ("HH:MM:SS HH:MM:SS" per segment)."""
+    content = _read_member(librosa_package, "timestamps.txt") or ""
+    boundaries = {0.0}
+    for line in content.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            boundaries.update(_to_seconds(p) for p in parts)
+    return sorted(boundaries)
+
+
+def find_hits(words, keyword):
+    """
+    (start, end) in seconds of every occurrence of the keyword in the timed transcript.
+    Same matching as the grep tool (case-insensitive substring), applied per word or per run of
+    words for multi-word keywords.
+    """
+    phrase = keyword.lower().strip()
+    n = max(1, len(phrase.split()))
+    hits = []
+    for i in range(len(words) - n + 1):
+        window = words[i:i + n]
+        if phrase in " ".join(w["word"].lower() for w in window):
+            hits.append((window[0]["start"], window[-1]["end"]))
+    return hits
+
+
+def approximate_match(text, keyword):
+    """
+    Similarity (0..1) of the keyword to its closest run of words in a rough transcript (fast pass: no
+    scorer, so words come out misspelled or split/merged). Runs of n-1..n+1 words are compared, n being
+    the number of words of the keyword, with the spaces removed.
+    """
+    target = "".join(keyword.lower().split())
+    words = text.lower().split()
+    if not target or not words:
+        return 0.0
+    n = len(keyword.split())
+    best = 0.0
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    for size in range(max(1, n - 1), n + 2):
+        for i in range(len(words) - size + 1):
+            candidate = "".join(words[i:i + size])
+            if target in candidate:
+                return 1.0
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                best = max(best, matcher.ratio())
+    return best
+
+
+def screen_score(fast_transcript_package, keyword):
+    """approximate_match on the transcript of a fast deepspeech package."""
+    return approximate_match(_read_member(fast_transcript_package, "transcript.txt") or "", keyword)
+
+
+def snap_to_boundaries(hits, boundaries, padding=HIT_PADDING_SECONDS):
+    """Widens each hit to the enclosing silence boundaries and merges windows that overlap."""
+    windows = []
+    for start, end in hits:
+        start = max(0.0, start - padding)
+        end = end + padding
+        start = max((b for b in boundaries if b <= start), default=start)
+        end = min((b for b in boundaries if b >= end), default=end)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def cached_keyframe_index(video_path):
+    """Path of the keyframe index cached next to the video, if it is still valid for it (else None)."""
+    index_path = video_path + KEYFRAME_INDEX_SUFFIX
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(video_path):
+        return None
+    try:
+        with open(index_path) as f:
+            size = json.load(f).get("size")
+    except ValueError:
+        return None
+    return index_path if size == os.path.getsize(video_path) else None
+
+
+def keep_keyframe_index(video_path, clips_dir):
+    """Caches the index ffmpeg1 built (keyframes.json next to the clips) next to the source video."""
+    built = os.path.join(clips_dir, "keyframes.json")
+    if os.path.exists(built) and cached_keyframe_index(video_path) is None:
+        shutil.copyfile(built, video_path + KEYFRAME_INDEX_SUFFIX)
+
+
+def build_cut_package(video_path, windows, package_path):
+    """
+    Package in the format ffmpeg1 expects: video.mp4 + timestamps.txt (one 'start end' line per clip),
+    plus keyframes.json when the video's keyframe index is cached (ffmpeg1 then skips the ffprobe scan).
+    """
+    os.makedirs(os.path.dirname(package_path), exist_ok=True)
+    timestamps = "".join(f"{start:.3f} {end:.3f}\n" for start, end in windows).encode("utf-8")
+    index_path = cached_keyframe_index(video_path)
+    # A stored (uncompressed) tar: the video is already compressed, gzip would only cost CPU.
+    # Written under a temp name, so a concurrent search never sends a half-written package.
+    tmp_path = f"{package_path}.{uuid.uuid4().hex}.part"
+    with tarfile.open(tmp_path, "w") as tar:
+        tar.add(video_path, arcname="video.mp4")
+        info = tarfile.TarInfo("timestamps.txt")
+        info.size = len(timestamps)
+        tar.addfile(info, io.BytesIO(timestamps))
+        if index_path:
+            tar.add(index_path, arcname="keyframes.json")
+    os.replace(tmp_path, package_path)
+    return package_path
+
+
+def load_words(transcript_package):
+    """Word timings ([{word, start, end}]) from a timed deepspeech package."""
+    return json.loads(_read_member(transcript_package, "transcript.json") or '{"words": []}')["words"]
+
+
+async def analyse_audio(video_path):
+    """
+    Stages 1-2, shared with the library ingestion: audio track, then the timed transcript and the
+    silence boundaries in parallel. Returns the structured results {"audio", "transcribe", "boundaries"}
+    (the last two are None if the audio extraction failed).
+    """
+    audio = await arun_tool("ffmpeg2", video_path, audio_only="1")
+    if not audio.ok:
+        return {"audio": audio, "transcribe": None, "boundaries": None}
+
+    transcript, silences = await asyncio.gather(
+        arun_tool("deepspeech", audio.local_path, timed="1"),
+        arun_tool("librosa", audio.local_path),
+    )
+    return {"audio": audio, "transcribe": transcript, "boundaries": silences}
+
+
+async def cut_and_save(video_path, windows, keyword):
+    """Stage 3: ffmpeg1 cuts only the given windows, each clip is saved to the highlights."""
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    # One package per video and keyword: searches for different keywords on the same video never share it
+    keyword_hash = hashlib.sha1(keyword.encode("utf-8")).hexdigest()[:12]
+    package = await asyncio.to_thread(
+        build_cut_package, video_path, windows, os.path.join(SCRATCH_DIR, "search_first", f"{name}_{keyword_hash}_hits.tar"))
+    cut = await arun_tool("ffmpeg1", package)
+    if not cut.ok:
+        return cut, []
+
+    # ffmpeg1 writes clip_<i>.mp4 (one per timestamps line) into the folder named after its output prefix
+    clips_dir = cut.local_path[:-len(".tar.gz")] if cut.local_path.endswith(".tar.gz") else cut.local_path
+    await asyncio.to_thread(keep_keyframe_index, video_path, clips_dir)
+    saved = []
+    for i in range(len(windows)):
+        clip_path = os.path.join(clips_dir, f"clip_{i}.mp4")
+        saved.append(save_to_highlights(clip_path, source_video=video_path, keyword=keyword))
+    return cut, saved
+
+
+async def search_then_cut(video_path, keyword):
+    """
+    Search-first pipeline: transcribe the whole audio track ONCE, find the keyword on the timeline,
+    and only cut the clips around the hits (instead of cutting everything and transcribing every clip).
+
+        1. ffmpeg2 (audio only)  -> 16 kHz mono wav, no video re-encode
+        2. deepspeech (timed) and librosa, in parallel on that package -> word timings / silence boundaries
+        3. hits snapped to the silence boundaries -> ffmpeg1 cuts only those windows
+    Returns a dict with the hits, windows, saved clips and the structured results of every stage.
+    """
+    report = {"video": video_path, "keyword": keyword, "hits": [], "windows": [], "saved": [], "stages": {}}
+
+    # 1-2. Audio track, then timed transcript and silence boundaries
+    stages = await analyse_audio(video_path)
+    report["stages"].update({k: v for k, v in stages.items() if v is not None})
+    transcript, silences = stages["transcribe"], stages["boundaries"]
+    if not stages["audio"].ok:
+        report["error"] = str(stages["audio"])
+        return report
+    if not transcript.ok:
+        report["error"] = str(transcript)
+        return report
+
+    hits = find_hits(load_words(transcript.local_path), keyword)
+    report["hits"] = hits
+    if not hits:
+        return report
+
+    # Without librosa boundaries we still cut, just around the padded hits
+    boundaries = load_boundaries(silences.local_path) if silences.ok else []
+    windows = snap_to_boundaries(hits, boundaries)
+    report["windows"] = windows
+
+    # 3. Cut only the windows with hits
+    cut, saved = await cut_and_save(video_path, windows, keyword)
+    report["stages"]["cut"] = cut
+    report["saved"] = saved
+    if not cut.ok:
+        report["error"] = str(cut)
+    return report
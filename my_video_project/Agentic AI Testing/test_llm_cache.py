@@ -0,0 +1,70 @@
+"""
+Which sub-agent runs the response cache stores: run `python -m unittest test_llm_cache` from this folder.
+"""
+import os
+import asyncio
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+os.environ["LLM_CACHE_ENABLED"] = "0"  # No shared cache file: each test opens its own
+from llm_cache import ResponseCache, CachedAgent
+
+
+def call_grep(file_path: str, keyword: str) -> str:
+    """Searches a transcript package for a keyword."""
+    return "[grep Success]: Word found 1 time(s)"
+
+
+def agent_response(result, exception=None):
+    """An agent run that called call_grep once and got 'result' back."""
+    call = SimpleNamespace(type="function_call", name="call_grep",
+                           arguments={"file_path": "/data/outputs/a.tar.gz", "keyword": "caffeine"})
+    outcome = SimpleNamespace(type="function_result", result=result, exception=exception)
+    return SimpleNamespace(text="done", messages=[SimpleNamespace(contents=[call]),
+                                                  SimpleNamespace(contents=[outcome])])
+
+
+class FakeAgent:
+    def __init__(self, response):
+        self.response = response
+
+    async def run(self, prompt):
+        return self.response
+
+
+class CachedAgentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ResponseCache(path=os.path.join(self.tmp, "responses.sqlite3"))
+
+    def tearDown(self):
+        self.cache._conn.close()
+        shutil.rmtree(self.tmp)
+
+    def stored(self, response):
+        agent = CachedAgent(FakeAgent(response), "grep", "instructions", [call_grep], self.cache)
+        asyncio.run(agent.run("find caffeine"))
+        key = ResponseCache.make_key("grep", "instructions", "find caffeine", agent._schema)
+        return self.cache.get(key) is not None
+
+    def test_successful_tool_call_is_stored(self):
+        self.assertTrue(self.stored(agent_response("[grep Success]: Word found 1 time(s)")))
+
+    def test_failed_tool_output_is_not_stored(self):
+        for result in ("[grep Error]: Connection refused", "[grep Failed]: Logs: exit 1",
+                       "[grep Cancelled]: deadline", "Error: File /data/outputs/a.tar.gz not found."):
+            with self.subTest(result=result):
+                self.assertFalse(self.stored(agent_response(result)))
+
+    def test_unsuccessful_json_result_is_not_stored(self):
+        self.assertFalse(self.stored(agent_response('{"success": false, "error": "busy"}')))
+        self.assertFalse(self.stored(agent_response({"status": "error"})))
+
+    def test_tool_exception_is_not_stored(self):
+        self.assertFalse(self.stored(agent_response(None, exception="TimeoutError")))
+
+
+if __name__ == "__main__":
+    unittest.main()
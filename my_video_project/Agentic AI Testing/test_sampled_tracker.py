@@ -0,0 +1,65 @@
+"""
+Task sequence of main.py (Manager thinking -> tool calls -> fan-out) against both trackers:
+run `python -m unittest test_sampled_tracker` from this folder.
+"""
+import shutil
+import logging
+import tempfile
+import unittest
+
+from codecarbon import EmissionsTracker
+
+from sampled_tracker import SampledEmissionsTracker, start_task, stop_task
+
+TOOL_TASKS = ["Tool: Grep (Search)", "Tool: Grep (Search)", "Tool: Fan-out"]
+
+
+def run_manager_turn(tracker):
+    """What main.py does: "LLM Thinking" is still active when the Manager calls its tools."""
+    tracker.start_task("LLM Thinking")
+    for name in TOOL_TASKS:
+        start_task(tracker, name)
+        stop_task(tracker, name)
+    stop_task(tracker, "LLM Thinking")
+
+
+class CodecarbonTaskTest(unittest.TestCase):
+    def setUp(self):
+        logging.getLogger("codecarbon").setLevel(logging.ERROR)
+        self.output_dir = tempfile.mkdtemp()
+        self.tracker = EmissionsTracker(project_name="test", output_dir=self.output_dir, save_to_file=False,
+                                        measure_power_secs=60, log_level="error")
+        self.tracker.start()
+
+    def tearDown(self):
+        self.tracker.stop()
+        shutil.rmtree(self.output_dir)
+
+    def test_every_tool_call_is_measured(self):
+        run_manager_turn(self.tracker)
+        tasks = self.tracker._tasks
+        # Repeated names get a uuid suffix; every task was started and stopped with its energy recorded
+        for name in set(TOOL_TASKS) | {"LLM Thinking"}:
+            measured = [t for key, t in tasks.items() if key.split("_")[0] == name]
+            self.assertEqual(len(measured), TOOL_TASKS.count(name) or 1, name)
+            for task in measured:
+                self.assertFalse(task.is_active, name)
+                self.assertIsNotNone(task.emissions_data, name)
+        self.assertIsNone(self.tracker._active_task)
+
+
+class SampledTaskTest(unittest.TestCase):
+    def test_tool_calls_nest_in_llm_thinking(self):
+        output_dir = tempfile.mkdtemp()
+        try:
+            tracker = SampledEmissionsTracker(project_name="test", output_dir=output_dir)
+            tracker._last_flush = 0.0
+            run_manager_turn(tracker)
+            self.assertEqual(tracker._stack, [])
+            self.assertTrue(set(TOOL_TASKS) | {"LLM Thinking"} <= set(tracker._totals))
+        finally:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
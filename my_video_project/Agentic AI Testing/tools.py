@@ -1,12 +1,46 @@
-import requests
 import os
+import asyncio
 import json
+import struct
+import hashlib
+import time
 import shutil
-from typing import Annotated
+import functools
+import contextlib
+import contextvars
+import threading
+import uuid
+from typing import Annotated, Optional
+from dataclasses import dataclass, field
 import tarfile
+from http_client import post_file, apost_file, file_sha256, cancel_job, acancel_job
+
+try:
+    import fcntl  # Reflinks (Linux only)
+except ImportError:
+    fcntl = None
 
 # Configuration
 DJANGO_BASE = "http://localhost:8000"
+TOOL_ENDPOINTS = {
+    "ffmpeg0": "ffmpeg0",
+    "ffmpeg1": "ffmpeg1",
+    "ffmpeg2": "ffmpeg2",
+    "deepspeech": "deepspeech",
+    "librosa": "librosa",
+    "grep": "grep",
+}
+HIGHLIGHTS_DIR = "./Agentic AI Testing/final_highlights"
+# content sha256 -> {path, size, matches: [{source_video, clip, keyword, saved_at}]}
+HIGHLIGHTS_INDEX = os.path.join(HIGHLIGHTS_DIR, "highlights.json")
+# Clips listed by inspect_archive are only extracted here when a tool first uses them
+SCRATCH_DIR = "./media_data/scratch"
+# Written in each scratch folder: {archive, members: {relative path: member name}},
+# so a listed clip can still be extracted after a restart or by another process
+SCRATCH_MANIFEST = "_archive.json"
+
+_FICLONE = 0x40049409
+_highlights_lock = threading.Lock()
 
 def call_ffmpeg1(
     file_path: Annotated[str, "The local path to the .tar.gz file containing video and timestamps."]
@@ -15,8 +49,7 @@ def call_ffmpeg1(
     Directly calls the /ffmpeg1/ endpoint.
     Use this to SPLIT videos based on a timestamp file.
     """
-    url = f"{DJANGO_BASE}/ffmpeg1/"
-    return _send_post(url, file_path, "ffmpeg1")
+    return str(run_tool("ffmpeg1", file_path))
 
 def call_ffmpeg2(
     file_path: Annotated[str, "The local path to the .mp4 file."]
@@ -26,8 +59,7 @@ def call_ffmpeg2(
     Use this to PREPARE audio (extracts mono/16kHz wav) for transcription.
     Output is a .tar.gz file.
     """
-    url = f"{DJANGO_BASE}/ffmpeg2/"
-    return _send_post(url, file_path, "ffmpeg2")
+    return str(run_tool("ffmpeg2", file_path))
 
 def call_deepspeech(
     file_path: Annotated[str, "The local path to the .tar.gz file (usually output from ffmpeg2)."]
@@ -36,8 +68,7 @@ def call_deepspeech(
     Directly calls the /deepspeech/ endpoint.
     Use this to TRANSCRIBE audio to text.
     """
-    url = f"{DJANGO_BASE}/deepspeech/"
-    return _send_post(url, file_path, "deepspeech")
+    return str(run_tool("deepspeech", file_path))
 
 def call_ffmpeg0(
     file_path: Annotated[str, "The local path to the .mp4 file."]
@@ -48,9 +79,7 @@ def call_ffmpeg0(
     Input: .mp4
     Output: .tar.gz (containing video and .wav)
     """
-    url = f"{DJANGO_BASE}/ffmpeg0/"
-    # We use the same helper function _send_post from the previous step
-    return _send_post(url, file_path, "ffmpeg0")
+    return str(run_tool("ffmpeg0", file_path))
 
 def call_librosa(
     file_path: Annotated[str, "The local path to the .tar.gz file containing .mp4 and .wav."]
@@ -61,8 +90,7 @@ def call_librosa(
     Input: .tar.gz (video + wav)
     Output: .tar.gz (video + timestamps.txt)
     """
-    url = f"{DJANGO_BASE}/librosa/"
-    return _send_post(url, file_path, "librosa")
+    return str(run_tool("librosa", file_path))
 
 def call_grep(
     file_path: Annotated[str, "The local path to the .tar.gz file (output of Deepspeech)."],
@@ -72,39 +100,16 @@ def call_grep(
     Directly calls the /grep/ endpoint.
     Search for a word in the transcript.
     Input: .tar.gz (video + script) AND a keyword string.
-    Output: The video file path (if found).
+    Output: Whether the word was found, how many times, and the text around it.
     """
-    url = f"{DJANGO_BASE}/grep/"
-    
-    if not os.path.exists(file_path):
-        return f"[grep Error]: Input path '{file_path}' does not exist."
-        
-    try:
-        with open(file_path, 'rb') as f:
-            # We send BOTH the file and the keyword
-            payload = {'word': keyword}
-            files = {'file': f}
-            
-            resp = requests.post(url, files=files, data=payload)
-            
-            try:
-                data = resp.json()
-                is_match = data.get('match', False)
-
-                if resp.status_code == 200 and is_match:
-                    return f"[grep Success]: Word found. Video retrieved at: {data.get('output_location')}"
-                else:
-                    return f"[grep Failed]: {data.get('logs', resp.text)}"
-            except:
-                return f"[grep Error]: Server returned non-JSON response."
-    except Exception as e:
-        return f"[grep System Error]: {str(e)}"
+    return str(run_tool("grep", file_path, word=keyword))
     
 def inspect_archive(
     file_path: Annotated[str, "The local path to the .tar.gz file."]
 ) -> str:
     """
-    Extracts a .tar.gz file and returns a list of absolute paths for all .mp4 files inside.
+    Lists the .mp4 files inside a .tar.gz file (with size and duration) without extracting it.
+    The paths returned can be passed to the other tools as-is: each clip is extracted on first use.
     Use this to see what clips were generated before processing them.
     """
     # 1. Path Translation
@@ -114,43 +119,161 @@ def inspect_archive(
     if not os.path.exists(file_path):
         return f"Error: File {file_path} not found."
         
-    # 2. Extract
-    extract_dir = file_path + "_extracted"
-    os.makedirs(extract_dir, exist_ok=True)
-    
+    # 2. Read the member headers (one streaming pass, nothing is written to disk)
+    scratch = _scratch_dir_for(file_path)
     try:
-        with tarfile.open(file_path, "r:gz") as tar:
-            tar.extractall(path=extract_dir)
-            
-        # 3. List Files
-        mp4_files = []
-        for root, dirs, files in os.walk(extract_dir):
-            for file in files:
-                if file.endswith(".mp4"):
-                    # Return absolute paths so other tools can find them easily
-                    full_path = os.path.abspath(os.path.join(root, file))
-                    mp4_files.append(full_path)
-                    
-        if not mp4_files:
+        clips = []
+        with tarfile.open(file_path, "r|gz") as tar:
+            for member in tar:
+                if not (member.isfile() and member.name.endswith(".mp4")):
+                    continue
+                # Duration comes from the mp4 header, read from the stream while we are on this member
+                duration = _mp4_duration(tar.extractfile(member))
+                local_path = os.path.abspath(os.path.join(scratch, member.name))
+                clips.append((local_path, member.name, member.size, duration))
+
+        if not clips:
             return "No .mp4 files found in the archive."
-            
-        # Join list into a string for the LLM to read
-        return "Files found:\n" + "\n".join(mp4_files)
+        _write_scratch_manifest(scratch, file_path, [name for _, name, _, _ in clips])
+
+        # 3. List Files (absolute paths so other tools can find them easily)
+        lines = []
+        for local_path, _, size, duration in clips:
+            duration_text = f"{duration:.2f} s" if duration is not None else "unknown"
+            lines.append(f"{local_path}\t(size: {size / 1e6:.2f} MB, duration: {duration_text})")
+        return "Files found:\n" + "\n".join(lines)
 
     except Exception as e:
         return f"Error reading archive: {str(e)}"
 
+def _scratch_dir_for(archive_path):
+    """One scratch folder per archive (keyed by path, size and mtime, so a rebuilt archive gets a new one)."""
+    stat = os.stat(archive_path)
+    key = f"{os.path.abspath(archive_path)}:{stat.st_size}:{stat.st_mtime}"
+    name = os.path.basename(archive_path).split(".")[0]
+    return os.path.join(SCRATCH_DIR, f"{name}_{hashlib.sha1(key.encode()).hexdigest()[:12]}")
+
+def _write_scratch_manifest(scratch, archive_path, member_names):
+    os.makedirs(scratch, exist_ok=True)
+    manifest_path = os.path.join(scratch, SCRATCH_MANIFEST)
+    tmp = f"{manifest_path}.{uuid.uuid4().hex}.part"
+    with open(tmp, "w") as f:
+        # Keyed by the path relative to the scratch folder ("./clip_0.mp4" is extracted to clip_0.mp4)
+        members = {os.path.normpath(name): name for name in member_names}
+        json.dump({"archive": os.path.abspath(archive_path), "members": members}, f)
+    os.replace(tmp, manifest_path)
+
+def _pending_clip(local_path):
+    """(archive path, member name) of a clip listed by inspect_archive, from the manifest of its scratch folder, or None."""
+    scratch_root = os.path.abspath(SCRATCH_DIR)
+    if not local_path.startswith(scratch_root + os.sep):
+        return None
+    # Members can sit in sub-folders of the archive: walk up to the scratch folder that has the manifest
+    folder = os.path.dirname(local_path)
+    while folder.startswith(scratch_root + os.sep):
+        try:
+            with open(os.path.join(folder, SCRATCH_MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            folder = os.path.dirname(folder)
+            continue
+        except (OSError, ValueError):
+            return None
+        member_name = manifest.get("members", {}).get(os.path.relpath(local_path, folder))
+        return (manifest["archive"], member_name) if member_name else None
+    return None
+
+def _materialize(file_path):
+    """Extracts a clip listed by inspect_archive the first time a tool needs it."""
+    local_path = os.path.abspath(file_path)
+    pending = None if os.path.exists(local_path) else _pending_clip(local_path)
+    if pending is None:
+        return file_path
+
+    archive_path, member_name = pending
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    try:
+        with tarfile.open(archive_path, "r:gz") as tar:
+            src = tar.extractfile(tar.getmember(member_name))
+            tmp = local_path + ".part"
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            os.replace(tmp, local_path)
+    except (tarfile.TarError, KeyError, OSError) as e:
+        print(f"[System] Could not extract {member_name} from {archive_path}: {e}")
+    return file_path
+
+def clear_scratch():
+    """Deletes every clip extracted on demand."""
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+def _mp4_duration(stream):
+    """
+    Reads the duration (seconds) from the moov/mvhd box of an mp4 stream, or None.
+    Boxes before moov (e.g. mdat) are skipped by reading past them; with ffmpeg's default
+    layout moov is at the end, so this still reads the clip, but never writes it anywhere.
+    """
+    def read_box_header():
+        header = stream.read(8)
+        if len(header) < 8:
+            return None, None, 0
+        size, box_type = struct.unpack(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack(">Q", stream.read(8))[0]
+            header_len = 16
+        return box_type, size, header_len
+
+    def skip(n):
+        while n > 0:
+            chunk = stream.read(min(n, 1024 * 1024))
+            if not chunk:
+                return
+            n -= len(chunk)
+
+    try:
+        while True:
+            box_type, size, header_len = read_box_header()
+            if box_type is None:
+                return None
+            if box_type != b"moov":
+                if size == 0:
+                    return None  # Box runs to the end of the file
+                skip(size - header_len)
+                continue
+
+            end = size - header_len
+            while end > 0:
+                child_type, child_size, child_header_len = read_box_header()
+                if child_type is None:
+                    return None
+                if child_type == b"mvhd":
+                    version = stream.read(4)[0]
+                    if version == 1:
+                        timescale, duration = struct.unpack(">IQ", stream.read(28)[16:])
+                    else:
+                        timescale, duration = struct.unpack(">II", stream.read(16)[8:])
+                    return duration / timescale if timescale else None
+                skip(child_size - child_header_len)
+                end -= child_size
+            return None
+    except (struct.error, IndexError):
+        return None
+
 def save_to_highlights(
-    file_path: Annotated[str, "The local path to the .mp4 file that matched."]
+    file_path: Annotated[str, "The local path to the .mp4 file that matched."],
+    source_video: Annotated[str, "The video (or split folder) the clip was cut from."] = "",
+    keyword: Annotated[str, "The keyword the clip matched."] = ""
 ) -> str:
     """
-    Copies a specific .mp4 file to the './Agentic AI Testing/final_highlights' folder.
+    Saves a specific .mp4 file to the './Agentic AI Testing/final_highlights' folder.
     Use this when a clip matches the search criteria.
     """
     # 1. Path Translation (Docker -> Local)
     if file_path.startswith("/data/"):
         file_path = file_path.replace("/data/", "./media_data/")
     
+    _materialize(file_path)
     if not os.path.exists(file_path):
         return f"Error: File {file_path} not found."
     
@@ -159,35 +282,238 @@ def save_to_highlights(
 
     # 2. Setup Custom Output Folder
     # We now point explicitly to your Agentic AI Testing folder
-    highlights_dir = "./Agentic AI Testing/final_highlights"
-    os.makedirs(highlights_dir, exist_ok=True)
+    os.makedirs(HIGHLIGHTS_DIR, exist_ok=True)
 
-    # 3. Copy File
-    filename = os.path.basename(file_path)
-    dest_path = os.path.join(highlights_dir, filename)
-    
     try:
-        shutil.copy(file_path, dest_path)
+        digest = file_sha256(file_path)
+        with _highlights_lock:
+            index = _load_highlights_index()
+            entry = index.get(digest)
+
+            # 3. Same content already saved: only record where it was found this time
+            if entry and os.path.exists(entry["path"]):
+                dest_path, method = entry["path"], "duplicate"
+            else:
+                # A different clip with the same name must not overwrite the saved one
+                filename = os.path.basename(file_path)
+                dest_path = os.path.join(HIGHLIGHTS_DIR, filename)
+                if os.path.exists(dest_path):
+                    stem, ext = os.path.splitext(filename)
+                    dest_path = os.path.join(HIGHLIGHTS_DIR, f"{stem}_{digest[:8]}{ext}")
+                method = _link_or_copy(file_path, dest_path)
+                entry = {"path": dest_path, "size": os.path.getsize(dest_path), "matches": []}
+                index[digest] = entry
+
+            entry["matches"].append({
+                "source_video": source_video,
+                "clip": file_path,
+                "keyword": keyword,
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            _save_highlights_index(index)
+
+        if method == "duplicate":
+            return f"Success: Clip already saved at {dest_path} (identical content)"
         return f"Success: Clip saved to {dest_path}"
     except Exception as e:
         return f"Error saving clip: {str(e)}"
 
-# --- Helper (Internal) ---
-def _send_post(url, fpath, tool_name):
-    if not os.path.exists(fpath):
-        return f"[{tool_name} Error]: File {fpath} not found."
-    
+def _link_or_copy(src, dest):
+    """
+    A reflink (copy-on-write clone, e.g. btrfs/XFS) when the filesystem supports it, else a hardlink when
+    source and destination share a filesystem, else a plain copy. Returns the method used.
+    Hardlinks are safe here: worker outputs are never rewritten in place (each job writes into its own
+    output folder and files are published with os.replace), so the saved highlight cannot change.
+    """
+    if fcntl is not None:
+        try:
+            with open(src, "rb") as s, open(dest, "wb") as d:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            return "reflink"
+        except OSError:
+            if os.path.exists(dest):
+                os.remove(dest)
+
+    if os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dest))).st_dev:
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError:
+            pass
+
+    shutil.copy2(src, dest)
+    return "copy"
+
+def _load_highlights_index():
     try:
-        with open(fpath, 'rb') as f:
-            resp = requests.post(url, files={'file': f})
+        with open(HIGHLIGHTS_INDEX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_highlights_index(index):
+    tmp = HIGHLIGHTS_INDEX + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, HIGHLIGHTS_INDEX)
+
+# --- Async variants ---
+# Same name, signature and docstring as the sync tools (so the LLM sees identical tools),
+# but awaitable: the request doesn't block the event loop the agents run on.
+def _async_tool(sync_tool, tool_name):
+    async def tool(file_path):
+        return str(await arun_tool(tool_name, file_path))
+    return functools.update_wrapper(tool, sync_tool)
+
+call_ffmpeg0_async = _async_tool(call_ffmpeg0, "ffmpeg0")
+call_ffmpeg1_async = _async_tool(call_ffmpeg1, "ffmpeg1")
+call_ffmpeg2_async = _async_tool(call_ffmpeg2, "ffmpeg2")
+call_deepspeech_async = _async_tool(call_deepspeech, "deepspeech")
+call_librosa_async = _async_tool(call_librosa, "librosa")
+
+async def _call_grep_async(file_path, keyword):
+    return str(await arun_tool("grep", file_path, word=keyword))
+
+call_grep_async = functools.update_wrapper(_call_grep_async, call_grep)
+
+# --- Structured results ---
+# The call_* tools give the LLM a line of text; code (main.py) uses run_tool/arun_tool and reads the fields.
+@dataclass
+class ToolResult:
+    tool: str
+    status: str  # "success", "failed" (the tool ran and failed), "cancelled" (killed: deadline or cancel) or "error" (the call itself failed)
+    output_location: Optional[str] = None  # Docker path (/data/...)
+    output_paths: list = field(default_factory=list)
+    match: Optional[bool] = None  # grep only
+    match_count: Optional[int] = None  # grep only: occurrences of the word
+    hits: list = field(default_factory=list)  # grep only: [{offset, snippet}] (the first ones)
+    timings: dict = field(default_factory=dict)  # total_seconds/exec_seconds from Django, client_seconds
+    message: str = ""
+
+    @property
+    def ok(self):
+        return self.status == "success"
+
+    @property
+    def local_path(self):
+        """output_location as seen from the orchestrator (./media_data/...)."""
+        if self.output_location and self.output_location.startswith("/data/"):
+            return self.output_location.replace("/data/", "./media_data/", 1)
+        return self.output_location
+
+    def touch(self):
+        """
+        Marks the output as read. We read it through our own mount, so the backend's storage GC only learns
+        about the access from the mtime of the output folder (see core/storage.py).
+        """
+        if self.local_path and os.path.exists(self.local_path):
             try:
-                data = resp.json()
-                if resp.status_code == 200:
-                    # Return the Output Location so the next agent knows where to look
-                    return f"[{tool_name} Success]: Output saved at: {data.get('output_location')}"
-                else:
-                    return f"[{tool_name} Failed]: Logs: {data.get('logs', resp.text)}"
-            except:
-                return f"[{tool_name} Error]: Non-JSON response from server."
+                os.utime(os.path.dirname(self.local_path))
+            except OSError:
+                pass
+
+    def __str__(self):
+        if self.status == "error":
+            return f"[{self.tool} Error]: {self.message}"
+        if self.status == "failed":
+            return f"[{self.tool} Failed]: Logs: {self.message}"
+        if self.status == "cancelled":
+            return f"[{self.tool} Cancelled]: {self.message}"
+        if self.tool == "grep":
+            if self.match:
+                snippets = "; ".join(f'"{h["snippet"]}"' for h in self.hits[:3])
+                text = f"[grep Success]: Word found {self.match_count} time(s): {snippets}"
+                return f"{text}. Video retrieved at: {self.output_location}" if self.output_location else text
+            return f"[grep No Match]: {self.message or 'Word not found in clip.'}"
+        # Return the Output Location so the next agent knows where to look
+        return f"[{self.tool} Success]: Output saved at: {self.output_location}"
+
+_captured_results = contextvars.ContextVar("captured_results", default=None)
+
+@contextlib.contextmanager
+def capture_results():
+    """
+    Collects the ToolResult of every tool call made inside the block, including calls an agent
+    makes on our behalf:  with capture_results() as results: await agent.run(...)
+    """
+    results = []
+    token = _captured_results.set(results)
+    try:
+        yield results
+    finally:
+        _captured_results.reset(token)
+
+def _record(result):
+    results = _captured_results.get()
+    if results is not None:
+        results.append(result)
+    return result
+
+def _check_input(tool_name, fpath):
+    _materialize(fpath)
+    if not os.path.exists(fpath):
+        return ToolResult(tool_name, "error", message=f"File {fpath} not found.")
+    return None
+
+def run_tool(tool_name, file_path, **data) -> ToolResult:
+    """Calls a tool endpoint (extra form fields, e.g. word=..., are passed through)."""
+    error = _check_input(tool_name, file_path)
+    if error:
+        return _record(error)
+
+    # Our own job id, so the job can be cancelled while we wait for it
+    job_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    try:
+        resp = post_file(f"{DJANGO_BASE}/{TOOL_ENDPOINTS[tool_name]}/", file_path, data={**data, "job_id": job_id})
+        return _record(_parse_response(resp, tool_name, time.perf_counter() - started))
+    except KeyboardInterrupt:
+        cancel_job(DJANGO_BASE, job_id)
+        raise
     except Exception as e:
-        return f"[{tool_name} System Error]: {str(e)}"
\ No newline at end of file
+        return _record(ToolResult(tool_name, "error", message=f"System Error: {str(e)}"))
+
+async def arun_tool(tool_name, file_path, **data) -> ToolResult:
+    """Async version of run_tool."""
+    error = await asyncio.to_thread(_check_input, tool_name, file_path)
+    if error:
+        return _record(error)
+
+    job_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    try:
+        resp = await apost_file(f"{DJANGO_BASE}/{TOOL_ENDPOINTS[tool_name]}/", file_path, data={**data, "job_id": job_id})
+        return _record(_parse_response(resp, tool_name, time.perf_counter() - started))
+    except asyncio.CancelledError:
+        # The caller gave up (e.g. a cancelled gather): the worker process must not keep running
+        await acancel_job(DJANGO_BASE, job_id)
+        raise
+    except Exception as e:
+        return _record(ToolResult(tool_name, "error", message=f"System Error: {str(e)}"))
+
+def _parse_response(resp, tool_name, client_seconds):
+    try:
+        data = resp.json()
+    except ValueError:
+        return ToolResult(tool_name, "error", message="Non-JSON response from server.")
+
+    timings = {**(data.get("timings") or {}), "client_seconds": round(client_seconds, 3)}
+    if data.get("status") == "cancelled":
+        return ToolResult(tool_name, "cancelled", timings=timings, message=data.get("error", ""))
+    if resp.status_code != 200 or data.get("status") != "success":
+        return ToolResult(tool_name, "failed", timings=timings,
+                          message=data.get("logs") or data.get("error") or resp.text)
+
+    result = ToolResult(
+        tool=tool_name,
+        status="success",
+        output_location=data.get("output_location"),
+        output_paths=data.get("output_paths") or ([data["output_location"]] if data.get("output_location") else []),
+        match=data.get("match"),
+        match_count=data.get("count"),
+        hits=data.get("hits") or [],
+        timings=timings,
+        message=data.get("message", ""),
+    )
+    result.touch()
+    return result
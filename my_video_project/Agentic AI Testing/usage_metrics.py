@@ -0,0 +1,214 @@
+import os
+import csv
+import time
+import uuid
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
+from dotenv import load_dotenv
+from agent_framework import AgentRunResponse
+
+load_dotenv()
+
+# Configuration
+USAGE_FILE = "./Agentic AI Testing/emissions_data/llm_usage.csv"
+# Prices in USD per 1M tokens (set them in .env to get a cost column that means something)
+PRICE_INPUT_PER_1M = float(os.getenv("LLM_PRICE_INPUT_PER_1M", 0))
+PRICE_OUTPUT_PER_1M = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", 0))
+
+# The record of the agent call that is currently running (tools add their time to it)
+_current_record = contextvars.ContextVar("current_llm_record", default=None)
+
+
+@dataclass
+class CallRecord:
+    """One agent.run call. Times are in seconds."""
+    run_id: str
+    project_name: str
+    agent: str
+    timestamp: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    ttft: float = 0.0
+    latency: float = 0.0
+    tool_time: float = 0.0
+    tool_calls: int = 0
+    cached: bool = False
+    cost: float = 0.0
+
+    @property
+    def model_time(self):
+        return max(self.latency - self.tool_time, 0.0)
+
+    def add_usage(self, usage):
+        """Reads token counts from the framework's usage details (if the response has them)."""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "input_token_count", None) or 0
+        self.completion_tokens += getattr(usage, "output_token_count", None) or 0
+        self.cost = (self.prompt_tokens * PRICE_INPUT_PER_1M + self.completion_tokens * PRICE_OUTPUT_PER_1M) / 1_000_000
+
+
+class UsageRecorder:
+    """
+    Collects CallRecords for the current run and writes them to the usage CSV
+    (next to the codecarbon files, one row per agent call, appended across runs).
+    """
+
+    def __init__(self, output_file=USAGE_FILE):
+        self.output_file = output_file
+        self.run_id = None
+        self.project_name = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        self.records = []
+
+    def start_run(self, run_id=None):
+        # Use the codecarbon run_id when available so usage rows join with emissions_base_<run_id>.csv
+        self.run_id = str(run_id or uuid.uuid4())
+        self.records = []
+
+    @contextmanager
+    def track(self, agent_name):
+        record = CallRecord(
+            run_id=self.run_id,
+            project_name=self.project_name,
+            agent=agent_name,
+            timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        )
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.latency = time.perf_counter() - start
+            _current_record.reset(token)
+            self.records.append(record)
+
+    def save(self):
+        if not self.records:
+            return
+        os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+        write_header = not os.path.exists(self.output_file)
+        columns = [f.name for f in fields(CallRecord)] + ["model_time"]
+
+        with open(self.output_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            if write_header:
+                writer.writeheader()
+            for record in self.records:
+                writer.writerow({**asdict(record), "model_time": record.model_time})
+
+    def summary(self) -> str:
+        """Per-agent totals for the current run, costliest agent first."""
+        per_agent = {}
+        for r in self.records:
+            s = per_agent.setdefault(r.agent, {"calls": 0, "cached": 0, "in": 0, "out": 0,
+                                               "ttft": 0.0, "model": 0.0, "tool": 0.0, "cost": 0.0})
+            s["calls"] += 1
+            s["cached"] += int(r.cached)
+            s["in"] += r.prompt_tokens
+            s["out"] += r.completion_tokens
+            s["ttft"] += r.ttft
+            s["model"] += r.model_time
+            s["tool"] += r.tool_time
+            s["cost"] += r.cost
+
+        lines = [
+            "| Agent | Calls (cached) | Prompt tok | Completion tok | Avg TTFT (s) | Model time (s) | Tool time (s) | Cost ($) |",
+            "|---|---|---|---|---|---|---|---|",
+        ]
+        for name, s in sorted(per_agent.items(), key=lambda kv: kv[1]["model"], reverse=True):
+            live_calls = s["calls"] - s["cached"]
+            avg_ttft = s["ttft"] / live_calls if live_calls else 0.0
+            lines.append(
+                f"| {name} | {s['calls']} ({s['cached']}) | {s['in']} | {s['out']} | "
+                f"{avg_ttft:.2f} | {s['model']:.1f} | {s['tool']:.1f} | {s['cost']:.4f} |"
+            )
+        return "\n".join(lines)
+
+
+# Shared recorder used by agents.py and main.py
+usage_recorder = UsageRecorder()
+
+
+def timed_tool(fn):
+    """
+    Decorator for agent tools: adds the tool's execution time to the agent call that invoked it.
+    functools.wraps keeps the signature and docstring, so the tool schema the LLM sees is unchanged.
+    """
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _add_tool_time(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _add_tool_time(time.perf_counter() - start)
+    return wrapper
+
+
+def _add_tool_time(elapsed):
+    record = _current_record.get()
+    if record is not None:
+        record.tool_time += elapsed
+        record.tool_calls += 1
+
+
+class StreamingAgent:
+    """
+    Runs the wrapped agent through 'run_stream' so the time to the first update (TTFT)
+    can be recorded, then rebuilds the usual response object from the updates.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def __getattr__(self, item):
+        return getattr(self.agent, item)
+
+    async def run(self, prompt, **kwargs):
+        if not hasattr(self.agent, "run_stream"):
+            return await self.agent.run(prompt, **kwargs)
+
+        record = _current_record.get()
+        start = time.perf_counter()
+        updates = []
+        async for update in self.agent.run_stream(prompt, **kwargs):
+            if not updates and record is not None:
+                record.ttft = time.perf_counter() - start
+            updates.append(update)
+        return AgentRunResponse.from_agent_run_response_updates(updates)
+
+
+class MeteredAgent:
+    """Records latency, tokens and cache hits of every 'run' call into the UsageRecorder."""
+
+    def __init__(self, agent, name, recorder):
+        self.agent = agent
+        self.name = name
+        self.recorder = recorder
+
+    def __getattr__(self, item):
+        return getattr(self.agent, item)
+
+    async def run(self, prompt, **kwargs):
+        with self.recorder.track(self.name) as record:
+            response = await self.agent.run(prompt, **kwargs)
+            record.cached = getattr(response, "from_cache", False)
+            record.add_usage(getattr(response, "usage_details", None))
+            return response
+
+
+def with_metrics(agent, name):
+    """Returns the agent wrapped so its calls are recorded by the shared usage recorder."""
+    return MeteredAgent(agent, name, usage_recorder)
@@ -0,0 +1,128 @@
+# backend/core/admission.py
+"""
+Admission control for the tool endpoints.
+
+Each worker container runs at most TOOL_CONCURRENCY jobs at once; up to TOOL_QUEUE_SIZE more wait
+for a slot. Beyond that the request is turned away straight away (429 with a Retry-After estimated
+from the recent job durations), so a burst cannot pile processes into a worker and every admitted
+request has a bounded wait.
+The gates are per Django process: the backend must run as a single process (see docker-compose.prod.yml).
+"""
+import math
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+# Weight of the latest job in the moving average of the job durations
+DURATION_SMOOTHING = 0.2
+MAX_RETRY_AFTER_SECONDS = 120
+
+
+class ToolBusy(Exception):
+    """The worker's slots and wait queue are full."""
+
+    def __init__(self, worker_name, retry_after):
+        super().__init__(f"{worker_name} is busy, retry in {retry_after}s")
+        self.worker_name = worker_name
+        self.retry_after = retry_after
+
+
+class _ToolGate:
+
+    def __init__(self, concurrency, queue_size):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.admitted = 0  # Running + waiting
+        self.avg_seconds = None
+
+
+class Ticket:
+    """An admitted job. It leaves the gate when its slot is released, or when it is abandoned before running."""
+
+    def __init__(self, controller, gate):
+        self._controller = controller
+        self.gate = gate
+        self._state = "admitted"  # -> "running" | "abandoned"
+        self._lock = threading.Lock()
+
+    def _claim(self):
+        with self._lock:
+            if self._state != "admitted":
+                return False
+            self._state = "running"
+            return True
+
+    def abandon(self):
+        """Releases the admission of a job that never started (e.g. the request was cancelled while queued)."""
+        with self._lock:
+            if self._state != "admitted":
+                return
+            self._state = "abandoned"
+        self._controller._leave(self.gate)
+
+
+class AdmissionController:
+
+    def __init__(self, concurrency, default_concurrency, queue_size):
+        self.concurrency = concurrency
+        self.default_concurrency = default_concurrency
+        self.queue_size = queue_size
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    def _gate(self, worker_name):
+        gate = self._gates.get(worker_name)
+        if gate is None:
+            gate = _ToolGate(max(1, self.concurrency.get(worker_name, self.default_concurrency)), self.queue_size)
+            self._gates[worker_name] = gate
+        return gate
+
+    def _retry_after(self, gate):
+        """Seconds until a queue position is likely to free up (at least 1)."""
+        per_job = gate.avg_seconds if gate.avg_seconds is not None else 1.0
+        waves = (gate.admitted - gate.concurrency + 1) / gate.concurrency
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(per_job * max(1.0, waves))))
+
+    def enter(self, worker_name):
+        """Admits a job (returns its Ticket) or raises ToolBusy. Never blocks; the slot is waited for in slot()."""
+        with self._lock:
+            gate = self._gate(worker_name)
+            if gate.admitted >= gate.concurrency + gate.queue_size:
+                raise ToolBusy(worker_name, self._retry_after(gate))
+            gate.admitted += 1
+            return Ticket(self, gate)
+
+    def _leave(self, gate):
+        with self._lock:
+            gate.admitted -= 1
+
+    @contextmanager
+    def slot(self, ticket):
+        """
+        Waits for a running slot of an admitted job (blocking) and leaves the gate at the end.
+        Yields False, without waiting, if the ticket was abandoned in the meantime.
+        """
+        if not ticket._claim():
+            yield False
+            return
+        try:
+            with ticket.gate.slots:
+                yield True
+        finally:
+            self._leave(ticket.gate)
+
+    def record_duration(self, ticket, seconds):
+        gate = ticket.gate
+        with self._lock:
+            if gate.avg_seconds is None:
+                gate.avg_seconds = seconds
+            else:
+                gate.avg_seconds += DURATION_SMOOTHING * (seconds - gate.avg_seconds)
+
+
+admission = AdmissionController(
+    concurrency=settings.TOOL_CONCURRENCY,
+    default_concurrency=settings.TOOL_DEFAULT_CONCURRENCY,
+    queue_size=settings.TOOL_QUEUE_SIZE,
+)
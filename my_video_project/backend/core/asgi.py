@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Oversized upload chunks are refused from their headers, before Django spools their body
+from core.uploads import ChunkSizeLimit  # noqa: E402 (needs the settings loaded above)
+
+application = ChunkSizeLimit(application)
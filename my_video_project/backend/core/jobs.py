@@ -0,0 +1,151 @@
+# backend/core/jobs.py
+"""
+Deadlines and cancellation of the tool jobs.
+
+Every job has an id (the 'job_id' sent by the client, else a generated one) and runs in its worker with
+TOOL_JOB_ID=<id> and its own TMPDIR in the environment. Every process the job starts inherits both, so
+killing a job means killing each process of the container that carries its id (the whole tree:
+ffmpeg children, the DeepSpeech pool, ...) and removing its TMPDIR.
+
+A job is killed when its deadline (TOOL_DEADLINES) expires, when POST /jobs/<id>/cancel/ is called,
+or when the request that started it goes away. A job cancelled while still queued never starts.
+The registry is per Django process: the backend must run as a single process (see docker-compose.prod.yml).
+"""
+import re
+import uuid
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+JOB_TMP_ROOT = "/tmp/tool_jobs"
+# Runs the job's argv ("$@") in its TMPDIR sandbox. The script is fixed: the arguments (paths, the grep word)
+# are passed to it as positional parameters and are never parsed by the shell.
+JOB_WRAPPER = 'mkdir -p "$TMPDIR"; "$@"; code=$?; rm -rf "$TMPDIR"; exit $code'
+
+
+class JobCancelled(Exception):
+    """The job was killed; reason is "timeout", "cancelled" (explicit cancel) or "disconnected"."""
+
+    def __init__(self, job_id, reason):
+        super().__init__(f"Job {job_id} {'exceeded its deadline' if reason == 'timeout' else 'was cancelled'}")
+        self.job_id = job_id
+        self.reason = reason
+
+
+class InvalidJobId(Exception):
+    """The client's job_id is malformed (400) or already used by a job in progress (409)."""
+
+    def __init__(self, job_id, status):
+        super().__init__(f"Job id '{job_id}' is already in use" if status == 409 else f"Invalid job id '{job_id}'")
+        self.job_id = job_id
+        self.status = status
+
+
+class Job:
+
+    def __init__(self, job_id, worker_name, deadline):
+        self.id = job_id
+        self.worker_name = worker_name
+        self.deadline = deadline
+        self.tmp_dir = f"{JOB_TMP_ROOT}/{job_id}"
+        self.reason = None  # Set once the job is cancelled
+        self.container = None  # Set while the job runs
+        self.lock = threading.Lock()
+
+
+class JobRegistry:
+
+    def __init__(self, deadlines, default_deadline, grace_seconds):
+        self.deadlines = deadlines
+        self.default_deadline = default_deadline
+        self.grace_seconds = grace_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def register(self, worker_name, job_id=None):
+        """
+        New Job, under the client's id if it gave one (else a generated id). Raises InvalidJobId if the
+        client's id is malformed or in use: another request's job must never be cancelled by that id.
+        """
+        with self._lock:
+            if not job_id:
+                job_id = uuid.uuid4().hex
+            elif not JOB_ID_PATTERN.match(job_id):
+                raise InvalidJobId(job_id, 400)
+            elif job_id in self._jobs:
+                raise InvalidJobId(job_id, 409)
+            job = Job(job_id, worker_name, self.deadlines.get(worker_name, self.default_deadline))
+            self._jobs[job_id] = job
+            return job
+
+    def unregister(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def command(self, argv):
+        """exec_run command: runs argv (a list) in the job's TMPDIR sandbox and removes it afterwards."""
+        return ["sh", "-c", JOB_WRAPPER, "tool-job", *argv]
+
+    def environment(self, job):
+        return {"TOOL_JOB_ID": job.id, "TMPDIR": job.tmp_dir}
+
+    @contextmanager
+    def running(self, job, container):
+        """
+        Marks the job as running in the container for the duration of the block and arms its deadline.
+        Yields False (the caller must not start it) if the job was cancelled while queued.
+        """
+        with job.lock:
+            if job.reason is not None:
+                yield False
+                return
+            job.container = container
+        timer = threading.Timer(job.deadline, self.stop, args=(job, "timeout"))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield True
+        finally:
+            timer.cancel()
+            with job.lock:
+                job.container = None
+
+    def cancel(self, job_id, reason="cancelled"):
+        """Cancels a queued or running job. Returns False if there is no such job (or it already finished)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        self.stop(job, reason)
+        return True
+
+    def stop(self, job, reason):
+        """Marks the job as cancelled and kills it if it is running."""
+        with job.lock:
+            if job.reason is None:
+                job.reason = reason
+            container = job.container
+        if container is not None:
+            self._kill(job, container)
+
+    def _kill(self, job, container):
+        """SIGTERM, then SIGKILL after the grace period, every process of the job; removes its TMPDIR."""
+        script = (
+            'pids() { for p in /proc/[0-9]*; do '
+            'tr "\\0" "\\n" 2>/dev/null < "$p/environ" | grep -qx "TOOL_JOB_ID=$1" && echo "${p#/proc/}"; '
+            'done; }; '
+            'kill -TERM $(pids "$1") 2>/dev/null; sleep "$2"; kill -KILL $(pids "$1") 2>/dev/null; '
+            'rm -rf "$3"; true'
+        )
+        try:
+            container.exec_run(["sh", "-c", script, "kill-job", job.id, str(self.grace_seconds), job.tmp_dir])
+        except Exception as e:
+            print(f"[Jobs] Could not kill job {job.id} in {job.worker_name}: {e}")
+
+
+jobs = JobRegistry(
+    deadlines=settings.TOOL_DEADLINES,
+    default_deadline=settings.TOOL_DEFAULT_DEADLINE,
+    grace_seconds=settings.TOOL_KILL_GRACE_SECONDS,
+)
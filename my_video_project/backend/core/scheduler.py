@@ -0,0 +1,81 @@
+# backend/core/scheduler.py
+"""
+Core-aware scheduling of the tool jobs.
+
+The workers share the host CPU without limits, and ffmpeg/x264, DeepSpeech (tflite) and librosa (numba,
+BLAS) each size their thread pools after the core count, so concurrent jobs oversubscribe the CPU.
+Every job run through exec_in_worker first reserves a thread budget out of the host cores:
+    - the budget is passed to the worker as TOOL_THREADS (ffmpeg -threads, DeepSpeech processes)
+      and the usual OMP/BLAS/numba variables;
+    - with SCHEDULER_PIN_CORES, the job is also pinned to the reserved cores (taskset);
+    - when the cores are all reserved, jobs wait in FIFO order, so a big job is not starved by small ones.
+The state is per Django process: the backend must run as a single process (see docker-compose.prod.yml).
+"""
+import threading
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+
+Reservation = namedtuple("Reservation", ["threads", "cores"])
+
+# Variables that cap the thread pools of the tools and the libraries they use
+THREAD_ENV_VARS = ("TOOL_THREADS", "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMBA_NUM_THREADS")
+
+
+class CoreScheduler:
+
+    def __init__(self, total_cores, budgets, default_budget, pin_cores):
+        self.total_cores = max(1, total_cores)
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.pin_cores = pin_cores
+        self._free = list(range(self.total_cores))
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    def budget(self, worker_name):
+        return max(1, min(self.budgets.get(worker_name, self.default_budget), self.total_cores))
+
+    def _acquire(self, threads):
+        ticket = object()
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                self._cond.wait_for(lambda: self._waiting[0] is ticket and len(self._free) >= threads)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            cores, self._free = self._free[:threads], self._free[threads:]
+            return Reservation(threads, tuple(cores))
+
+    def _release(self, reservation):
+        with self._cond:
+            self._free = sorted(self._free + list(reservation.cores))
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, worker_name):
+        """Blocks until the worker's thread budget is available; yields the Reservation."""
+        reservation = self._acquire(self.budget(worker_name))
+        try:
+            yield reservation
+        finally:
+            self._release(reservation)
+
+    def environment(self, reservation):
+        """Environment of the exec'd job."""
+        return {name: str(reservation.threads) for name in THREAD_ENV_VARS}
+
+    def command(self, argv, reservation):
+        """The job's argv, pinned to the reserved cores when SCHEDULER_PIN_CORES is on."""
+        if not self.pin_cores:
+            return argv
+        return ["taskset", "-c", ",".join(str(c) for c in reservation.cores), *argv]
+
+
+core_scheduler = CoreScheduler(
+    total_cores=settings.SCHEDULER_CORES,
+    budgets=settings.TOOL_THREAD_BUDGETS,
+    default_budget=settings.TOOL_THREAD_DEFAULT_BUDGET,
+    pin_cores=settings.SCHEDULER_PIN_CORES,
+)
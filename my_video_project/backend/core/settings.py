@@ -1,4 +1,3 @@
-import os
 """
 Django settings for core project.
 
@@ -11,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -24,7 +24,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-0h3lac$a-k_^nv(d1$b@ma_3f3*hb#6euw+s4(7rg1mvddb(^7'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# The production profile (docker-compose.prod.yml) sets DJANGO_DEBUG=0
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = ['*']
 
@@ -68,6 +69,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
@@ -115,6 +117,73 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/data/uploads'
 
+# Uploads (videos can be several GB)
+# Anything above FILE_UPLOAD_MAX_MEMORY_SIZE is streamed to a temp file instead of RAM.
+# The temp dir is on the shared volume, so saving the upload is a rename and not a second copy.
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 2.5 * 1024 * 1024))
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR', '/data/tmp')
+try:
+    os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+except OSError:
+    FILE_UPLOAD_TEMP_DIR = None  # Outside Docker: fall back to the system temp dir
+# Limit for the non-file part of a request (form fields such as the grep word), and for one chunk PUT to
+# /uploads/<sha256>/ (the orchestrator sends TOOLS_UPLOAD_CHUNK_SIZE, 4 MiB by default)
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('DATA_UPLOAD_MAX_MEMORY_SIZE', 5 * 1024 * 1024))
+
+# Threads used by the async views to wait on blocking Docker/storage calls
+TOOL_EXEC_THREADS = int(os.environ.get('TOOL_EXEC_THREADS', 64))
+
+# CPU budget of the tool jobs (see core/scheduler.py): host cores shared by all the workers,
+# threads reserved per job and whether jobs are pinned to their reserved cores
+SCHEDULER_CORES = int(os.environ.get('SCHEDULER_CORES', os.cpu_count() or 1))
+SCHEDULER_PIN_CORES = os.environ.get('SCHEDULER_PIN_CORES', '0') == '1'
+TOOL_THREAD_BUDGETS = {
+    'worker_ffmpeg0': int(os.environ.get('FFMPEG0_THREADS', 2)),
+    'worker_ffmpeg1': int(os.environ.get('FFMPEG1_THREADS', 2)),
+    'worker_ffmpeg2': int(os.environ.get('FFMPEG2_THREADS', 4)),
+    'worker_deepspeech': int(os.environ.get('DEEPSPEECH_THREADS', 4)),
+    'worker_librosa': int(os.environ.get('LIBROSA_THREADS', 2)),
+    'worker_grep': int(os.environ.get('GREP_THREADS', 1)),
+}
+TOOL_THREAD_DEFAULT_BUDGET = 1
+
+# Admission control (see core/admission.py): jobs running at once per worker, and jobs allowed to wait
+# for a slot (per worker) before requests get a 429. All the waiting jobs hold a TOOL_EXEC_THREADS thread.
+TOOL_CONCURRENCY = {
+    'worker_ffmpeg0': int(os.environ.get('FFMPEG0_CONCURRENCY', 2)),
+    'worker_ffmpeg1': int(os.environ.get('FFMPEG1_CONCURRENCY', 2)),
+    'worker_ffmpeg2': int(os.environ.get('FFMPEG2_CONCURRENCY', 2)),
+    'worker_deepspeech': int(os.environ.get('DEEPSPEECH_CONCURRENCY', 1)),
+    'worker_librosa': int(os.environ.get('LIBROSA_CONCURRENCY', 2)),
+    'worker_grep': int(os.environ.get('GREP_CONCURRENCY', 4)),
+}
+TOOL_DEFAULT_CONCURRENCY = 1
+TOOL_QUEUE_SIZE = int(os.environ.get('TOOL_QUEUE_SIZE', 8))
+
+# Deadlines of the tool jobs in seconds (see core/jobs.py), and how long a killed job gets to exit
+# on SIGTERM before SIGKILL. Keep them below the clients' read timeout (TOOLS_HTTP_READ_TIMEOUT).
+TOOL_DEADLINES = {
+    'worker_ffmpeg0': float(os.environ.get('FFMPEG0_DEADLINE', 600)),
+    'worker_ffmpeg1': float(os.environ.get('FFMPEG1_DEADLINE', 600)),
+    'worker_ffmpeg2': float(os.environ.get('FFMPEG2_DEADLINE', 600)),
+    'worker_deepspeech': float(os.environ.get('DEEPSPEECH_DEADLINE', 840)),
+    'worker_librosa': float(os.environ.get('LIBROSA_DEADLINE', 600)),
+    'worker_grep': float(os.environ.get('GREP_DEADLINE', 120)),
+}
+TOOL_DEFAULT_DEADLINE = 600
+TOOL_KILL_GRACE_SECONDS = float(os.environ.get('TOOL_KILL_GRACE_SECONDS', 5))
+
+# Disk quota for the shared volume (see core/storage.py)
+# Uploads and tool outputs are evicted least-recently-used first once their total size goes
+# over the quota. Artifacts used by a running job, or touched in the last STORAGE_GC_MIN_AGE
+# seconds (outputs the orchestrator has not read yet: it touches them when it does), are never evicted.
+# An upload reported complete is held for STORAGE_UPLOAD_HOLD_SECONDS, until the tool call that uses it.
+SHARED_DATA_ROOT = os.environ.get('SHARED_DATA_ROOT', '/data')
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 50 * 1024 ** 3))
+STORAGE_GC_INTERVAL = float(os.environ.get('STORAGE_GC_INTERVAL', 60))
+STORAGE_GC_MIN_AGE = float(os.environ.get('STORAGE_GC_MIN_AGE', 600))
+STORAGE_UPLOAD_HOLD_SECONDS = float(os.environ.get('STORAGE_UPLOAD_HOLD_SECONDS', 3600))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -0,0 +1,205 @@
+# backend/core/storage.py
+"""
+Disk quota and LRU garbage collection for the shared volume (/data).
+
+Artifacts are the content-addressed uploads (/data/uploads/cas/<sha256>) and the per-job output
+folders (/data/outputs/...). Their size and last access time are kept in a small SQLite index
+on the volume itself, so every Django worker process sees the same state.
+Running (and queued) jobs take a lease on their input and output artifacts, and an upload reported
+complete is held until the tool call that uses it; a background thread evicts the least recently used
+artifacts without a lease until the volume is back under the quota.
+The orchestrator reads outputs through its own mount, not through Django: it touches (utime) an output
+folder when it reads it, and the GC takes the on-disk mtime as an access.
+"""
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+# A lease outlives its job only if the process died; after this it is ignored
+LEASE_TTL_SECONDS = 6 * 3600
+
+
+def _dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass  # File removed while we were walking
+    return total
+
+
+class StorageManager:
+
+    def __init__(self, data_root, db_path, quota_bytes, min_age_seconds, interval_seconds, upload_hold_seconds):
+        self.data_root = data_root
+        self.uploads_cas = os.path.join(data_root, "uploads", "cas")
+        self.outputs_root = os.path.join(data_root, "outputs")
+        self.db_path = db_path
+        self.quota_bytes = quota_bytes
+        self.min_age_seconds = min_age_seconds
+        self.interval_seconds = interval_seconds
+        self.upload_hold_seconds = upload_hold_seconds
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # --- Index ---
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS artifacts (path TEXT PRIMARY KEY, size INTEGER, last_access REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (job_id TEXT, path TEXT, expires_at REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts(last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leases_path ON leases(path)")
+        return conn
+
+    def artifact_for(self, path):
+        """Maps a file to the artifact it belongs to (an upload blob dir or an output folder)."""
+        path = os.path.normpath(path)
+        if path.startswith(self.uploads_cas + os.sep):
+            digest = os.path.relpath(path, self.uploads_cas).split(os.sep)[0]
+            return os.path.join(self.uploads_cas, digest)
+        return path
+
+    def touch(self, *paths):
+        """Registers/refreshes artifacts (size is measured now)."""
+        now = time.time()
+        with self._connect() as conn:
+            for path in {self.artifact_for(p) for p in paths}:
+                if os.path.exists(path):
+                    conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)", (path, _dir_size(path), now))
+
+    @contextmanager
+    def job(self, *paths):
+        """Leases the given artifacts for the duration of a job, so the GC never deletes them mid-run."""
+        self.ensure_started()
+        job_id = uuid.uuid4().hex
+        artifacts = {self.artifact_for(p) for p in paths}
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO leases VALUES (?, ?, ?)",
+                             [(job_id, p, time.time() + LEASE_TTL_SECONDS) for p in artifacts])
+        try:
+            yield job_id
+        finally:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM leases WHERE job_id = ?", (job_id,))
+            # Outputs have been written now: record their real size and the access
+            self.touch(*artifacts)
+
+    def hold(self, path, seconds=None):
+        """
+        Leases an artifact for a while without a job (default: the upload hold), e.g. an upload just
+        reported complete, so it cannot be evicted before the tool call that uses it takes its own lease.
+        The lease simply expires.
+        """
+        self.ensure_started()
+        self.touch(path)
+        expires_at = time.time() + (self.upload_hold_seconds if seconds is None else seconds)
+        with self._connect() as conn:
+            conn.execute("INSERT INTO leases VALUES (?, ?, ?)",
+                         (f"hold-{uuid.uuid4().hex}", self.artifact_for(path), expires_at))
+
+    # --- Garbage collection ---
+    def scan(self):
+        """Registers artifacts that exist on disk but not in the index (e.g. after an upgrade)."""
+        found = []
+        if os.path.isdir(self.uploads_cas):
+            found += [os.path.join(self.uploads_cas, d) for d in os.listdir(self.uploads_cas)]
+        if os.path.isdir(self.outputs_root):
+            for entry in os.listdir(self.outputs_root):
+                path = os.path.join(self.outputs_root, entry)
+                if entry == "cas" and os.path.isdir(path):
+                    # Outputs of content-addressed inputs: outputs/cas/<sha>/<name>_<tool>_<run id>
+                    for digest in os.listdir(path):
+                        digest_dir = os.path.join(path, digest)
+                        if os.path.isdir(digest_dir):
+                            found += [os.path.join(digest_dir, d) for d in os.listdir(digest_dir)]
+                elif not entry.startswith("."):
+                    found.append(path)
+
+        with self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT path FROM artifacts")}
+            for path in found:
+                if path not in known:
+                    conn.execute("INSERT INTO artifacts VALUES (?, ?, ?)",
+                                 (path, _dir_size(path), os.path.getmtime(path)))
+
+    def collect(self):
+        """Evicts LRU artifacts without a live lease until usage is under the quota. Returns freed bytes."""
+        now = time.time()
+        freed = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+            # Forget artifacts that were deleted by someone else (e.g. reset_directories), and count a newer
+            # mtime (an output the orchestrator touched when reading it) as an access
+            for path, last_access in conn.execute("SELECT path, last_access FROM artifacts").fetchall():
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    conn.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+                    continue
+                if mtime > last_access:
+                    conn.execute("UPDATE artifacts SET last_access = ? WHERE path = ?", (mtime, path))
+
+            used = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if used <= self.quota_bytes:
+                return 0
+
+            candidates = conn.execute(
+                """
+                SELECT path, size FROM artifacts
+                WHERE last_access < ? AND path NOT IN (SELECT path FROM leases)
+                ORDER BY last_access ASC
+                """,
+                (now - self.min_age_seconds,),
+            ).fetchall()
+
+            for path, size in candidates:
+                if used - freed <= self.quota_bytes:
+                    break
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                except OSError as e:
+                    print(f"[storage] Failed to evict {path}: {e}")
+                    continue
+                conn.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+                freed += size
+                print(f"[storage] Evicted {path} ({size} bytes)")
+        return freed
+
+    def _loop(self):
+        self.scan()
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"[storage] GC failed: {e}")
+            time.sleep(self.interval_seconds)
+
+    def ensure_started(self):
+        """Starts the background GC thread once per process."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="storage-gc", daemon=True)
+                self._thread.start()
+
+
+storage_manager = StorageManager(
+    data_root=settings.SHARED_DATA_ROOT,
+    db_path=os.path.join(settings.SHARED_DATA_ROOT, "storage_index.sqlite3"),
+    quota_bytes=settings.STORAGE_QUOTA_BYTES,
+    min_age_seconds=settings.STORAGE_GC_MIN_AGE,
+    interval_seconds=settings.STORAGE_GC_INTERVAL,
+    upload_hold_seconds=settings.STORAGE_UPLOAD_HOLD_SECONDS,
+)
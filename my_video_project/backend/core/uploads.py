@@ -0,0 +1,245 @@
+# backend/core/uploads.py
+"""
+Content-addressed upload store on the shared volume.
+
+Every input file lives once under  MEDIA_ROOT/cas/<sha256>/<filename>,  whatever its name or how
+many times it is sent. Large files can be uploaded in chunks with resume support:
+
+    POST /uploads/                      {sha256, size, filename} -> already stored? done, else offset to resume from
+    PUT  /uploads/<sha256>/?offset=N    raw bytes of the next chunk
+    GET  /uploads/<sha256>/             current offset / status
+    POST /uploads/<sha256>/complete/    hash check, then the file is moved into the store
+
+The sha256 is the upload id: tool endpoints accept 'upload_id' instead of a 'file'.
+"""
+import os
+import re
+import json
+import hashlib
+import tempfile
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.utils.text import get_valid_filename
+from core.storage import storage_manager
+
+CHUNK_SIZE = 1024 * 1024
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def check_chunk_length(content_length):
+    """
+    Bytes of a chunk PUT from its Content-Length header. Chunks are bounded by DATA_UPLOAD_MAX_MEMORY_SIZE
+    (411 without a length, 413 above it), checked before the body is read.
+    """
+    if content_length is None:
+        raise UploadError("Content-Length is required", status=411)
+    try:
+        length = int(content_length)
+    except ValueError:
+        raise UploadError("Invalid Content-Length")
+    limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    if limit is not None and length > limit:
+        raise UploadError("Chunk too large", status=413, max_chunk_bytes=limit)
+    return length
+
+
+_CHUNK_PATH_RE = re.compile(r"^/uploads/[^/]+/$")
+
+
+class ChunkSizeLimit:
+    """
+    ASGI middleware: Django's ASGI handler spools the whole request body (to a temp file past
+    FILE_UPLOAD_MAX_MEMORY_SIZE) before any view runs, so an oversized chunk PUT is answered here,
+    from its headers, before its body is received.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "PUT" and _CHUNK_PATH_RE.match(scope["path"]):
+            headers = dict(scope.get("headers") or [])
+            length = headers.get(b"content-length")
+            try:
+                check_chunk_length(length.decode("latin-1") if length is not None else None)
+            except UploadError as e:
+                body = json.dumps({"error": str(e), **e.extra}).encode()
+                await send({"type": "http.response.start", "status": e.status,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+
+def _cas_dir():
+    return os.path.join(settings.MEDIA_ROOT, "cas")
+
+def _partial_dir():
+    return os.path.join(settings.MEDIA_ROOT, "partial")
+
+def _check_digest(digest):
+    if not digest or not _DIGEST_RE.match(digest):
+        raise UploadError("Invalid upload id (expected a lowercase hex sha256)")
+
+def _clean_filename(filename):
+    return get_valid_filename(os.path.basename(filename or "upload")) or "upload"
+
+def _read_meta(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(path, meta):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def blob_path(digest):
+    """Returns the stored file path relative to MEDIA_ROOT (e.g. 'cas/<sha>/video.mp4'), or None."""
+    if not digest or not _DIGEST_RE.match(digest):
+        return None
+    meta = _read_meta(os.path.join(_cas_dir(), digest, "meta.json"))
+    if meta is None:
+        return None
+    relative = f"cas/{digest}/{meta['filename']}"
+    if not os.path.exists(os.path.join(settings.MEDIA_ROOT, relative)):
+        return None
+    return relative
+
+def _commit(tmp_path, digest, filename, size):
+    """Moves a fully written and verified temp file into the store (or drops it if the content exists)."""
+    existing = blob_path(digest)
+    if existing is not None:
+        os.remove(tmp_path)
+        storage_manager.hold(os.path.join(settings.MEDIA_ROOT, existing))  # Old content, reused now
+        return existing
+
+    blob_dir = os.path.join(_cas_dir(), digest)
+    os.makedirs(blob_dir, exist_ok=True)
+    os.replace(tmp_path, os.path.join(blob_dir, filename))
+    _write_meta(os.path.join(blob_dir, "meta.json"), {"sha256": digest, "filename": filename, "size": size})
+    return f"cas/{digest}/{filename}"
+
+
+def store_uploaded_file(uploaded_file):
+    """
+    Stores a regular multipart upload in the content-addressed store.
+    Big uploads are already in a temp file on the shared volume (FILE_UPLOAD_TEMP_DIR): we only
+    hash it and move it. Small in-memory uploads are hashed while being written out.
+    """
+    os.makedirs(_partial_dir(), exist_ok=True)
+    filename = _clean_filename(uploaded_file.name)
+    sha = hashlib.sha256()
+    size = 0
+
+    if hasattr(uploaded_file, "temporary_file_path"):
+        for chunk in uploaded_file.chunks(CHUNK_SIZE):
+            sha.update(chunk)
+            size += len(chunk)
+        fd, tmp_path = tempfile.mkstemp(dir=_partial_dir(), suffix=".upload")
+        os.close(fd)
+        file_move_safe(uploaded_file.temporary_file_path(), tmp_path, allow_overwrite=True)
+        return _commit(tmp_path, sha.hexdigest(), filename, size)
+
+    fd, tmp_path = tempfile.mkstemp(dir=_partial_dir(), suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in uploaded_file.chunks(CHUNK_SIZE):
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return _commit(tmp_path, sha.hexdigest(), filename, size)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _session_paths(digest):
+    base = os.path.join(_partial_dir(), digest)
+    return base + ".part", base + ".json"
+
+def session_status(digest):
+    _check_digest(digest)
+    stored = blob_path(digest)
+    if stored is not None:
+        # The client will use the blob next: it must not be evicted before its job leases it
+        storage_manager.hold(os.path.join(settings.MEDIA_ROOT, stored))
+        return {"upload_id": digest, "status": "complete", "path": stored}
+
+    part_path, meta_path = _session_paths(digest)
+    meta = _read_meta(meta_path)
+    if meta is None:
+        raise UploadError("Unknown upload id", status=404)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return {"upload_id": digest, "status": "pending", "offset": offset, "size": meta["size"]}
+
+def init_session(digest, size, filename):
+    """Starts (or resumes) a chunked upload. Nothing is transferred if the content is already stored."""
+    _check_digest(digest)
+    if blob_path(digest) is not None:
+        return session_status(digest)
+
+    os.makedirs(_partial_dir(), exist_ok=True)
+    part_path, meta_path = _session_paths(digest)
+    if _read_meta(meta_path) is None:
+        _write_meta(meta_path, {"sha256": digest, "size": int(size), "filename": _clean_filename(filename)})
+        open(part_path, "ab").close()
+    return session_status(digest)
+
+def write_chunk(digest, offset, stream, length):
+    """Appends one chunk. The client's offset must match what we have, otherwise it must resume from ours."""
+    status = session_status(digest)
+    if status["status"] == "complete":
+        return status
+    if offset != status["offset"]:
+        raise UploadError("Offset mismatch", status=409, offset=status["offset"])
+    if offset + length > status["size"]:
+        raise UploadError("Chunk goes past the declared size", status=400, offset=status["offset"])
+
+    part_path, _ = _session_paths(digest)
+    remaining = length
+    with open(part_path, "ab") as out:
+        while remaining > 0:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            out.write(chunk)
+            remaining -= len(chunk)
+    return session_status(digest)
+
+def complete_session(digest):
+    """Verifies size and hash of the assembled file and moves it into the store."""
+    status = session_status(digest)
+    if status["status"] == "complete":
+        return status
+    if status["offset"] != status["size"]:
+        raise UploadError("Upload is not finished", status=409, offset=status["offset"])
+
+    part_path, meta_path = _session_paths(digest)
+    sha = hashlib.sha256()
+    with open(part_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    if sha.hexdigest() != digest:
+        # Corrupted transfer: start over
+        os.remove(part_path)
+        os.remove(meta_path)
+        raise UploadError("Hash mismatch, upload discarded", status=422)
+
+    meta = _read_meta(meta_path)
+    _commit(part_path, digest, meta["filename"], meta["size"])
+    os.remove(meta_path)
+    return session_status(digest)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path
 from core.views import ffmpeg1_view, DeepSpeechView, ffmpeg2_view, ffmpeg0_view, LibrosaView, GrepView
+from core.views import UploadSessionView, UploadChunkView, UploadCompleteView, JobCancelView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,4 +11,8 @@ urlpatterns = [
     path('ffmpeg0/', ffmpeg0_view.as_view()),
     path('librosa/', LibrosaView.as_view()),
     path('grep/', GrepView.as_view()),
+    path('uploads/', UploadSessionView.as_view()),
+    path('uploads/<str:upload_id>/', UploadChunkView.as_view()),
+    path('uploads/<str:upload_id>/complete/', UploadCompleteView.as_view()),
+    path('jobs/<str:job_id>/cancel/', JobCancelView.as_view()),
 ]
\ No newline at end of file
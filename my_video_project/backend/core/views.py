@@ -1,38 +1,199 @@
 # backend/core/views.py
 import docker
 import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from django.http import JsonResponse
 from django.views import View
-from django.core.files.storage import FileSystemStorage
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from core import uploads
+from core.storage import storage_manager
+from core.scheduler import core_scheduler
+from core.admission import admission, ToolBusy
+from core.jobs import jobs, JobCancelled, InvalidJobId
 
 # Initialize Docker client
 client = docker.from_env()
 
+# The Docker SDK and the storage API are blocking, so the async views run them in this pool.
+# It is sized well above the number of tool workers: concurrency is limited by the workers, not by Django.
+blocking_executor = ThreadPoolExecutor(max_workers=settings.TOOL_EXEC_THREADS, thread_name_prefix="tool-exec")
+
+async def run_blocking(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, fn, *args)
+
+def _parse_form(request):
+    # The first access to POST/FILES parses the body; big files are written to FILE_UPLOAD_TEMP_DIR
+    return request.POST, request.FILES
+
+async def parse_form(request):
+    """Parses the form body in the blocking pool: Django parses multipart data synchronously."""
+    await run_blocking(_parse_form, request)
+
+async def resolve_input(request):
+    """
+    Returns (filename relative to /data/uploads, None) or (None, error response).
+    The input is either an uploaded 'file' or the 'upload_id' of a file already in the
+    content-addressed store (see core/uploads.py). Uploaded files are stored by content hash too.
+    """
+    await parse_form(request)
+    upload_id = request.POST.get('upload_id')
+    if upload_id:
+        filename = await run_blocking(uploads.blob_path, upload_id)
+        if filename is None:
+            return None, JsonResponse({"error": f"Unknown or incomplete upload '{upload_id}'"}, status=404)
+        return filename, None
+
+    if 'file' not in request.FILES:
+        return None, JsonResponse({"error": "No file provided"}, status=400)
+    filename = await run_blocking(uploads.store_uploaded_file, request.FILES['file'])
+    return filename, None
+
+def job_output_folder(name):
+    """
+    Creates the output folder of one job, /data/outputs/<name>_<run id>. Identical uploads share their
+    content-addressed input path, so without the run id two jobs on the same clip and tool would write to
+    the same folder, and discarding the outputs of a cancelled job would delete the other job's results.
+    """
+    path = f"/data/outputs/{name}_{uuid.uuid4().hex[:12]}"
+    os.makedirs(path)
+    return path
+
+# Same fields as docker's ExecResult, plus the time the command took in the worker
+WorkerResult = namedtuple("WorkerResult", ["exit_code", "output", "seconds"])
+
+async def exec_in_worker(worker_name, cmd, artifacts=(), job_id=None):
+    """
+    Runs a command (an argv list, never a shell string) in a worker container and waits for it off the event loop.
+    The job must first be admitted (core/admission.py): raises ToolBusy when the worker's slots and
+    wait queue are full. An admitted job waits for a slot, then for its thread budget (core/scheduler.py),
+    which it gets through its environment.
+    'artifacts' (input file, output folder) are leased for the duration of the job, so the
+    storage GC cannot evict them while the worker uses them.
+    The job is killed when its deadline expires, when it is cancelled (core/jobs.py) or when the request
+    goes away; JobCancelled is raised then, and its partial outputs are removed.
+    Raises InvalidJobId for a malformed job_id or one already in use.
+    The (still empty) output folders of a job that is not admitted are removed too, so rejected
+    requests leave nothing on the shared volume.
+    """
+    def _discard_outputs():
+        for path in artifacts[1:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        job = jobs.register(worker_name, job_id)
+    except InvalidJobId:
+        await run_blocking(_discard_outputs)
+        raise
+    try:
+        ticket = admission.enter(worker_name)
+    except ToolBusy:
+        jobs.unregister(job)
+        await run_blocking(_discard_outputs)
+        raise
+
+    def _exec():
+        # The lease covers the wait in the queue too: the input cannot be evicted before the job runs
+        with storage_manager.job(*artifacts), admission.slot(ticket) as admitted:
+            if not admitted:
+                return None  # The request went away while the job was queued
+            with core_scheduler.reserve(worker_name) as reservation:
+                container = client.containers.get(worker_name)
+                with jobs.running(job, container) as started:
+                    if not started:
+                        return None  # Cancelled while queued
+                    exec_started = time.perf_counter()
+                    result = container.exec_run(jobs.command(core_scheduler.command(cmd, reservation)),
+                                                environment={**core_scheduler.environment(reservation),
+                                                             **jobs.environment(job)})
+                    seconds = time.perf_counter() - exec_started
+            admission.record_duration(ticket, seconds)
+            return WorkerResult(result.exit_code, result.output, seconds)
+
+    def _stop_disconnected():
+        jobs.stop(job, "disconnected")
+        _discard_outputs()
+
+    try:
+        result = await run_blocking(_exec)
+    except asyncio.CancelledError:
+        # The client went away: kill the job without blocking the (cancelled) request any further
+        threading.Thread(target=_stop_disconnected, daemon=True).start()
+        raise
+    finally:
+        ticket.abandon()  # No-op once the job has started
+        jobs.unregister(job)
+
+    if job.reason is not None:
+        await run_blocking(_discard_outputs)
+        raise JobCancelled(job.id, job.reason)
+    return result
+
+def tool_response(tool, started, payload, status=200, exec_result=None):
+    """
+    Every tool endpoint answers with the same structured result, so clients never parse text:
+        status           "success" | "error" | "cancelled"
+        tool             tool name
+        output_location  main output file (when there is one), also listed in output_paths
+        match            grep only: whether the word was found (None for the other tools)
+        timings          total_seconds (whole request) and exec_seconds (command in the worker)
+    Tool-specific fields (message, logs, word, error, grep's count/hits) are kept as they are.
+    """
+    output_location = payload.get("output_location")
+    result = {
+        "tool": tool,
+        "output_paths": [output_location] if output_location else [],
+        "match": None,
+        **payload,
+        "timings": {
+            "total_seconds": round(time.perf_counter() - started, 3),
+            "exec_seconds": round(exec_result.seconds, 3) if exec_result is not None else None,
+        },
+    }
+    return JsonResponse(result, status=status)
+
+def busy_response(tool, started, busy):
+    """429 for a request that was not admitted; clients retry after Retry-After (with jitter)."""
+    response = tool_response(tool, started, {"status": "error", "error": str(busy)}, status=429)
+    response["Retry-After"] = str(busy.retry_after)
+    return response
+
+def job_id_response(tool, started, invalid):
+    """A job_id that is malformed (400) or already used by a job in progress (409); nothing was run."""
+    return tool_response(tool, started, {"status": "error", "job_id": invalid.job_id, "error": str(invalid)},
+                         status=invalid.status)
+
+def cancelled_response(tool, started, cancelled):
+    """A job killed by its deadline or cancelled: status "cancelled" (not retried by the clients)."""
+    return tool_response(tool, started, {"status": "cancelled", "job_id": cancelled.job_id,
+                                         "reason": cancelled.reason, "error": str(cancelled)}, status=409)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ffmpeg1_view(View):
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-
-        uploaded_file = request.FILES['file']
-        
-        # 1. Save file to Shared Volume (/data/uploads)
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+    async def post(self, request):
+        started = time.perf_counter()
+        # 1. Save file to Shared Volume (/data/uploads), or reuse a stored upload
+        filename, error = await resolve_input(request)
+        if error:
+            return error
         
         # Determine paths as seen by the containers
         # Both containers see the volume mounted at /data
         input_path = f"/data/uploads/{filename}"
         
         # We'll create a folder for outputs based on the filename
-        output_folder = f"/data/outputs/{os.path.splitext(filename)[0]}"
+        # (Django can do this because it shares the volume)
+        output_folder = job_output_folder(os.path.splitext(filename)[0])
         output_prefix = f"{output_folder}/clip"
-        
-        # Ensure output directory exists (Django can do this because it shares the volume)
-        os.makedirs(output_folder, exist_ok=True)
 
         # 2. Command the Worker
         # We look up the container by the name defined in docker-compose.yml
@@ -40,275 +201,370 @@ class ffmpeg1_view(View):
         worker_name = 'worker_ffmpeg1'
 
         try:
-            container = client.containers.get(worker_name)
-            
             # The command we run inside the worker container
-            cmd = f"python main.py -i {input_path} -o {output_prefix}"
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix]
             
-            # Execute and wait for result
-            exec_result = container.exec_run(cmd)
+            # Execute and wait for result (off the event loop)
+            exec_result = await exec_in_worker(worker_name, cmd, artifacts=(input_path, output_folder), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
-                return JsonResponse({
+                return tool_response("ffmpeg-1", started, {
                     "status": "success", 
                     "message": f"Successfuly split {filename}",
                     "output_location": f"{output_folder}/clip.tar.gz"
-                })
+                }, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("ffmpeg-1", started, {
                     "status": "error", 
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
                 
+        except ToolBusy as busy:
+            return busy_response("ffmpeg-1", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("ffmpeg-1", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("ffmpeg-1", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return tool_response("ffmpeg-1", started, {"status": "error", "error": str(e)}, status=500)
         
 @method_decorator(csrf_exempt, name='dispatch')
 class DeepSpeechView(View):
 
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+    async def post(self, request):
+        started = time.perf_counter()
+        filename, error = await resolve_input(request)
+        if error:
+            return error
 
         # Define Paths on Shared Volume
         input_path = f"/data/uploads/{filename}"
         
         # We create a specific folder for DeepSpeech results
         output_folder_name = f"{os.path.splitext(filename)[0]}_deepspeech"
-        output_folder_path = f"/data/outputs/{output_folder_name}"
-        os.makedirs(output_folder_path, exist_ok=True)
+        timed = request.POST.get('timed') == '1'
+        if timed:
+            output_folder_name += "_timed"
+        # fast=1: screening pass of the two-tier search (no scorer, narrow beam), kept apart from the full result
+        fast = request.POST.get('fast') == '1'
+        if fast:
+            output_folder_name += "_fast"
+        output_folder_path = job_output_folder(output_folder_name)
         
         # The script expects an output prefix
         output_prefix = f"{output_folder_path}/result"
 
         try:
-            # Connect to the SPECIFIC container: worker_deepspeech
-            container = client.containers.get('worker_deepspeech')
-            
-            # Command: python main.py -i <input> -o <output>
-            cmd = f"python main.py -i {input_path} -o {output_prefix}"
+            # Command: python main.py -i <input> -o <output> (an argv list, no shell parsing)
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix]
+            # timed=1: word timings in transcript.json (used by the search-first pipeline)
+            if timed:
+                cmd.append("--timed")
+            # stream=1: ffmpeg PCM fed straight into DeepSpeech (plain video input is always streamed)
+            if request.POST.get('stream') == '1':
+                cmd.append("--stream")
+            if fast:
+                cmd.append("--fast")
             
-            exec_result = container.exec_run(cmd)
+            exec_result = await exec_in_worker('worker_deepspeech', cmd, artifacts=(input_path, output_folder_path), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
-                return JsonResponse({
+                return tool_response("deepspeech", started, {
                     "status": "success",
                     "tool": "deepspeech",
                     "message": "Successfully run Deepspeech",
                     "output_location": f"{output_folder_path}/result.tar.gz"
-                })
+                }, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("deepspeech", started, {
                     "status": "error",
                     "error": "Invalid file format",
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
 
+        except ToolBusy as busy:
+            return busy_response("deepspeech", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("deepspeech", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("deepspeech", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return tool_response("deepspeech", started, {"status": "error", "error": str(e)}, status=500)
         
 @method_decorator(csrf_exempt, name='dispatch')
 class ffmpeg2_view(View):
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+    async def post(self, request):
+        started = time.perf_counter()
+        filename, error = await resolve_input(request)
+        if error:
+            return error
 
         # 1. Define Paths
         input_path = f"/data/uploads/{filename}"
         
         # Create a folder for the results
         output_folder_name = f"{os.path.splitext(filename)[0]}_ffmpeg2"
-        output_folder_path = f"/data/outputs/{output_folder_name}"
-        os.makedirs(output_folder_path, exist_ok=True)
+        audio_only = request.POST.get('audio_only') == '1'
+        if audio_only:
+            output_folder_name += "_audio"
+        output_folder_path = job_output_folder(output_folder_name)
         
         # The script uses this prefix to name the .wav, .mp4 and .tar.gz
         output_prefix = f"{output_folder_path}/result"
 
         try:
-            # 2. Connect to worker_ffmpeg2
-            container = client.containers.get('worker_ffmpeg2')
-            
-            # Command: python main.py -i <input> -o <output>
-            cmd = f"python main.py -i {input_path} -o {output_prefix}"
+            # Command: python main.py -i <input> -o <output> (an argv list, no shell parsing)
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix]
+            # audio_only=1: package only the 16 kHz audio, without re-encoding the video
+            if audio_only:
+                cmd.append("--audio-only")
             
-            exec_result = container.exec_run(cmd)
+            exec_result = await exec_in_worker('worker_ffmpeg2', cmd, artifacts=(input_path, output_folder_path), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
-                return JsonResponse({
+                return tool_response("ffmpeg-2", started, {
                     "status": "success",
                     "tool": "ffmpeg-2",
                     "logs": exec_result.output.decode('utf-8'),
                     "output_location": f"{output_folder_path}/result.tar.gz"
-                })
+                }, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("ffmpeg-2", started, {
                     "status": "error",
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
 
+        except ToolBusy as busy:
+            return busy_response("ffmpeg-2", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("ffmpeg-2", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("ffmpeg-2", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return tool_response("ffmpeg-2", started, {"status": "error", "error": str(e)}, status=500)
         
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ffmpeg0_view(View):
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+    async def post(self, request):
+        started = time.perf_counter()
+        filename, error = await resolve_input(request)
+        if error:
+            return error
 
         # Define Paths
         input_path = f"/data/uploads/{filename}"
         
         # Unique output folder
         output_folder_name = f"{os.path.splitext(filename)[0]}_ffmpeg0"
-        output_folder_path = f"/data/outputs/{output_folder_name}"
-        os.makedirs(output_folder_path, exist_ok=True)
+        output_folder_path = job_output_folder(output_folder_name)
         
         # The script uses this prefix to name the final tar.gz
         output_prefix = f"{output_folder_path}/result"
 
         try:
-            # Connect to the new worker
-            container = client.containers.get('worker_ffmpeg0')
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix]
             
-            cmd = f"python main.py -i {input_path} -o {output_prefix}"
-            
-            exec_result = container.exec_run(cmd)
+            exec_result = await exec_in_worker('worker_ffmpeg0', cmd, artifacts=(input_path, output_folder_path), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
                 full_file_path = f"{output_prefix}.tar.gz"
-                return JsonResponse({
+                return tool_response("ffmpeg-0", started, {
                     "status": "success",
                     "tool": "ffmpeg-0",
                     "message": "Successfully run ffmpeg0",
                     "output_location": full_file_path
-                })
+                }, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("ffmpeg-0", started, {
                     "status": "error",
                     "error": "Tool execution failed",
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
 
+        except ToolBusy as busy:
+            return busy_response("ffmpeg-0", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("ffmpeg-0", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("ffmpeg-0", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return tool_response("ffmpeg-0", started, {"status": "error", "error": str(e)}, status=500)
         
 @method_decorator(csrf_exempt, name='dispatch')
 class LibrosaView(View):
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+    async def post(self, request):
+        started = time.perf_counter()
+        filename, error = await resolve_input(request)
+        if error:
+            return error
 
         # Define Paths
         input_path = f"/data/uploads/{filename}"
         
         # Unique output folder
         output_folder_name = f"{os.path.splitext(filename)[0]}_librosa"
-        output_folder_path = f"/data/outputs/{output_folder_name}"
-        os.makedirs(output_folder_path, exist_ok=True)
+        output_folder_path = job_output_folder(output_folder_name)
         
         # Output prefix
         output_prefix = f"{output_folder_path}/result"
 
         try:
-            # Connect to worker_librosa
-            container = client.containers.get('worker_librosa')
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix]
             
-            cmd = f"python main.py -i {input_path} -o {output_prefix}"
-            
-            exec_result = container.exec_run(cmd)
+            exec_result = await exec_in_worker('worker_librosa', cmd, artifacts=(input_path, output_folder_path), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
-                return JsonResponse({
+                return tool_response("librosa", started, {
                     "status": "success",
                     "tool": "librosa-splitter",
                     "logs": exec_result.output.decode('utf-8'),
                     "output_location": f"{output_folder_path}/result.tar.gz" # Exact file
-                })
+                }, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("librosa", started, {
                     "status": "error",
                     "error": "Librosa processing failed",
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
 
+        except ToolBusy as busy:
+            return busy_response("librosa", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("librosa", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("librosa", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+            return tool_response("librosa", started, {"status": "error", "error": str(e)}, status=500)
         
 
 @method_decorator(csrf_exempt, name='dispatch')
 class GrepView(View):
-    def post(self, request):
-        if 'file' not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
+    async def post(self, request):
+        started = time.perf_counter()
+        await parse_form(request)
+        if 'file' not in request.FILES and not request.POST.get('upload_id'):
+            return tool_response("grep", started, {"status": "error", "error": "No file provided"}, status=400)
         
         # Get the search word from the request body
         search_word = request.POST.get('word')
         if not search_word:
-            return JsonResponse({"error": "No search word provided"}, status=400)
+            return tool_response("grep", started, {"status": "error", "error": "No search word provided"}, status=400)
 
-        uploaded_file = request.FILES['file']
-        fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-        filename = fs.save(uploaded_file.name, uploaded_file)
+        filename, error = await resolve_input(request)
+        if error:
+            return error
 
         input_path = f"/data/uploads/{filename}"
         
         # Unique output folder
         output_folder_name = f"{os.path.splitext(filename)[0]}_grep"
-        output_folder_path = f"/data/outputs/{output_folder_name}"
-        os.makedirs(output_folder_path, exist_ok=True)
+        output_folder_path = job_output_folder(output_folder_name)
         
         output_prefix = f"{output_folder_path}/result"
 
         try:
-            container = client.containers.get('worker_grep')
-            
-            # Pass the -w argument for the word. We wrap it in quotes.
-            cmd = f"python main.py -i {input_path} -o {output_prefix} -w \"{search_word}\""
+            # The word is one argv entry (never parsed by a shell; "--word=" so a leading "-" is not an option)
+            cmd = ["python", "main.py", "-i", input_path, "-o", output_prefix, f"--word={search_word}"]
+            # package=1: on a match, also repackage the video + transcript (off by default: the hits are enough)
+            if request.POST.get('package') == '1':
+                cmd.append("--package")
             
-            exec_result = container.exec_run(cmd)
-            
-            full_output_path = f"{output_prefix}.tar.gz"
+            exec_result = await exec_in_worker('worker_grep', cmd, artifacts=(input_path, output_folder_path), job_id=request.POST.get('job_id'))
             
             if exec_result.exit_code == 0:
-                # Check logs to confirm if match was found
+                # The worker prints one structured result line: match, count, hits (offset + snippet), package
                 logs = exec_result.output.decode('utf-8')
-                
-                if "MATCH FOUND" in logs:
-                     return JsonResponse({
-                        "status": "success",
-                        "match": True,
-                        "word": search_word,
-                        "output_location": full_output_path
-                    })
-                else:
-                    return JsonResponse({
-                        "status": "success",
-                        "match": False,
-                        "word": search_word,
-                        "message": "Word not found in clip."
-                    })
+                result_line = next((line for line in reversed(logs.splitlines()) if line.startswith("GREP_RESULT ")), None)
+                if result_line is None:
+                    return tool_response("grep", started, {
+                        "status": "error",
+                        "error": "No result from the grep worker",
+                        "logs": logs
+                    }, status=500, exec_result=exec_result)
+                result = json.loads(result_line[len("GREP_RESULT "):])
+
+                payload = {
+                    "status": "success",
+                    "match": result["match"],
+                    "word": search_word,
+                    "count": result["count"],
+                    "hits": result["hits"],
+                }
+                if result.get("package"):
+                    payload["output_location"] = result["package"]
+                if not result["match"]:
+                    payload["message"] = "Word not found in clip."
+                return tool_response("grep", started, payload, exec_result=exec_result)
             else:
-                return JsonResponse({
+                return tool_response("grep", started, {
                     "status": "error",
                     "logs": exec_result.output.decode('utf-8')
-                }, status=500)
+                }, status=500, exec_result=exec_result)
 
+        except ToolBusy as busy:
+            return busy_response("grep", started, busy)
+        except JobCancelled as cancelled:
+            return cancelled_response("grep", started, cancelled)
+        except InvalidJobId as invalid:
+            return job_id_response("grep", started, invalid)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+            return tool_response("grep", started, {"status": "error", "error": str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class JobCancelView(View):
+    async def post(self, request, job_id):
+        """Cancels a queued or running tool job (the request that started it answers with status "cancelled")."""
+        if not await run_blocking(jobs.cancel, job_id):
+            return JsonResponse({"error": f"Unknown or finished job '{job_id}'"}, status=404)
+        return JsonResponse({"job_id": job_id, "status": "cancelled"})
+
+
+# --- Chunked, resumable uploads (content-addressed, see core/uploads.py) ---
+def _upload_error(e):
+    return JsonResponse({"error": str(e), **e.extra}, status=e.status)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionView(View):
+    async def post(self, request):
+        """Starts or resumes an upload. If the content is already stored, nothing needs to be sent."""
+        try:
+            data = json.loads(request.body or b"{}")
+            status = await run_blocking(uploads.init_session, data.get('sha256'), int(data.get('size', 0)), data.get('filename'))
+        except (ValueError, TypeError):
+            return JsonResponse({"error": "Expected JSON with sha256, size and filename"}, status=400)
+        except uploads.UploadError as e:
+            return _upload_error(e)
+        return JsonResponse(status)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadChunkView(View):
+    async def get(self, request, upload_id):
+        try:
+            return JsonResponse(await run_blocking(uploads.session_status, upload_id))
+        except uploads.UploadError as e:
+            return _upload_error(e)
+
+    async def put(self, request, upload_id):
+        try:
+            offset = int(request.GET.get('offset', -1))
+        except ValueError:
+            return JsonResponse({"error": "Invalid offset"}, status=400)
+
+        try:
+            # Under ASGI the body is already spooled by Django (uploads.ChunkSizeLimit rejects oversized
+            # chunks before that); the same size check covers other servers. It is then copied to disk.
+            length = uploads.check_chunk_length(request.headers.get('Content-Length'))
+            status = await run_blocking(uploads.write_chunk, upload_id, offset, request, length)
+        except uploads.UploadError as e:
+            return _upload_error(e)
+        return JsonResponse(status)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadCompleteView(View):
+    async def post(self, request, upload_id):
+        try:
+            return JsonResponse(await run_blocking(uploads.complete_session, upload_id))
+        except uploads.UploadError as e:
+            return _upload_error(e)
\ No newline at end of file
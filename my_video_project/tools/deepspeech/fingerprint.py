@@ -0,0 +1,189 @@
+"""
+Audio fingerprints and the fingerprint -> transcript cache.
+
+Fingerprint (Haitsma-Kalker style): the 16 kHz audio is cut into 256 ms frames every 128 ms; each frame
+gets a 32-bit sub-fingerprint, one bit per pair of adjacent bands (33 log-spaced bands, 300-2000 Hz):
+the sign of the change of the band energy difference since the previous frame. A re-encoded or
+re-uploaded copy of the same audio gets (almost) the same bits, about 30 bytes per second of audio.
+
+Cache: a SQLite database on the shared volume. Every (sub-fingerprint, frame) of a stored clip is indexed,
+so a lookup is a few indexed queries: the clips sharing sub-fingerprints with the query at a consistent
+offset are the candidates, and the first one that overlaps most of the query with a low enough bit error
+rate is a hit.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import wave
+from collections import Counter
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME = 4096  # 256 ms
+HOP = 2048  # 128 ms
+BAND_EDGES = np.geomspace(300, 2000, 34)
+_BAND_OF_BIN = np.digitize(np.fft.rfftfreq(FRAME, 1.0 / SAMPLE_RATE), BAND_EDGES) - 1  # -1 / 33: outside the bands
+# FFT bin -> band matrix: frame energies per band are a single product
+_BANDS = np.zeros((FRAME // 2 + 1, 33), dtype=np.float32)
+_BANDS[(_BAND_OF_BIN >= 0) & (_BAND_OF_BIN < 33), _BAND_OF_BIN[(_BAND_OF_BIN >= 0) & (_BAND_OF_BIN < 33)]] = 1
+_WINDOW = np.hanning(FRAME).astype(np.float32)
+_BIT_WEIGHTS = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+
+CACHE_ENABLED = os.getenv("DEEPSPEECH_FINGERPRINT_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("DEEPSPEECH_FINGERPRINT_DB", "/data/fingerprint_cache.sqlite3")
+# Highest share of differing bits for two clips to count as the same audio (unrelated audio: ~0.5)
+MAX_BIT_ERROR_RATE = float(os.getenv("DEEPSPEECH_FINGERPRINT_MAX_BER", 0.3))
+# Clips whose durations differ by more than this are never the same audio
+DURATION_TOLERANCE = 0.03
+MAX_OFFSET_FRAMES = 4
+CANDIDATES = 5
+# Share of the query that must overlap the stored clip (at the candidate offset) for a hit
+MIN_OVERLAP = 0.9
+# Frames indexed per distinct sub-fingerprint of a clip (a value repeating more often is barely informative)
+MAX_FRAMES_PER_HASH = 16
+# Sub-fingerprints of silence/constant audio match everything: not indexed
+_UNINFORMATIVE = {0, 0xFFFFFFFF}
+
+
+def _frame_bits(energies, previous):
+    """32-bit sub-fingerprints of consecutive frames (energies: frames x 33 bands)."""
+    diff = energies[:, :-1] - energies[:, 1:]
+    prev = np.vstack([previous[None, :], diff[:-1]]) if previous is not None else np.vstack([diff[:1], diff[:-1]])
+    bits = (diff - prev) > 0
+    return (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1).astype(np.uint32), diff[-1]
+
+
+def fingerprint_chunks(chunks):
+    """Fingerprint (uint32 array, one value per 128 ms) of int16 audio chunks; also returns the duration (s)."""
+    buffer = np.zeros(0, dtype=np.float32)
+    previous = None
+    parts = []
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        buffer = np.concatenate([buffer, chunk.astype(np.float32)])
+        n = 0 if len(buffer) < FRAME else 1 + (len(buffer) - FRAME) // HOP
+        if n == 0:
+            continue
+        frames = np.lib.stride_tricks.as_strided(buffer, shape=(n, FRAME),
+                                                 strides=(HOP * buffer.strides[0], buffer.strides[0]))
+        power = np.abs(np.fft.rfft(frames * _WINDOW, axis=1)) ** 2
+        bits, previous = _frame_bits(np.log1p(power @ _BANDS), previous)
+        parts.append(bits)
+        buffer = buffer[n * HOP:]
+    fp = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint32)
+    return fp, total / SAMPLE_RATE
+
+
+def wav_chunks(audio_path, frames_per_chunk=SAMPLE_RATE * 10):
+    """int16 chunks of a 16 kHz mono 16-bit wav (the format ffmpeg-2 produces)."""
+    with wave.open(audio_path, "rb") as w:
+        while True:
+            data = w.readframes(frames_per_chunk)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.int16)
+
+
+def _overlap(a_len, b_len, offset):
+    """Frames of a covered by b, with a[i] aligned on b[i - offset]."""
+    return max(0, min(a_len, b_len + offset) - max(0, offset))
+
+
+def _frames_by_hash(fp):
+    """{sub-fingerprint: [frames]} of the informative sub-fingerprints, MAX_FRAMES_PER_HASH frames at most each."""
+    positions = {}
+    for frame, value in enumerate(fp.tolist()):
+        if value not in _UNINFORMATIVE:
+            frames = positions.setdefault(value, [])
+            if len(frames) < MAX_FRAMES_PER_HASH:
+                frames.append(frame)
+    return positions
+
+
+def bit_error_rate(a, b, offset):
+    """Share of differing bits between a and b, with a[i] aligned on b[i - offset]."""
+    start = max(0, offset)
+    end = min(len(a), len(b) + offset)
+    if end - start <= 0:
+        return 1.0
+    diff = np.bitwise_xor(a[start:end], b[start - offset:end - offset])
+    return float(np.unpackbits(diff.view(np.uint8)).sum()) / (32 * (end - start))
+
+
+class TranscriptCache:
+    """fingerprint -> transcript cache (one entry per clip and decoding mode)."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    id INTEGER PRIMARY KEY, mode TEXT, duration REAL, fingerprint BLOB,
+                    text TEXT, words TEXT, created_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS fp_index (hash INTEGER, clip_id INTEGER, frame INTEGER);
+                CREATE INDEX IF NOT EXISTS idx_fp_index_hash ON fp_index(hash);
+            """)
+
+    @classmethod
+    def open(cls):
+        """The shared cache, or None if it is disabled or cannot be opened."""
+        if not CACHE_ENABLED:
+            return None
+        try:
+            return cls()
+        except sqlite3.Error as e:
+            print(f"Warning: fingerprint cache unavailable ({e})", file=sys.stderr)
+            return None
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def lookup(self, fp, duration, mode, timed=False):
+        """(text, words or None) of a stored clip with the same audio, else None."""
+        positions = _frames_by_hash(fp)
+        if not positions:
+            return None
+
+        votes = Counter()
+        hashes = list(positions)
+        low, high = duration * (1 - DURATION_TOLERANCE), duration * (1 + DURATION_TOLERANCE)
+        with self._connect() as conn:
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = conn.execute(
+                    "SELECT i.clip_id, i.frame, i.hash FROM fp_index i JOIN clips c ON c.id = i.clip_id "
+                    f"WHERE i.hash IN ({','.join('?' * len(batch))}) AND c.mode = ? AND c.duration BETWEEN ? AND ?",
+                    batch + [mode, low, high])
+                for clip_id, frame, value in rows:
+                    for query_frame in positions[value]:
+                        offset = query_frame - frame
+                        if abs(offset) <= MAX_OFFSET_FRAMES:
+                            votes[(clip_id, offset)] += 1
+
+            for (clip_id, offset), _ in votes.most_common(CANDIDATES):
+                stored, text, words = conn.execute(
+                    "SELECT fingerprint, text, words FROM clips WHERE id = ?", (clip_id,)).fetchone()
+                if timed and words is None:
+                    continue
+                stored = np.frombuffer(stored, dtype=np.uint32)
+                if _overlap(len(fp), len(stored), offset) < MIN_OVERLAP * len(fp):
+                    continue
+                ber = bit_error_rate(fp, stored, offset)
+                if ber <= MAX_BIT_ERROR_RATE:
+                    print(f"Fingerprint cache hit: clip {clip_id} (bit error rate {ber:.3f}, offset {offset})")
+                    return text, json.loads(words) if words is not None else None
+        return None
+
+    def store(self, fp, duration, mode, text, words=None):
+        positions = _frames_by_hash(fp)
+        with self._connect() as conn:
+            clip_id = conn.execute(
+                "INSERT INTO clips (mode, duration, fingerprint, text, words, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (mode, duration, fp.astype(np.uint32).tobytes(), text,
+                 json.dumps(words) if words is not None else None, time.strftime("%Y-%m-%dT%H:%M:%S"))).lastrowid
+            conn.executemany("INSERT INTO fp_index VALUES (?, ?, ?)",
+                             [(value, clip_id, frame) for value, frames in positions.items() for frame in frames])
@@ -3,7 +3,60 @@ import subprocess
 import os
 import argparse
 import glob
+import json
 import shutil  # Required for deleting folders
+import io
+import tempfile
+import tarfile
+import windowed
+import streaming
+import fingerprint
+
+MODEL_PATH = "deepspeech-0.9.3-models.tflite"
+SCORER_PATH = "deepspeech-0.9.3-models.scorer"
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi")
+# --fast (screening pass of the two-tier search): no external scorer and a narrow beam
+FAST_BEAM_WIDTH = int(os.getenv("DEEPSPEECH_FAST_BEAM_WIDTH", 16))
+
+def decoder_settings(args):
+    """(scorer path or None, beam width or None for the model default)."""
+    if args.get('fast'):
+        return None, FAST_BEAM_WIDTH
+    return SCORER_PATH, None
+
+def cached_transcribe(args, audio_chunks, transcribe, spool=False):
+    """
+    (text, words) of transcribe(chunks), unless the fingerprint cache already holds a transcript of the
+    same audio in the same decoding mode. audio_chunks: the audio as 16 kHz mono int16 arrays.
+    transcribe(None) reads/decodes the input itself. With spool (audio decoded on the fly), the audio read
+    for the fingerprint is kept and handed to transcribe on a miss, so the input is decoded only once.
+    The cache is best-effort: any error in it falls back to transcribing.
+    """
+    cache = fingerprint.TranscriptCache.open()
+    if cache is None:
+        return transcribe(None)
+    mode = ("fast:" if args.get('fast') else "full:") + MODEL_PATH
+    pcm = streaming.PcmSpool() if spool else None
+    try:
+        try:
+            fp, duration = fingerprint.fingerprint_chunks(pcm.record(audio_chunks) if pcm else audio_chunks)
+            hit = cache.lookup(fp, duration, mode, timed=bool(args.get('timed')))
+        except Exception as e:
+            print(f"Warning: fingerprint lookup failed ({e})", file=sys.stderr)
+            return transcribe(None)
+        if hit is not None:
+            text, words = hit
+            return text, words if args.get('timed') else None
+
+        text, words = transcribe(pcm.replay() if pcm else None)
+    finally:
+        if pcm:
+            pcm.close()
+    try:
+        cache.store(fp, duration, mode, text, words)
+    except Exception as e:
+        print(f"Warning: could not store the transcript in the fingerprint cache ({e})", file=sys.stderr)
+    return text, words
 
 def execute_command(command):
     print(">_ " + command)
@@ -17,21 +70,74 @@ def get_command_output(command):
     print(">_ " + command)
     return subprocess.run(command.split(), capture_output=True)
 
+def stream_main(args):
+    """
+    Streaming path: decodes the input (plain video/audio, or the audio member of a package) straight
+    into DeepSpeech, and writes the output package directly, without any intermediate file.
+    """
+    orig_input = args['input']
+    orig_output = args['output']
+    output_dir = os.path.dirname(orig_output)
+    output_name = os.path.basename(orig_output)
+
+    print("SCRIPT (stream): Input at '{}', saving output in '{}'".format(orig_input, orig_output))
+
+    try:
+        is_package = orig_input.endswith(".tar.gz")
+        member = streaming.find_package_audio(orig_input) if is_package else None
+        if is_package and member is None:
+            print("REJECTED: No audio or video found inside the uploaded archive.", file=sys.stderr)
+            sys.exit(1)
+
+        scorer, beam_width = decoder_settings(args)
+        def transcribe(chunks):
+            if chunks is None:
+                chunks = streaming.decode_pcm(orig_input, member)
+            return streaming.transcribe_chunks(chunks, MODEL_PATH, scorer, timed=args.get('timed'), beam_width=beam_width)
+
+        transcript_text, words = cached_transcribe(args, streaming.decode_pcm(orig_input, member), transcribe, spool=True)
+        print(transcript_text)
+
+        # Package: transcript(s) from memory, the video copied as-is (grep returns it on a match).
+        # A fast (screening) transcript is only read by the caller, so it goes without the video.
+        with tarfile.open(os.path.join(output_dir, output_name + ".tar.gz"), "w:gz") as out:
+            _add_bytes(out, "transcript.txt", transcript_text.encode("utf-8"))
+            if words is not None:
+                _add_bytes(out, "transcript.json", json.dumps({"words": words}).encode("utf-8"))
+
+            with_video = not args.get('fast')
+            if with_video and not is_package and orig_input.lower().endswith(VIDEO_EXTENSIONS):
+                out.add(orig_input, arcname=output_name + ".mp4")
+            elif with_video and is_package:
+                with tarfile.open(orig_input, "r:gz") as src:
+                    video = next((m for m in src.getmembers()
+                                  if streaming._is_media_member(m) and m.name.lower().endswith(".mp4")), None)
+                    if video is not None:
+                        info = tarfile.TarInfo(output_name + ".mp4")
+                        info.size = video.size
+                        out.addfile(info, src.extractfile(video))
+    except Exception as e:
+        print(f"Processing Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
 def main(args):
     orig_input = args['input']
     orig_output = args['output']
 
     print("SCRIPT: Input at '{}', saving output in '{}'".format(args['input'], args['output']))
 
-    input_dir = os.path.dirname(orig_input)
     output_dir = os.path.dirname(orig_output)
     output_name = os.path.basename(orig_output)
     archive_name = output_name + ".tar.gz"
     
     # 1. Create a Temporary Extraction Folder
-    # This keeps the 'uploads' folder clean. We extract here, not in input_dir.
-    extract_tmp_dir = os.path.join(input_dir, "temp_" + os.path.basename(orig_input))
-    os.makedirs(extract_tmp_dir, exist_ok=True)
+    # This keeps the 'uploads' folder clean. Under the job's TMPDIR, removed even if the job is killed.
+    extract_tmp_dir = tempfile.mkdtemp(prefix="temp_" + os.path.basename(orig_input) + "_")
 
     try:
         # 2. Extract Archive into Temp Folder
@@ -52,17 +158,58 @@ def main(args):
         print(f"Found audio file: {audio_path}")
 
         # 4. Run DeepSpeech
-        model = "deepspeech-0.9.3-models.tflite"
-        scorer = "deepspeech-0.9.3-models.scorer"
+        model = MODEL_PATH
+        scorer, beam_width = decoder_settings(args)
 
         # Note: If models are in /app, use absolute paths:
         # model = "/app/deepspeech-0.9.3-models.tflite"
         # scorer = "/app/deepspeech-0.9.3-models.scorer"
 
-        command = "deepspeech --model %s --scorer %s --audio %s" % (model, scorer, audio_path)
-        output = get_command_output(command)
+        files_to_tar = ["transcript.txt"]
+        # 0 = as many processes as the thread budget given by the backend scheduler (else all cores)
+        workers = args.get('workers') or int(os.getenv("TOOL_THREADS") or 0) or os.cpu_count() or 1
+
+        def transcribe(_chunks=None):
+            # The wav is read from disk again, nothing is decoded twice
+            if workers > 1 and windowed.can_window(audio_path):
+                # Long audio: silence-aligned windows transcribed in parallel (one model per process)
+                words = windowed.transcribe_windowed(audio_path, model, scorer, workers, beam_width)
+                return " ".join(w["word"] for w in words), words
+
+            command = "deepspeech --model %s --audio %s" % (model, audio_path)
+            if scorer:
+                command += " --scorer %s" % scorer
+            if beam_width:
+                command += " --beam_width %d" % beam_width
+            if args.get('timed'):
+                # Word-level timings: {"transcripts": [{"confidence", "words": [{"word", "start_time", "duration"}]}]}
+                command += " --json"
+            output = get_command_output(command)
         
-        transcript_text = output.stdout.decode('utf-8')
+            transcript_text = output.stdout.decode('utf-8')
+            words = None
+
+            if args.get('timed'):
+                metadata = json.loads(transcript_text)
+                best = metadata["transcripts"][0] if metadata.get("transcripts") else {"words": []}
+                words = [
+                    {"word": w["word"], "start": round(w["start_time"], 3), "end": round(w["start_time"] + w["duration"], 3)}
+                    for w in best["words"]
+                ]
+                transcript_text = " ".join(w["word"] for w in words)
+            return transcript_text, words
+
+        # ffmpeg-2 writes 16 kHz mono 16-bit wavs: fingerprinted as they are (other formats skip the cache)
+        rate, channels, width, _ = windowed.wav_info(audio_path)
+        if (rate, channels, width) == (fingerprint.SAMPLE_RATE, 1, 2):
+            transcript_text, words = cached_transcribe(args, fingerprint.wav_chunks(audio_path), transcribe)
+        else:
+            transcript_text, words = transcribe(None)
+
+        if args.get('timed'):
+            with open(os.path.join(output_dir, "transcript.json"), "w") as file:
+                json.dump({"words": words}, file)
+            files_to_tar.append("transcript.json")
         print(transcript_text)
         
         # 5. Save Transcript to Output Dir
@@ -79,7 +226,9 @@ def main(args):
         final_video_path = os.path.join(output_dir, final_video_name)
 
         video_included = False
-        if valid_mp4s:
+        if valid_mp4s and args.get('fast'):
+            print("Fast (screening) transcript: the video is not packaged.")
+        elif valid_mp4s:
             found_mp4 = valid_mp4s[0]
             print(f"Found video file: {found_mp4}")
             # Copy from temp folder to output folder
@@ -92,7 +241,6 @@ def main(args):
         cwd = os.getcwd()
         os.chdir(output_dir)
         
-        files_to_tar = ["transcript.txt"]
         if video_included:
             files_to_tar.append(final_video_name)
             
@@ -102,6 +250,8 @@ def main(args):
         # Clean up output directory artifacts (keep only the tar.gz)
         if os.path.exists("transcript.txt"):
             os.remove("transcript.txt")
+        if os.path.exists("transcript.json"):
+            os.remove("transcript.json")
         if video_included and os.path.exists(final_video_name):
             os.remove(final_video_name)
             
@@ -122,6 +272,16 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", required=True, help="path to input video")
     parser.add_argument("-o", "--output", help="path to output images")
+    parser.add_argument("--timed", action="store_true", help="also write word timings (transcript.json)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("DEEPSPEECH_WORKERS", 1)),
+                        help="processes for long audio (windowed mode); 1 = single deepspeech call, 0 = thread budget (or all cores)")
+    parser.add_argument("--fast", action="store_true",
+                        help="screening pass: no scorer, narrow beam (DEEPSPEECH_FAST_BEAM_WIDTH), no video in the output")
+    parser.add_argument("--stream", action="store_true",
+                        help="decode straight into a DeepSpeech stream (always used for plain video/audio input)")
     args = vars(parser.parse_args())
 
-    main(args)
\ No newline at end of file
+    if args['stream'] or not args['input'].endswith(".tar.gz"):
+        stream_main(args)
+    else:
+        main(args)
\ No newline at end of file
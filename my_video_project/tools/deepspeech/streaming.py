@@ -0,0 +1,151 @@
+"""
+Streaming transcription: ffmpeg decodes the input straight to 16 kHz mono s16le on stdout and the
+PCM chunks are fed to a DeepSpeech stream (createStream/feedAudioContent) as they arrive.
+No wav is written, resampled or extracted on the way.
+
+The input can be any file ffmpeg reads (e.g. a plain .mp4) or a .tar.gz package: the audio member
+of the package is piped into ffmpeg's stdin directly from the archive.
+"""
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from windowed import _words_from_tokens
+
+CHUNK_BYTES = 16000 * 2  # 1 second of 16 kHz s16le
+# Thread budget given by the backend scheduler (empty: ffmpeg picks its own)
+THREADS = os.getenv("TOOL_THREADS", "")
+# Decoded audio kept for a second pass stays in memory up to this size (~30 min), then goes to the job's TMPDIR
+SPOOL_MEMORY_BYTES = int(os.getenv("DEEPSPEECH_SPOOL_MEMORY_BYTES", 64 * 1024 * 1024))
+
+
+def _is_media_member(member):
+    name = os.path.basename(member.name)
+    return member.isfile() and not name.startswith("._") and name.lower().endswith((".wav", ".mp4"))
+
+
+def find_package_audio(package_path):
+    """Name of the member to decode: the .wav if there is one, else the video."""
+    with tarfile.open(package_path, "r:gz") as tar:
+        members = [m for m in tar.getmembers() if _is_media_member(m)]
+    wavs = [m.name for m in members if m.name.lower().endswith(".wav")]
+    if wavs:
+        return wavs[0]
+    return members[0].name if members else None
+
+
+def _pipe_member(package_path, member_name, stdin):
+    """Copies one archive member into ffmpeg's stdin (runs in a thread, so stdout keeps draining)."""
+    try:
+        with tarfile.open(package_path, "r:gz") as tar:
+            src = tar.extractfile(member_name)
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # ffmpeg stopped early; its exit code tells us why
+    finally:
+        stdin.close()
+
+
+def decode_pcm(input_path, member_name=None):
+    """
+    Yields the audio of the input as 16 kHz mono int16 arrays, as ffmpeg decodes it. 'member_name'
+    selects the audio member of a package; without it input_path is decoded directly.
+    Raises RuntimeError (after the last chunk) if ffmpeg fails.
+    """
+    source = "pipe:0" if member_name else input_path
+    command = ["ffmpeg", "-loglevel", "error", "-i", source, "-vn", "-ac", "1", "-ar", "16000", "-f", "s16le", "pipe:1"]
+    if THREADS:
+        command[-1:-1] = ["-threads", THREADS]
+    print(">_ " + " ".join(command))
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE if member_name else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=sys.stderr)
+
+    feeder = None
+    if member_name:
+        feeder = threading.Thread(target=_pipe_member, args=(input_path, member_name, proc.stdin), daemon=True)
+        feeder.start()
+
+    try:
+        pending = b""
+        while True:
+            chunk = proc.stdout.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % 2  # Never split a 16-bit sample
+            yield np.frombuffer(pending[:usable], dtype=np.int16)
+            pending = pending[usable:]
+    finally:
+        if proc.poll() is None:
+            proc.stdout.close()  # Consumer stopped early
+        if feeder is not None:
+            feeder.join()
+        code = proc.wait()
+    if code != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {input_path} (exit code {code})")
+
+
+class PcmSpool:
+    """
+    Keeps the decoded audio while it is read a first time (e.g. to fingerprint it), so a second pass
+    (the transcription) replays it instead of running ffmpeg on the input again.
+    """
+
+    def __init__(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+
+    def record(self, chunks):
+        for samples in chunks:
+            self._file.write(samples.tobytes())
+            yield samples
+
+    def replay(self):
+        self._file.seek(0)
+        while True:
+            data = self._file.read(CHUNK_BYTES)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.int16)
+
+    def close(self):
+        self._file.close()
+
+
+def transcribe_stream(input_path, model_path, scorer_path, timed=False, member_name=None, beam_width=None):
+    """
+    Returns (transcript text, words or None), see decode_pcm for the input.
+    No scorer_path / a beam_width: faster, rougher decoding.
+    """
+    return transcribe_chunks(decode_pcm(input_path, member_name), model_path, scorer_path, timed, beam_width)
+
+
+def transcribe_chunks(chunks, model_path, scorer_path, timed=False, beam_width=None):
+    """transcribe_stream on audio already decoded (16 kHz mono int16 arrays)."""
+    from deepspeech import Model
+    model = Model(model_path)
+    if scorer_path:
+        model.enableExternalScorer(scorer_path)
+    if beam_width:
+        model.setBeamWidth(beam_width)
+    stream = model.createStream()
+
+    try:
+        for samples in chunks:
+            stream.feedAudioContent(samples)
+    except RuntimeError:
+        stream.freeStream()
+        raise
+
+    if not timed:
+        return stream.finishStream(), None
+
+    metadata = stream.finishStreamWithMetadata(1)
+    words = _words_from_tokens(metadata.transcripts[0].tokens, 0.0) if metadata.transcripts else []
+    return " ".join(w["word"] for w in words), words
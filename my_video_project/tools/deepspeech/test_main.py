@@ -0,0 +1,67 @@
+"""
+main() on a transcription package: run `python -m unittest test_main` from this folder.
+The deepspeech CLI is replaced by a canned transcript, the rest (tar, wav checks, packaging) runs for real.
+"""
+import os
+import wave
+import shutil
+import tarfile
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import main
+
+
+def write_wav(path, rate, channels, seconds=1):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\x00\x00" * channels * rate * seconds)
+
+
+class PackageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.tmp, "out")
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_main(self, rate, channels):
+        wav_path = os.path.join(self.tmp, "audio.wav")
+        write_wav(wav_path, rate, channels)
+        package = os.path.join(self.tmp, "audio.tar.gz")
+        with tarfile.open(package, "w:gz") as tar:
+            tar.add(wav_path, arcname="audio.wav")
+
+        deepspeech = SimpleNamespace(stdout=b"hello world")
+        with mock.patch.object(main, "get_command_output", return_value=deepspeech) as cli, \
+                mock.patch.object(main, "cached_transcribe", wraps=main.cached_transcribe) as cached:
+            main.main({"input": package, "output": os.path.join(self.output_dir, "transcript"),
+                       "timed": False, "workers": 1, "fast": False})
+
+        with tarfile.open(os.path.join(self.output_dir, "transcript.tar.gz")) as tar:
+            text = tar.extractfile("transcript.txt").read().decode()
+        return text, cli, cached
+
+    def test_full_rate_stereo_wav_skips_the_cache(self):
+        # e.g. the audio.wav written by ffmpeg-0
+        text, cli, cached = self.run_main(44100, 2)
+        self.assertEqual(text, "hello world")
+        cli.assert_called_once()
+        cached.assert_not_called()
+
+    def test_16khz_mono_wav_goes_through_the_cache(self):
+        with mock.patch("fingerprint.TranscriptCache.open", return_value=None):
+            text, cli, cached = self.run_main(16000, 1)
+        self.assertEqual(text, "hello world")
+        cli.assert_called_once()
+        cached.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Parallel windowed transcription for long audio.
+
+The wav is cut into windows of about WINDOW_SECONDS, each cut placed on the quietest frame near the
+nominal boundary (so words are rarely split), and every window is extended by OVERLAP_SECONDS on both
+sides. A process pool transcribes the windows; each worker process loads the model once.
+Stitching keeps, from every window, only the words whose midpoint lies in the window's own span
+(between its two cuts), so the words seen twice in an overlap are kept exactly once.
+"""
+import os
+import wave
+import numpy as np
+from multiprocessing import Pool
+
+WINDOW_SECONDS = float(os.getenv("DEEPSPEECH_WINDOW_SECONDS", 60))
+OVERLAP_SECONDS = float(os.getenv("DEEPSPEECH_OVERLAP_SECONDS", 2))
+# How far from the nominal boundary we look for silence
+SEARCH_SECONDS = float(os.getenv("DEEPSPEECH_SILENCE_SEARCH_SECONDS", 5))
+FRAME_SECONDS = 0.02
+SAMPLE_RATE = 16000
+
+_model = None
+_audio_path = None
+
+
+def wav_info(audio_path):
+    """(sample rate, channels, sample width, number of frames) of a wav file."""
+    with wave.open(audio_path, "rb") as w:
+        return w.getframerate(), w.getnchannels(), w.getsampwidth(), w.getnframes()
+
+
+def can_window(audio_path):
+    """The model expects 16 kHz mono 16-bit PCM (what ffmpeg-2 produces); anything else goes to the CLI."""
+    rate, channels, width, frames = wav_info(audio_path)
+    return rate == SAMPLE_RATE and channels == 1 and width == 2 and frames / rate > WINDOW_SECONDS * 1.5
+
+
+def _read_samples(audio_path, start, end):
+    with wave.open(audio_path, "rb") as w:
+        w.setpos(start)
+        return np.frombuffer(w.readframes(end - start), dtype=np.int16)
+
+
+def find_cuts(audio_path):
+    """Sample offsets of the cuts: 0, one silence near every WINDOW_SECONDS, end of file."""
+    total = wav_info(audio_path)[3]
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    n_frames = total // frame
+
+    # RMS energy per frame, read in blocks so an hour of audio is never fully in memory
+    energy = np.empty(n_frames, dtype=np.float32)
+    block = frame * 3000
+    with wave.open(audio_path, "rb") as w:
+        for first in range(0, n_frames, block // frame):
+            samples = np.frombuffer(w.readframes(block), dtype=np.int16).astype(np.float32)
+            count = min(len(samples) // frame, n_frames - first)
+            frames = samples[:count * frame].reshape(count, frame)
+            energy[first:first + count] = np.sqrt(np.mean(frames ** 2, axis=1))
+
+    cuts = [0]
+    window = int(WINDOW_SECONDS * SAMPLE_RATE)
+    radius = int(SEARCH_SECONDS / FRAME_SECONDS)
+    nominal = window
+    while nominal < total - window // 2:
+        center = nominal // frame
+        lo, hi = max(0, center - radius), min(n_frames, center + radius + 1)
+        quietest = lo + int(np.argmin(energy[lo:hi])) if hi > lo else center
+        cut = max(cuts[-1] + frame, quietest * frame + frame // 2)
+        cuts.append(cut)
+        nominal = cut + window
+    cuts.append(total)
+    return cuts
+
+
+def _init_worker(model_path, scorer_path, audio_path, beam_width=None):
+    """Runs once per pool process: the model is loaded once and reused for all its windows."""
+    global _model, _audio_path
+    from deepspeech import Model
+    _model = Model(model_path)
+    if scorer_path:
+        _model.enableExternalScorer(scorer_path)
+    if beam_width:
+        _model.setBeamWidth(beam_width)
+    _audio_path = audio_path
+
+
+def _words_from_tokens(tokens, offset_seconds):
+    """Groups the per-character tokens into words with absolute start/end times."""
+    words = []
+    word, start, last = "", 0.0, 0.0
+    for i, token in enumerate(tokens):
+        if token.text != " ":
+            if not word:
+                start = token.start_time
+            word += token.text
+            last = token.start_time
+        if (token.text == " " or i == len(tokens) - 1) and word:
+            words.append({"word": word, "start": round(offset_seconds + start, 3),
+                          "end": round(offset_seconds + max(last, start + FRAME_SECONDS), 3)})
+            word = ""
+    return words
+
+
+def _transcribe_window(job):
+    """Transcribes [read_start, read_end) and keeps the words whose midpoint is in [own_start, own_end)."""
+    read_start, read_end, own_start, own_end = job
+    audio = _read_samples(_audio_path, read_start, read_end)
+    metadata = _model.sttWithMetadata(audio, 1)
+    if not metadata.transcripts:
+        return []
+    words = _words_from_tokens(metadata.transcripts[0].tokens, read_start / SAMPLE_RATE)
+    own_start_s, own_end_s = own_start / SAMPLE_RATE, own_end / SAMPLE_RATE
+    return [w for w in words if own_start_s <= (w["start"] + w["end"]) / 2 < own_end_s]
+
+
+def transcribe_windowed(audio_path, model_path, scorer_path, workers, beam_width=None):
+    """Returns the stitched [{word, start, end}] of the whole file."""
+    cuts = find_cuts(audio_path)
+    total = cuts[-1]
+    overlap = int(OVERLAP_SECONDS * SAMPLE_RATE)
+    jobs = []
+    for i in range(len(cuts) - 1):
+        own_start, own_end = cuts[i], cuts[i + 1]
+        # The first/last window own everything before/after them
+        jobs.append((max(0, own_start - overlap), min(total, own_end + overlap),
+                     0 if i == 0 else own_start, total + 1 if i == len(cuts) - 2 else own_end))
+    print(f"Windowed transcription: {len(jobs)} windows of ~{WINDOW_SECONDS:.0f}s on {workers} processes")
+
+    with Pool(processes=min(workers, len(jobs)), initializer=_init_worker,
+              initargs=(model_path, scorer_path, audio_path, beam_width)) as pool:
+        parts = pool.map(_transcribe_window, jobs, chunksize=1)
+    return [word for part in parts for word in part]
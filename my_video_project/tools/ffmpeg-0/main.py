@@ -4,6 +4,10 @@ import os
 
 import argparse
 
+# Thread budget given by the backend scheduler (empty: ffmpeg picks its own)
+THREADS = os.getenv("TOOL_THREADS", "")
+FFMPEG_THREADS = "-threads %s " % THREADS if THREADS else ""
+
 def execute_command(command):
     print(">_ " + command)
     subprocess.run(command.split())
@@ -22,7 +26,7 @@ def main(args):
     video_path = os.path.join(output_dir, "video.mp4")
     audio_path = os.path.join(output_dir, "audio.wav")
     
-    execute_command("ffmpeg -i %s -map 0:a %s" % (orig_input, audio_path))
+    execute_command("ffmpeg -i %s -map 0:a %s%s" % (orig_input, FFMPEG_THREADS, audio_path))
     execute_command("cp %s %s" % (orig_input, video_path))
     os.chdir(output_dir)
     execute_command("tar -czvf %s %s %s" % (archive_name, "video.mp4", "audio.wav"))
@@ -0,0 +1,251 @@
+"""
+Keyframe index and smart cutting.
+
+The index lists the presentation times of the video keyframes; it is built once per source video
+with a packet-level ffprobe scan (no decoding). index_for is the only way in: it takes the index shipped
+in the package (keyframes.json), else the one cached on the shared volume for the same video content,
+else builds it and caches it there, so no caller repeats the scan.
+
+A clip [start, end) is then cut as up to three segments joined with the concat demuxer:
+    head  [start, first keyframe)   re-encoded (only when start is not on a keyframe)
+    body  [first keyframe, last keyframe)   stream copy
+    tail  [last keyframe, end)      re-encoded (only when end is not on a keyframe)
+so the boundaries are exact while almost all of the clip is copied. The re-encoded fragments use the
+profile, level and pixel format of the source so their parameter sets match the copied ones.
+Segments are video only: the audio of [start, end) is cut once and muxed over the joined video,
+so there are no audio gaps at the joins.
+"""
+import os
+import json
+import uuid
+import hashlib
+import subprocess
+
+INDEX_NAME = "keyframes.json"
+# Indexes built here, by sha256 of the video (shared by every ffmpeg-1 call, whatever the package)
+INDEX_CACHE_DIR = os.getenv("FFMPEG_KEYFRAME_INDEX_DIR", "/data/keyframe_index")
+# Boundaries closer than this to a keyframe are treated as being on it
+TOLERANCE_SECONDS = 0.001
+# Thread budget given by the backend scheduler (empty: ffmpeg picks its own)
+THREADS = os.getenv("TOOL_THREADS", "")
+
+
+def to_seconds(timestamp):
+    """'SS.mmm', 'MM:SS' or 'HH:MM:SS(.mmm)' -> seconds."""
+    seconds = 0.0
+    for part in str(timestamp).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _probe(args):
+    return subprocess.run(["ffprobe", "-v", "error"] + args, capture_output=True, text=True, check=True).stdout
+
+
+def build_index(video_path):
+    """{size, duration, video: {codec_name, profile, level, pix_fmt, time_base}, audio: {codec_name, bit_rate},
+    keyframes: [seconds from the start]} of a video."""
+    stream = json.loads(_probe(["-show_entries", "stream=codec_type,codec_name,profile,level,pix_fmt,time_base,bit_rate"
+                                ":format=duration,start_time", "-of", "json", video_path]))
+    streams = stream.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    packets = _probe(["-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+                      "-of", "csv=p=0", video_path])
+
+    # -ss is relative to the start of the file, so are the keyframe times
+    start_time = float(stream.get("format", {}).get("start_time") or 0)
+    keyframes = set()
+    for line in packets.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            keyframes.add(round(float(pts) - start_time, 6))
+
+    return {
+        "size": os.path.getsize(video_path),
+        "duration": float(stream.get("format", {}).get("duration") or 0),
+        "video": {k: video[k] for k in ("codec_name", "profile", "level", "pix_fmt", "time_base") if k in video},
+        "audio": {k: audio[k] for k in ("codec_name", "bit_rate") if k in audio},
+        "keyframes": sorted(keyframes),
+    }
+
+
+def load_index(index_path, video_path):
+    """The index at index_path if it describes this video (same size), else None."""
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("size") != os.path.getsize(video_path) or not index.get("keyframes"):
+        return None
+    return index
+
+
+def _video_digest(video_path):
+    sha = hashlib.sha256()
+    with open(video_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _write_index(index, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.part"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+def index_for(video_path, shipped_path=None):
+    """
+    Keyframe index of video_path, or None if it cannot be built (the caller then stream-copies).
+    shipped_path: keyframes.json shipped with the video, if any. A built index is cached under INDEX_CACHE_DIR
+    and also written to shipped_path, so the caller can keep it next to its copy of the video.
+    """
+    if shipped_path:
+        index = load_index(shipped_path, video_path)
+        if index is not None:
+            return index
+
+    cache_path = None
+    try:
+        cache_path = os.path.join(INDEX_CACHE_DIR, _video_digest(video_path) + ".json")
+        index = load_index(cache_path, video_path)
+    except OSError as e:
+        print(f"Warning: keyframe index cache unavailable ({e})")
+        index = None
+    if index is not None:
+        print(f"Keyframe index from cache: {len(index['keyframes'])} keyframes")
+    else:
+        try:
+            index = build_index(video_path)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"Warning: no keyframe index ({e}), falling back to plain stream copy.")
+            return None
+        print(f"Keyframe index built: {len(index['keyframes'])} keyframes")
+        if cache_path and index["keyframes"]:
+            try:
+                _write_index(index, cache_path)
+            except OSError as e:
+                print(f"Warning: could not cache the keyframe index ({e})")
+
+    if shipped_path:
+        _write_index(index, shipped_path)
+    return index
+
+
+def plan_segments(start, end, keyframes):
+    """[(mode, start, end)] with mode 'copy' or 'encode', covering [start, end) exactly."""
+    inside = [k for k in keyframes if start - TOLERANCE_SECONDS <= k <= end + TOLERANCE_SECONDS]
+    first = next((k for k in inside if k >= start - TOLERANCE_SECONDS), None)
+    last = inside[-1] if inside else None
+
+    # Less than one full GOP in the clip: re-encoding all of it is cheap
+    if first is None or last - first <= TOLERANCE_SECONDS:
+        return [("encode", start, end)]
+
+    segments = []
+    if first - start > TOLERANCE_SECONDS:
+        segments.append(("encode", start, first))
+    segments.append(("copy", first, last))
+    if end - last > TOLERANCE_SECONDS:
+        segments.append(("encode", last, end))
+    return segments
+
+
+# ffprobe profile names -> encoder profile names
+H264_PROFILES = {"Baseline": "baseline", "Constrained Baseline": "baseline", "Main": "main", "High": "high",
+                 "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"}
+HEVC_PROFILES = {"Main": "main", "Main 10": "main10", "Main Still Picture": "mainstillpicture"}
+
+
+def _timescale_options(index):
+    time_base = index.get("video", {}).get("time_base", "")
+    return ["-video_track_timescale", time_base[2:]] if time_base.startswith("1/") else []
+
+
+def _encode_options(index):
+    """Re-encoded fragments keep the codec, profile, level, pixel format and time base of the source,
+    so they concat with the copied ones."""
+    video = index.get("video", {})
+    codec = {"h264": "libx264", "hevc": "libx265"}.get(video.get("codec_name"), "libx264")
+    options = ["-c:v", codec, "-preset", "veryfast", "-crf", "18"]
+    if THREADS:
+        options += ["-threads", THREADS]
+    if video.get("pix_fmt"):
+        options += ["-pix_fmt", video["pix_fmt"]]
+
+    # ffprobe reports the level as level_idc: 10x the level for H.264, 30x for HEVC
+    level = video.get("level") if isinstance(video.get("level"), int) and video.get("level") > 0 else None
+    if codec == "libx264":
+        if video.get("profile") in H264_PROFILES:
+            options += ["-profile:v", H264_PROFILES[video["profile"]]]
+        if level:
+            options += ["-level:v", "1b" if level == 9 else f"{level / 10:.1f}"]
+    else:
+        if video.get("profile") in HEVC_PROFILES:
+            options += ["-profile:v", HEVC_PROFILES[video["profile"]]]
+        if level:
+            options += ["-x265-params", f"level-idc={level / 30:.1f}"]
+    return options + _timescale_options(index)
+
+
+def _audio_options(index):
+    """The audio of the whole clip is re-encoded in one pass (sample-exact boundaries, no gaps at the joins)."""
+    options = ["-c:a", "aac"]
+    bit_rate = index.get("audio", {}).get("bit_rate", "")
+    if str(bit_rate).isdigit():
+        options += ["-b:a", str(bit_rate)]
+    return options
+
+
+def _run(command):
+    print(">_ " + " ".join(command))
+    subprocess.run(command, check=True)
+
+
+def smart_cut(video_path, start, end, clip_path, index):
+    """Cuts [start, end) of video_path into clip_path. Returns the segment plan that was used."""
+    segments = plan_segments(start, end, index["keyframes"])
+    workdir = clip_path + ".parts"
+    os.makedirs(workdir, exist_ok=True)
+
+    # 1. Video segments (no audio): stream copy between keyframes, re-encoded edges
+    parts = []
+    for i, (mode, seg_start, seg_end) in enumerate(segments):
+        part = os.path.join(workdir, f"part_{i}.mp4")
+        if mode == "copy":
+            # -t stops on decode timestamps, which lag behind with B-frames: drop what shows at or after the end
+            codec = ["-c:v", "copy", "-bsf:v", f"noise=drop=gte(pts*tb\\,{seg_end - seg_start - TOLERANCE_SECONDS:.6f})"]
+        else:
+            codec = _encode_options(index)
+        _run(["ffmpeg", "-y", "-loglevel", "error", "-ss", f"{seg_start:.6f}", "-i", video_path,
+              "-t", f"{seg_end - seg_start:.6f}", "-map", "0:v:0", "-an"]
+             + codec + ["-avoid_negative_ts", "make_zero", part])
+        parts.append(part)
+
+    # 2. Join them
+    temp_files = list(parts)
+    if len(parts) == 1:
+        video_only = parts[0]
+    else:
+        list_path = os.path.join(workdir, "parts.txt")
+        video_only = os.path.join(workdir, "video.mp4")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{os.path.abspath(p)}'\n" for p in parts)
+        _run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+              "-c", "copy"] + _timescale_options(index) + [video_only])
+        temp_files += [list_path, video_only]
+
+    # 3. Mux the audio of [start, end), cut in one piece, over the joined video
+    _run(["ffmpeg", "-y", "-loglevel", "error", "-i", video_only,
+          "-ss", f"{start:.6f}", "-t", f"{end - start:.6f}", "-i", video_path,
+          "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy"] + _audio_options(index)
+         + _timescale_options(index) + [clip_path])
+
+    for p in temp_files:
+        os.remove(p)
+    os.rmdir(workdir)
+    return segments
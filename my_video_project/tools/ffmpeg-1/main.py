@@ -2,6 +2,7 @@ import sys
 import subprocess
 import os
 import argparse
+import keyframes
 
 def execute_command(command):
     print(f">_ {command}")
@@ -19,7 +20,8 @@ def main(args):
 
     # 2. Extract
     # We extract into the directory where the output clips should go
-    command = f"tar -xvzf {orig_input} -C {output_folder}"
+    # (.tar.gz or a plain .tar, e.g. the search-first packages: tar detects the compression itself)
+    command = f"tar -xvf {orig_input} -C {output_folder}"
     execute_command(command)
     
     # Paths for extracted files
@@ -33,6 +35,9 @@ def main(args):
     with open(timestamp_path) as file:
         lines = file.readlines()
 
+    # Keyframe index: shipped in the package, cached for this video, or built (and cached) once here
+    index = keyframes.index_for(video_path, os.path.join(output_folder, keyframes.INDEX_NAME))
+
     generated_clips = []
 
     # 3. Generate Clips
@@ -45,9 +50,16 @@ def main(args):
         clip_name = f"clip_{i}.mp4"
         clip_path = os.path.join(output_folder, clip_name)
         
-        # -y forces overwrite, -c copy is fast (no re-encoding)
-        command = f"ffmpeg -y -ss {start} -to {end} -i {video_path} -c copy {clip_path}"
-        execute_command(command)
+        if index is not None:
+            # Exact boundaries: stream copy between keyframes, re-encode only the edge fragments
+            plan = keyframes.smart_cut(video_path, keyframes.to_seconds(start), keyframes.to_seconds(end),
+                                       clip_path, index)
+            print(f"{clip_name}: " + ", ".join(f"{mode} {s:.3f}-{e:.3f}" for mode, s, e in plan))
+        else:
+            # -y forces overwrite, -c copy is fast (no re-encoding)
+            threads = f"-threads {keyframes.THREADS} " if keyframes.THREADS else ""
+            command = f"ffmpeg -y -ss {start} -to {end} -i {video_path} -c copy {threads}{clip_path}"
+            execute_command(command)
         generated_clips.append(clip_name)
 
     print(f"Successfully created {len(generated_clips)} clips in {output_folder}")
@@ -56,6 +68,7 @@ def main(args):
     print("Cleaning up intermediate source files...")
     
     # We dont delete the generated clips, because that is what we want to keep
+    # (nor keyframes.json: the caller caches it next to the source video)
     if os.path.exists(timestamp_path): os.remove(timestamp_path)
     if os.path.exists(video_path): os.remove(video_path)
 
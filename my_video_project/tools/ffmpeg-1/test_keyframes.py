@@ -0,0 +1,88 @@
+"""
+smart_cut on a real video: run `python -m unittest test_keyframes` from this folder.
+Skipped unless ffmpeg and ffprobe are on the PATH.
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+import keyframes
+
+HAVE_FFMPEG = shutil.which("ffmpeg") and shutil.which("ffprobe")
+
+
+def probe_duration(path, stream):
+    out = subprocess.run(["ffprobe", "-v", "error", "-select_streams", stream, "-show_entries", "stream=duration",
+                          "-of", "json", path], capture_output=True, text=True, check=True).stdout
+    return float(json.loads(out)["streams"][0]["duration"])
+
+
+@unittest.skipUnless(HAVE_FFMPEG, "ffmpeg/ffprobe not installed")
+class SmartCutTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.video = os.path.join(cls.tmp, "video.mp4")
+        # 10 s, 25 fps, a keyframe every 2 s, High profile yuv420p + AAC audio
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error",
+                        "-f", "lavfi", "-i", "testsrc=size=320x240:rate=25:duration=10",
+                        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=10",
+                        "-c:v", "libx264", "-profile:v", "high", "-level:v", "3.0", "-pix_fmt", "yuv420p",
+                        "-g", "50", "-keyint_min", "50", "-sc_threshold", "0",
+                        "-c:a", "aac", "-b:a", "128k", cls.video], check=True)
+        cls.index = keyframes.build_index(cls.video)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def cut(self, start, end):
+        clip = os.path.join(self.tmp, f"clip_{start}_{end}.mp4")
+        plan = keyframes.smart_cut(self.video, start, end, clip, self.index)
+        return clip, plan
+
+    def assert_clean_clip(self, clip, duration):
+        self.assertAlmostEqual(probe_duration(clip, "v:0"), duration, delta=0.05)
+        self.assertAlmostEqual(probe_duration(clip, "a:0"), duration, delta=0.05)
+        decode = subprocess.run(["ffmpeg", "-v", "error", "-i", clip, "-f", "null", "-"],
+                                capture_output=True, text=True)
+        self.assertEqual(decode.returncode, 0)
+        self.assertEqual(decode.stderr.strip(), "")
+
+    def test_index(self):
+        self.assertEqual(self.index["keyframes"], [0.0, 2.0, 4.0, 6.0, 8.0])
+        self.assertEqual(self.index["video"]["profile"], "High")
+        self.assertEqual(self.index["video"]["level"], 30)
+
+    def test_index_is_built_once_per_video(self):
+        cache_dir = os.path.join(self.tmp, "index_cache")
+        shipped = os.path.join(self.tmp, "package", keyframes.INDEX_NAME)
+        with mock.patch.object(keyframes, "INDEX_CACHE_DIR", cache_dir):
+            self.assertEqual(keyframes.index_for(self.video, shipped), self.index)
+            self.assertEqual(keyframes.load_index(shipped, self.video), self.index)
+            # Any later call on the same video (another package, no shipped index) reads the cache
+            with mock.patch.object(keyframes, "build_index", side_effect=AssertionError("rebuilt")):
+                self.assertEqual(keyframes.index_for(self.video), self.index)
+
+    def test_encoded_edges_and_copied_body(self):
+        clip, plan = self.cut(1.3, 6.7)
+        self.assertEqual([mode for mode, _, _ in plan], ["encode", "copy", "encode"])
+        self.assert_clean_clip(clip, 5.4)
+
+    def test_inside_one_gop(self):
+        clip, plan = self.cut(2.5, 3.5)
+        self.assertEqual([mode for mode, _, _ in plan], ["encode"])
+        self.assert_clean_clip(clip, 1.0)
+
+    def test_on_keyframes(self):
+        clip, plan = self.cut(2.0, 6.0)
+        self.assertEqual([mode for mode, _, _ in plan], ["copy"])
+        self.assert_clean_clip(clip, 4.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,11 @@ import sys
 import subprocess
 import os
 import argparse
+import tempfile
+
+# Thread budget given by the backend scheduler (empty: ffmpeg picks its own)
+THREADS = os.getenv("TOOL_THREADS", "")
+FFMPEG_THREADS = "-threads %s " % THREADS if THREADS else ""
 
 def execute_command(command):
     print(">_ " + command)
@@ -17,7 +22,8 @@ def main(args):
     output_dir = os.path.dirname(orig_output)
     output_name = os.path.basename(orig_output)
 
-    temp_audio_path = orig_input.replace(".mp4", ".wav")
+    # Full-rate audio track, only needed for the down-sampling (under the job's TMPDIR)
+    temp_audio_path = os.path.join(tempfile.gettempdir(), os.path.basename(orig_input).replace(".mp4", ".wav"))
     output_audio_path = orig_output + ".wav"
     output_clip_path = orig_output + ".mp4"
     output_zip_path = orig_output + ".tar.gz"
@@ -27,13 +33,21 @@ def main(args):
     output_zip_name = output_name + ".tar.gz"
     
     # extract audio track
-    execute_command("ffmpeg -i %s -map 0:a %s" % (orig_input, temp_audio_path))
+    execute_command("ffmpeg -i %s -map 0:a %s%s" % (orig_input, FFMPEG_THREADS, temp_audio_path))
 
     # down-sample audio track
-    execute_command("ffmpeg -i %s -vn -ar 16000 -ac 1 %s" % (temp_audio_path, output_audio_path))
+    execute_command("ffmpeg -i %s -vn -ar 16000 -ac 1 %s%s" % (temp_audio_path, FFMPEG_THREADS, output_audio_path))
+
+    # audio-only: the package is only used for transcription/analysis (search-first mode),
+    # so the video is not re-encoded
+    if args.get('audio_only'):
+        os.chdir(output_dir)
+        execute_command("tar -czvf %s %s" % (output_zip_name, output_audio_name))
+        execute_command("rm " + output_audio_name)
+        return
 
     # compress video file
-    execute_command("ffmpeg -i %s -vcodec libx264 -crf 30 %s" % (orig_input, output_clip_path))
+    execute_command("ffmpeg -i %s -vcodec libx264 -crf 30 %s%s" % (orig_input, FFMPEG_THREADS, output_clip_path))
 
     # alternative that copies the clip without compression
     # cp "$INPUT_FILE_PATH" "$TMP_OUTPUT_DIR/$INPUT_FILE"
@@ -53,6 +67,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", required=True, help="path to input video")
     parser.add_argument("-o", "--output", help="path to output images")
+    parser.add_argument("--audio-only", action="store_true", help="only package the 16 kHz mono audio track")
     args = vars(parser.parse_args())
 
     main(args)
@@ -1,102 +1,90 @@
 import sys
-import subprocess
 import os
+import io
+import json
 import argparse
-import shutil
-import glob
+import tarfile
 
-def execute_command(command):
-    print(f">_ {command}")
-    subprocess.run(command, shell=True, check=True)
+# Characters of context kept on each side of a hit, and hits listed in the result (all are counted)
+SNIPPET_CHARS = int(os.getenv("GREP_SNIPPET_CHARS", 40))
+MAX_HITS = int(os.getenv("GREP_MAX_HITS", 20))
+# The view parses the line starting with this marker
+RESULT_MARKER = "GREP_RESULT "
+
+def find_hits(content, search_word):
+    """(count, [{offset, snippet}]) of the case-insensitive occurrences of search_word in content."""
+    haystack, needle = content.lower(), search_word.lower()
+    hits = []
+    count = 0
+    offset = haystack.find(needle)
+    while offset != -1 and needle:
+        count += 1
+        if len(hits) < MAX_HITS:
+            start = max(0, offset - SNIPPET_CHARS)
+            end = min(len(content), offset + len(needle) + SNIPPET_CHARS)
+            snippet = " ".join(content[start:end].split())
+            hits.append({"offset": offset,
+                         "snippet": ("..." if start > 0 else "") + snippet + ("..." if end < len(content) else "")})
+        offset = haystack.find(needle, offset + len(needle))
+    return count, hits
 
 def main(args):
     orig_input = args['input']
     orig_output = args['output']
     search_word = args['word']
 
-    input_dir = os.path.dirname(orig_input)
-    output_dir = os.path.dirname(orig_output)
-    output_name = os.path.basename(orig_output)
-    
-    # 1. Extract Archive
-    temp_extract_dir = os.path.join(input_dir, "extract_grep_" + os.path.basename(orig_input))
-    os.makedirs(temp_extract_dir, exist_ok=True)
-    
-    try:
-        execute_command(f"tar -xvzf '{orig_input}' -C '{temp_extract_dir}'")
-        
-        # 2. Find Transcript and Video files (Robust Search)
-        transcript_path = None
-        video_path = None
-        
-        for root, dirs, files in os.walk(temp_extract_dir):
-            for file in files:
-                if file.startswith("._"): continue
-                
-                if file == "transcript.txt":
-                    transcript_path = os.path.join(root, file)
-                elif file.lower().endswith(('.mp4', '.mov', '.avi')):
-                    video_path = os.path.join(root, file)
+    # 1. Find Transcript and Video members (Robust Search), read straight from the archive:
+    # nothing is extracted to disk
+    with tarfile.open(orig_input, "r:gz") as tar:
+        transcript_member = None
+        video_member = None
+        for member in tar.getmembers():
+            name = os.path.basename(member.name)
+            if not member.isfile() or name.startswith("._"): continue
+
+            if name == "transcript.txt":
+                transcript_member = member
+            elif name.lower().endswith(('.mp4', '.mov', '.avi')):
+                video_member = member
 
-        if not transcript_path:
+        if not transcript_member:
             print("CRITICAL: No transcript.txt found!", file=sys.stderr)
             sys.exit(1)
 
-        # 3. Perform Grep (Case-Insensitive Search)
-        print(f"Reading transcript from {transcript_path}...")
-        with open(transcript_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-            
-        found = False
-        if search_word.lower() in content.lower():
-            found = True
-            print(f"MATCH FOUND: The word '{search_word}' is in {content}")
+        # 2. Perform Grep (Case-Insensitive Search)
+        print(f"Reading transcript from {transcript_member.name}...")
+        raw = tar.extractfile(transcript_member).read()
+        content = raw.decode('utf-8', errors='ignore')
+        count, hits = find_hits(content, search_word)
+
+        if count:
+            print(f"MATCH FOUND: '{search_word}' occurs {count} time(s)")
         else:
             print(f"NO: The word is NOT in the transcript.")
 
-        # 4. Handle Output
-        if found:
-            # Prepare files for the new archive
-            files_to_tar = ["transcript.txt"]
-            
-            # Move video if it exists
-            if video_path:
-                shutil.copy(video_path, os.path.join(output_dir, "video.mp4"))
-                files_to_tar.append("video.mp4")
-            
-            # Copy transcript to output dir
-            shutil.copy(transcript_path, os.path.join(output_dir, "transcript.txt"))
-            
-            # Create Archive
-            archive_name = output_name + ".tar.gz"
-            cwd = os.getcwd()
-            os.chdir(output_dir)
-            try:
-                # Create the .tar.gz with only the relevant files
-                tar_cmd = f"tar -czvf {archive_name} {' '.join(files_to_tar)}"
-                execute_command(tar_cmd)
-            finally:
-                os.chdir(cwd)
-                
-            # Cleanup output dir artifacts (leaving only the .tar.gz)
-            if os.path.exists(os.path.join(output_dir, "transcript.txt")):
-                os.remove(os.path.join(output_dir, "transcript.txt"))
-            if os.path.exists(os.path.join(output_dir, "video.mp4")):
-                os.remove(os.path.join(output_dir, "video.mp4"))
-        
-        else:
-            # If not found, we dont generate the output file.
-            print("Skipping output generation because word was not found.")
+        # 3. Optional package (video + transcript) of the matching clip
+        archive_path = None
+        if count and args['package']:
+            archive_path = orig_output + ".tar.gz"
+            with tarfile.open(archive_path, "w:gz") as out:
+                info = tarfile.TarInfo("transcript.txt")
+                info.size = len(raw)
+                out.addfile(info, io.BytesIO(raw))
+                if video_member:
+                    info = tarfile.TarInfo("video.mp4")
+                    info.size = video_member.size
+                    out.addfile(info, tar.extractfile(video_member))
+            print(f"Packaged the matching clip in {archive_path}")
 
-    finally:
-        # Clean up the extraction folder
-        if os.path.exists(temp_extract_dir):
-            shutil.rmtree(temp_extract_dir)
+    # 4. Structured result (one line, parsed by the view)
+    print(RESULT_MARKER + json.dumps({"match": count > 0, "count": count, "hits": hits, "package": archive_path}))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--input", required=True)
     parser.add_argument("-o", "--output", required=True)
     parser.add_argument("-w", "--word", required=True) # Accepting the word
+    parser.add_argument("--package", action="store_true",
+                        help="on a match, also write <output>.tar.gz with the video and the transcript")
     args = vars(parser.parse_args())
-    main(args)
\ No newline at end of file
+    main(args)
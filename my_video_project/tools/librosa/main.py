@@ -7,6 +7,7 @@ import argparse
 import subprocess
 import glob
 import shutil
+import tempfile
 
 def execute_command(command):
     print(f">_ {command}")
@@ -28,13 +29,12 @@ def main(args):
 
     print(f"SCRIPT: Input at '{orig_input}', saving output in '{orig_output}'")
 
-    input_dir = os.path.dirname(orig_input)
     output_dir = os.path.dirname(orig_output)
     output_name = os.path.basename(orig_output)
     
     # 1. Extract Archive to Temp Directory
-    temp_extract_dir = os.path.join(input_dir, "extract_librosa_" + os.path.basename(orig_input))
-    os.makedirs(temp_extract_dir, exist_ok=True)
+    # Under the job's TMPDIR, removed even if the job is killed
+    temp_extract_dir = tempfile.mkdtemp(prefix="extract_librosa_" + os.path.basename(orig_input) + "_")
     
     print(f"Extracting to {temp_extract_dir}...")
     try: